@@ -0,0 +1,158 @@
+# adapters.py
+
+import collections
+import math
+
+import re
+
+import parsers
+import scraper
+from gazetteer import district_for_city
+from parsers import CAR_COLUMNS
+
+# The search filters shared by every site
+Search = collections.namedtuple("Search", [
+    "district", "min_price", "max_price", "brand",
+    "min_yom", "max_yom", "fuel_type", "transmission"
+])
+
+
+def split_title(title, brand=""):
+    """
+    Splits a card title such as "Toyota Axio 2015" into (brand, model,
+    year), using the searched brand (e.g. "mercedes-benz") to tell where
+    multi-word brand names end. Missing parts are 'N/A'.
+    """
+    words = title.split()
+    year = 'N/A'
+    if words and re.fullmatch(r"(?:19|20)\d{2}", words[-1]):
+        year = words.pop()
+    brand_words = len(brand.replace("-", " ").split()) or 1
+    if brand and " ".join(words[:brand_words]).lower().replace("-", " ") != brand.replace("-", " ").lower():
+        brand_words = 1
+    return (
+        " ".join(words[:brand_words]) or 'N/A',
+        " ".join(words[brand_words:]) or 'N/A',
+        year,
+    )
+
+
+class SiteAdapter:
+    """
+    Everything the orchestrator needs to know about one marketplace. A new
+    site is supported by subclassing this and registering it in ADAPTERS.
+    """
+
+    site = None
+    request_headers = None
+
+    def build_search_url(self, search, page):
+        """Returns the URL of a search result page (pages start at 1)."""
+        raise NotImplementedError
+
+    def parse_listing_page(self, content):
+        """
+        Returns one dict per ad on a search result page. Each dict has the
+        ad's absolute 'url' plus whatever the result card shows, or an
+        'error' key for cards that could not be read.
+        """
+        raise NotImplementedError
+
+    def page_count(self, content):
+        """
+        Returns the number of result pages for a search, read from any of
+        its result pages, or None if the page does not say.
+        """
+        count = parsers.parse_result_count(content)
+        if count is None:
+            return None
+        page_size, total = count
+        return max(1, math.ceil(total / page_size))
+
+    # Name of the parsers backend method for detail pages, so parsing can
+    # run in a pipeline.ParsePool worker
+    detail_parser = None
+
+    def parse_detail_page(self, content):
+        """Parses an ad's detail page into a dict of raw fields."""
+        return getattr(parsers.get_backend(), self.detail_parser)(content)
+
+    def map_fields(self, details, listing):
+        """Combines detail and listing fields into a record with CAR_COLUMNS keys."""
+        return details
+
+    def summary_record(self, listing, search):
+        """
+        Builds a record from a search result card alone, for summary mode.
+        Fields the card does not show are taken from the search filters
+        where they pin them down, and are 'N/A' otherwise.
+        """
+        brand, model, year = split_title(listing.get('title', ''), search.brand)
+        if search.min_yom and search.min_yom == search.max_yom:
+            year = search.min_yom
+        record = dict.fromkeys(CAR_COLUMNS, 'N/A')
+        record.update({
+            'Price': listing.get('price', 'N/A'),
+            'District': district_for_city(listing.get('city', 'N/A')),
+            'Brand': brand,
+            'Model': model,
+            'Year of Manufacture': year,
+            'Fuel Type': search.fuel_type.title() or 'N/A',
+            'Transmission': search.transmission.title() or 'N/A',
+            'Mileage': listing.get('mileage', 'N/A'),
+        })
+        return record
+
+
+class IkmanAdapter(SiteAdapter):
+    site = "ikman.lk"
+    detail_parser = "parse_ikman_ad"
+
+    def build_search_url(self, search, page):
+        search_url = scraper.construct_ikman_search_url(
+            search.district, search.brand, search.min_yom, search.max_yom,
+            search.fuel_type, search.transmission
+        )
+        return f"{search_url}&page={page}" if page > 1 else search_url
+
+    def parse_listing_page(self, content):
+        cards = parsers.get_backend().parse_ikman_search_cards(content)
+        return [
+            {'url': f"{scraper.IKMAN_BASE_URL}{card['href']}", 'title': card['title'],
+             'city': card['location'], 'price': card['price']}
+            for card in cards
+        ]
+
+
+class RiyasewanaAdapter(SiteAdapter):
+    site = "riyasewana.com"
+    request_headers = {'User-Agent': 'Mozilla/5.0'}
+    detail_parser = "parse_riyasewana_listing"
+
+    def build_search_url(self, search, page):
+        base_url = (
+            f"{scraper.RIYASEWANA_BASE_URL}/search/cars/{search.brand}/{search.district}-district/"
+            f"{search.min_yom}-{search.max_yom}/{search.fuel_type}/{search.transmission}/"
+            f"price-{search.min_price}-{search.max_price}"
+        )
+        return base_url if page == 1 else f"{base_url}?page={page}"
+
+    def parse_listing_page(self, content):
+        listings = []
+        for card in parsers.get_backend().parse_riyasewana_search_page(content):
+            if 'error' not in card:
+                card = dict(card, url=scraper.riyasewana_listing_url(card['href']))
+            listings.append(card)
+        return listings
+
+    def map_fields(self, details, listing):
+        record = dict(details)
+        # Lookup the district using the city name from the listing card
+        record['District'] = district_for_city(listing.get('city', 'N/A'))
+        # If 'Price' is 'N/A', get from listing overview
+        if record['Price'] == 'N/A':
+            record['Price'] = listing.get('price', 'N/A')
+        return record
+
+
+ADAPTERS = {adapter.site: adapter for adapter in (IkmanAdapter(), RiyasewanaAdapter())}
@@ -0,0 +1,216 @@
+# analytics.py
+
+import math
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from storage import DEFAULT_RESULTS_DIR
+
+# Prices are summarized per brand, model, year and mileage bucket
+GROUP_COLUMNS = ["Brand", "Model", "Year of Manufacture", "Mileage Bucket"]
+
+# Depreciation is fitted per brand and model, across years
+FIT_COLUMNS = ["Brand", "Model"]
+
+MILEAGE_BUCKETS = [0, 25_000, 50_000, 100_000, 150_000, 200_000, np.inf]
+MILEAGE_LABELS = ["<25k", "25-50k", "50-100k", "100-150k", "150-200k", "200k+"]
+
+PERCENTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+# Groups smaller than this have too few prices to call anything an outlier
+MIN_OUTLIER_GROUP = 5
+
+# Kept next to the Parquet dataset; pyarrow skips files starting with "_"
+DEFAULT_STATS_PATH = os.path.join(DEFAULT_RESULTS_DIR, "_price_stats.pickle")
+
+
+def with_mileage_bucket(df):
+    """Returns df with a 'Mileage Bucket' column added."""
+    mileage = pd.to_numeric(df["Mileage"], errors="coerce")
+    buckets = pd.cut(mileage, MILEAGE_BUCKETS, labels=MILEAGE_LABELS, right=False)
+    return df.assign(**{"Mileage Bucket": buckets.astype("string").fillna("unknown")})
+
+
+def group_keys(df, columns):
+    """The grouping columns as plain strings, so sketches from different loads line up."""
+    return pd.DataFrame({
+        column: df[column].astype("string").fillna("unknown") for column in columns
+    }, index=df.index)
+
+
+def price_percentiles(df, by=GROUP_COLUMNS, percentiles=PERCENTILES, interpolation="linear"):
+    """
+    Exact price count and percentiles per group, in one vectorized groupby.
+    Rows without a price are left out.
+    """
+    df = with_mileage_bucket(df)
+    prices = pd.to_numeric(df["Price"], errors="coerce").astype("float64")
+    keys = group_keys(df, by)[prices.notna()]
+    grouped = prices[prices.notna()].groupby([keys[column] for column in by], observed=True)
+    summary = grouped.quantile(percentiles, interpolation=interpolation).unstack()
+    summary.columns = [f"p{round(q * 100)}" for q in percentiles]
+    summary.insert(0, "count", grouped.size())
+    return summary
+
+
+def flag_outliers(df, by=GROUP_COLUMNS, quartiles=None):
+    """
+    Returns a boolean Series marking prices outside 1.5 IQR of their group's
+    quartiles. quartiles, if given, is a frame with 'p25', 'p75' and 'count'
+    per group (e.g. from PriceStats.percentiles), so new rows can be checked
+    against the whole history without recomputing it.
+    """
+    if quartiles is None:
+        quartiles = price_percentiles(df, by, [0.25, 0.75])
+    keyed = group_keys(with_mileage_bucket(df), by)
+    bounds = keyed.join(quartiles[["count", "p25", "p75"]], on=by)
+    spread = 1.5 * (bounds["p75"] - bounds["p25"])
+    prices = pd.to_numeric(df["Price"], errors="coerce").astype("float64")
+    outlier = (prices < bounds["p25"] - spread) | (prices > bounds["p75"] + spread)
+    return (outlier & (bounds["count"] >= MIN_OUTLIER_GROUP)).fillna(False).rename("Price Outlier")
+
+
+def fit_sums(df, by=FIT_COLUMNS):
+    """
+    Per-group sums for a least-squares fit of log(price) on year. Sums from
+    separate batches add up to the sums of the combined data.
+    """
+    price = pd.to_numeric(df["Price"], errors="coerce").astype("float64")
+    year = pd.to_numeric(df["Year of Manufacture"], errors="coerce").astype("float64")
+    usable = (price > 0) & year.notna()
+    x = year[usable]
+    y = np.log(price[usable])
+    keys = group_keys(df, by)[usable]
+    terms = pd.DataFrame({"n": 1.0, "sx": x, "sy": y, "sxx": x * x, "sxy": x * y}, index=x.index)
+    return terms.groupby([keys[column] for column in by]).sum()
+
+
+def depreciation(sums):
+    """
+    Turns fit_sums into the fitted yearly depreciation of each group: the
+    share of value lost per year of age, and the price the fit gives a car
+    of the group's average year. Groups with fewer than two distinct years
+    get NaN.
+    """
+    n = sums["n"]
+    variance = sums["sxx"] - sums["sx"] ** 2 / n
+    slope = (sums["sxy"] - sums["sx"] * sums["sy"] / n) / variance.where(variance > 1e-9)
+    intercept = (sums["sy"] - slope * sums["sx"]) / n
+    mean_year = sums["sx"] / n
+    return pd.DataFrame({
+        "count": n.astype("int64"),
+        # Newer cars cost more, so a year of age multiplies price by exp(-slope)
+        "yearly_depreciation": 1 - np.exp(-slope),
+        "fitted_price_at_mean_year": np.exp(intercept + slope * mean_year),
+    })
+
+
+class PriceStats:
+    """
+    Mergeable price statistics over the whole scraped history.
+
+    Prices are kept as per-group counts in log-spaced bins (the idea behind
+    DDSketch), so any percentile is accurate to within `accuracy` of the
+    true value and a new batch is added by summing counts, not by
+    re-reading the history. Depreciation fits are kept as additive sums.
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.bins = pd.Series(dtype="int64")
+        self.sums = pd.DataFrame(columns=["n", "sx", "sy", "sxx", "sxy"], dtype="float64")
+        self.rows = 0
+
+    def bin_of(self, prices):
+        return np.ceil(np.log(prices) / math.log(self.gamma)).astype("int64")
+
+    def value_of(self, bins):
+        # The midpoint of a bin, within `accuracy` of every price in it
+        return 2 * self.gamma ** bins / (self.gamma + 1)
+
+    def update(self, df):
+        """Adds a batch of normalized records."""
+        df = with_mileage_bucket(df)
+        prices = pd.to_numeric(df["Price"], errors="coerce").astype("float64")
+        usable = prices > 0
+        keys = group_keys(df, GROUP_COLUMNS)[usable]
+        keys["bin"] = self.bin_of(prices[usable].to_numpy())
+        counts = keys.groupby(GROUP_COLUMNS + ["bin"]).size()
+        self.bins = counts if self.bins.empty else self.bins.add(counts, fill_value=0).astype("int64")
+
+        sums = fit_sums(df)
+        self.sums = sums if self.sums.empty else self.sums.add(sums, fill_value=0)
+        self.rows += len(df)
+        return self
+
+    def merge(self, other):
+        """Adds another PriceStats (e.g. built on another machine) to this one."""
+        self.bins = self.bins.add(other.bins, fill_value=0).astype("int64")
+        self.sums = self.sums.add(other.sums, fill_value=0)
+        self.rows += other.rows
+        return self
+
+    def percentiles(self, percentiles=PERCENTILES, by=GROUP_COLUMNS):
+        """
+        Approximate count and percentiles per group. by may be any prefix of
+        GROUP_COLUMNS, e.g. ["Brand", "Model"], to roll groups up.
+        """
+        by = list(by)
+        bins = self.bins.groupby(level=by + ["bin"]).sum().sort_index()
+        totals = bins.groupby(level=by).transform("sum")
+        cumulative = bins.groupby(level=by).cumsum()
+        values = pd.Series(self.value_of(bins.index.get_level_values("bin").to_numpy()), index=bins.index)
+
+        summary = pd.DataFrame({"count": bins.groupby(level=by).sum()})
+        for q in percentiles:
+            # The first bin holding the price at rank q * (count - 1)
+            reached = cumulative > np.floor(q * (totals - 1))
+            summary[f"p{round(q * 100)}"] = values[reached].groupby(level=by).first()
+        return summary
+
+    def depreciation(self):
+        return depreciation(self.sums)
+
+    def save(self, path=DEFAULT_STATS_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATS_PATH):
+        """Returns the saved stats, or None if there are none yet."""
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+
+
+def model_report(df, stats=None, top=15):
+    """
+    Price summary of the `top` most listed brand/model pairs: count,
+    median and quartiles, fitted yearly depreciation and the number of
+    outlier prices in df. Uses stats (a PriceStats over the full history)
+    when given, otherwise computes everything exactly from df.
+    """
+    by = ["Brand", "Model"]
+    if stats is not None:
+        summary = stats.percentiles([0.25, 0.5, 0.75], by=by)
+        fits = stats.depreciation()
+        quartiles = stats.percentiles([0.25, 0.75])
+    else:
+        summary = price_percentiles(df, by, [0.25, 0.5, 0.75])
+        fits = depreciation(fit_sums(df))
+        quartiles = None
+
+    report = summary.nlargest(top, "count").rename(columns={"p25": "Q1", "p50": "median", "p75": "Q3"})
+    report["yearly_depreciation"] = fits["yearly_depreciation"].reindex(report.index)
+    outliers = flag_outliers(df, quartiles=quartiles)
+    report["outliers"] = outliers.groupby([group_keys(df, by)[column] for column in by]).sum().reindex(report.index).fillna(0).astype("int64")
+    return report
@@ -1,13 +1,16 @@
 # main.py
 
 import logging
+import os
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from scraper import scrape_ikman_cars, scrape_riyasewana_cars
+from ui_events import LogPane, UiEvents
+
+# Everything else (pandas, requests, the parsers and the scraping stack)
+# is imported where it is first used, so the window appears without
+# waiting for it
 
 # Configure logging
 logging.basicConfig(
@@ -16,14 +19,94 @@ logging.basicConfig(
     filename='scraping.log'
 )
 
+# Columns the Filter Results window and duplicate detection work on;
+# load_data reads only these
+FILTER_COLUMNS = [
+    "Price", "District", "Brand", "Model", "Year of Manufacture",
+    "Fuel Type", "Transmission", "Engine Capacity", "Mileage"
+]
+
+# How often the main loop applies queued output and calls (milliseconds)
+DRAIN_INTERVAL_MS = 50
+
+# Parser worker processes; a few keep up with the download threads, and
+# more would only take cores and memory from the rest of the desktop
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
 class CarScraperGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Car Scraper Application")
+        # Worker threads never touch widgets; they queue output and calls here
+        self.events = UiEvents()
         self.create_widgets()
+        self.log_pane = LogPane(self.output_text)
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_events)
         self.results = {}
+        self.indexes = {}
         self.scrape_thread = None
         self.stop_scraping_flag = threading.Event()
+        self.seen_index = None
+        # Price statistics of the whole Parquet store, read on first use
+        self.price_stats = None
+        self.price_stats_loaded = False
+
+        # The on-disk stores open in the background once the window is up;
+        # the buttons that use them stay disabled until services_loaded is
+        # set. A store that fails to open stays None
+        self.response_cache = self.checkpoint = self.history = None
+        self.services_loaded = threading.Event()
+        # Whether the mode allows scraping, once the stores are open
+        self.scrape_allowed = True
+        # Parser worker processes, started by the first scrape and reused
+        self.parse_pool = None
+        self.root.after_idle(lambda: threading.Thread(target=self.load_services, daemon=True).start())
+
+    def load_services(self):
+        """Opens the response cache, checkpoint and listing history."""
+        try:
+            from history import ListingHistory
+            from http_cache import ResponseCache
+            from http_session import set_cache
+            from sinks import ScrapeCheckpoint
+
+            # Cache responses on disk so repeat scrapes with the same filters are cheap
+            self.response_cache = ResponseCache()
+            set_cache(self.response_cache)
+            self.checkpoint = ScrapeCheckpoint()
+            # Price changes and removed ads across runs, per ad
+            self.history = ListingHistory()
+        except Exception as e:
+            logging.error(f"Could not open the on-disk stores: {e}")
+            self.log_message(f"Could not open the on-disk stores: {e}")
+        finally:
+            # Never leave the buttons disabled
+            self.services_loaded.set()
+            self.events.call(self.on_services_loaded)
+
+    def on_services_loaded(self):
+        """Enables the buttons that use the on-disk stores, now that they are open."""
+        if self.scrape_allowed:
+            self.scrape_button.config(state="normal")
+        if self.results:
+            self.analytics_button.config(state="normal")
+
+    def get_parse_pool(self):
+        """The parser worker pool, started on first use and kept for later scrapes."""
+        if self.parse_pool is None:
+            from pipeline import ParsePool
+
+            self.parse_pool = ParsePool(workers=PARSE_WORKERS)
+        return self.parse_pool
+
+    def get_price_stats(self):
+        """The saved price statistics, or None if there are none yet; read from disk on first use."""
+        if not self.price_stats_loaded:
+            from analytics import PriceStats
+
+            self.price_stats = PriceStats.load()
+            self.price_stats_loaded = True
+        return self.price_stats
 
     def create_widgets(self):
         # Create frames
@@ -48,7 +131,7 @@ class CarScraperGUI:
         self.load_button = ttk.Button(self.mode_frame, text="Load Data", command=self.load_data)
         self.load_button.grid(row=1, column=0, pady=5)
 
-        self.scrape_button = ttk.Button(self.mode_frame, text="Start Scraping", command=self.open_scrape_params)
+        self.scrape_button = ttk.Button(self.mode_frame, text="Start Scraping", command=self.open_scrape_params, state="disabled")
         self.scrape_button.grid(row=1, column=1, pady=5)
 
         self.filter_button = ttk.Button(self.mode_frame, text="Filter Results", command=self.filter_results, state="disabled")
@@ -57,6 +140,9 @@ class CarScraperGUI:
         self.exit_button = ttk.Button(self.mode_frame, text="Exit", command=self.root.quit)
         self.exit_button.grid(row=2, column=1, pady=5)
 
+        self.analytics_button = ttk.Button(self.mode_frame, text="Price Analytics", command=self.show_analytics, state="disabled")
+        self.analytics_button.grid(row=3, column=0, pady=5)
+
         # Output Text
         self.output_text = tk.Text(self.output_frame, wrap="word")
         self.output_text.grid(row=0, column=0, sticky="nsew")
@@ -66,35 +152,98 @@ class CarScraperGUI:
         self.output_scrollbar.grid(row=0, column=1, sticky='ns')
         self.output_text.configure(yscrollcommand=self.output_scrollbar.set)
 
+        # Live throughput and ETA while a scrape runs
+        self.progress_label = ttk.Label(self.output_frame, text="")
+        self.progress_label.grid(row=1, column=0, columnspan=2, sticky="w")
+
         # Initially disable scraping controls
         self.toggle_mode()
 
+    def log_message(self, message):
+        """Queues a line for the output pane; safe to call from any thread."""
+        self.events.post(message)
+
+    def drain_events(self):
+        """Applies everything queued since the last tick, writing the output pane once."""
+        try:
+            events, dropped = self.events.drain()
+            lines = []
+            for kind, payload in events:
+                if kind == "message":
+                    lines.append(payload)
+                    continue
+                # Write earlier output first so calls see the pane in order
+                self.log_pane.write(lines)
+                lines = []
+                func, args = payload
+                try:
+                    func(*args)
+                except Exception as e:
+                    # One failed update must not stop the rest, nor the loop
+                    logging.exception(f"UI update {getattr(func, '__name__', func)} failed")
+                    lines.append(f"Error updating the window: {e}")
+            if dropped:
+                lines.append(f"({dropped} messages skipped while the window was busy)")
+            self.log_pane.write(lines)
+        finally:
+            self.root.after(DRAIN_INTERVAL_MS, self.drain_events)
+
     def toggle_mode(self):
         mode = self.mode_var.get()
+        self.scrape_allowed = mode != "csv"
         if mode == "csv":
             self.load_button.config(state="normal")
             self.scrape_button.config(state="disabled")
         else:
             self.load_button.config(state="disabled")
-            self.scrape_button.config(state="normal")
+            self.scrape_button.config(state="normal" if self.services_loaded.is_set() else "disabled")
 
     def load_data(self):
-        """Load test data from two CSV files."""
+        """Load results from the typed Parquet store, or from the two CSV files."""
+        import pandas as pd
+
+        from analytics import PriceStats
+        from normalize import normalize_frame
+        from storage import has_results, load_results_by_site
+
         try:
-            # Load the CSV files into pandas DataFrames
-            self.results['ikman.lk'] = pd.read_csv("ikman_cars_filtered.csv")
-            self.results['riyasewana.com'] = pd.read_csv("riyasewana_cars_filtered.csv")
+            if has_results():
+                # Only read the columns the filters use
+                self.results.update(load_results_by_site(['ikman.lk', 'riyasewana.com'], columns=FILTER_COLUMNS))
+                # First load of the store: build its price statistics once
+                if self.get_price_stats() is None:
+                    self.price_stats = PriceStats().update(pd.concat(self.results.values(), ignore_index=True))
+                    self.price_stats.save()
+            else:
+                # Load the CSV files into pandas DataFrames, typed once up front
+                self.results['ikman.lk'] = normalize_frame(pd.read_csv("ikman_cars_filtered.csv", dtype=str))
+                self.results['riyasewana.com'] = normalize_frame(pd.read_csv("riyasewana_cars_filtered.csv", dtype=str))
+
+            self.index_results()
 
             # Display the number of records loaded from each site
             for site, df in self.results.items():
                 num_records = len(df)
-                self.output_text.insert(tk.END, f"{site}: {num_records} records loaded.\n")
+                self.log_message(f"{site}: {num_records} records loaded.")
 
             self.filter_button.config(state="normal")
+            self.analytics_button.config(state="normal" if self.services_loaded.is_set() else "disabled")
         except FileNotFoundError as e:
             messagebox.showerror("File Not Found", f"Error: {e}")
             logging.error(f"File not found: {e}")
 
+    def index_results(self):
+        """Clusters duplicates across sites and builds the filter indexes."""
+        from dedupe import cluster_sites
+        from query import ResultIndex
+
+        # Give the same car listed on both sites one cluster id
+        cluster_sites(self.results)
+        self.indexes = {
+            site: ResultIndex(df) for site, df in self.results.items()
+            if df is not None and not df.empty
+        }
+
     def open_scrape_params(self):
         """Open a new window to input scraping parameters."""
         self.scrape_params_window = tk.Toplevel(self.root)
@@ -148,12 +297,29 @@ class CarScraperGUI:
                 entry.grid(row=i, column=1, padx=5, pady=5)
                 self.scrape_entries[label_text] = entry
 
+        # Offline replay re-runs the parsers against cached pages only
+        self.offline_var = tk.BooleanVar(value=self.response_cache is not None and self.response_cache.offline)
+        ttk.Checkbutton(self.scrape_params_window, text="Offline replay (cached pages only)", variable=self.offline_var).grid(row=len(labels), column=0, columnspan=2, pady=5)
+
+        # Incremental mode only fetches ads not seen on earlier runs
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.scrape_params_window, text="Only scrape new ads (incremental)", variable=self.incremental_var).grid(row=len(labels)+1, column=0, columnspan=2, pady=5)
+
+        # Resume continues an interrupted run after its last completed page
+        self.resume_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.scrape_params_window, text="Resume interrupted run", variable=self.resume_var).grid(row=len(labels)+2, column=0, columnspan=2, pady=5)
+
+        # Summary mode records search result cards without opening each ad;
+        # with incremental ticked, new ads still get their details
+        self.summary_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.scrape_params_window, text="Summary mode (search results only; details for new ads if incremental)", variable=self.summary_var).grid(row=len(labels)+3, column=0, columnspan=2, pady=5)
+
         # Start/Stop Scraping Button
         self.start_stop_button = ttk.Button(self.scrape_params_window, text="Start Scraping", command=self.start_stop_scraping)
-        self.start_stop_button.grid(row=len(labels), column=0, columnspan=2, pady=10)
+        self.start_stop_button.grid(row=len(labels)+4, column=0, columnspan=2, pady=10)
 
         # Close Window Button
-        ttk.Button(self.scrape_params_window, text="Close", command=self.scrape_params_window.destroy).grid(row=len(labels)+1, column=0, columnspan=2, pady=5)
+        ttk.Button(self.scrape_params_window, text="Close", command=self.scrape_params_window.destroy).grid(row=len(labels)+5, column=0, columnspan=2, pady=5)
 
         # Reset stop flag
         self.stop_scraping_flag.clear()
@@ -185,88 +351,164 @@ class CarScraperGUI:
                 messagebox.showerror("Input Error", "Invalid input for pages to scrape from riyasewana.com. Using default value of 1.")
                 self.pages_to_scrape_riyasewana = 1
 
+            from seen_index import SeenIndex
+            from telemetry import get_metrics
+
+            if self.response_cache is not None:
+                self.response_cache.offline = self.offline_var.get()
+            if self.incremental_var.get():
+                if self.seen_index is None:
+                    self.seen_index = SeenIndex()
+                self.incremental = True
+            else:
+                self.incremental = False
+            self.resume = self.resume_var.get()
+            self.summary = self.summary_var.get()
+            if not self.resume and self.checkpoint is not None:
+                self.checkpoint.clear()
+
             # Start scraping in a new thread
+            get_metrics().reset()
             self.scrape_thread = threading.Thread(target=self.scrape_data)
             self.scrape_thread.start()
+            self.update_progress()
 
             # Update button to "Stop Scraping"
             self.start_stop_button.config(text="Stop Scraping")
-            self.output_text.insert(tk.END, "Starting scraping process...\n")
-            self.output_text.see(tk.END)
+            self.log_message("Starting scraping process...")
         else:
             # Stop scraping
             self.stop_scraping_flag.set()
-            self.output_text.insert(tk.END, "Stopping scraping process...\n")
-            self.output_text.see(tk.END)
+            self.log_message("Stopping scraping process...")
             self.start_stop_button.config(state="disabled")
 
     def scrape_data(self):
-        # Define the functions to run in parallel
-        def scrape_ikman():
-            if self.stop_scraping_flag.is_set():
-                return None
-            logging.info("Starting scrape_ikman_cars")
-            df = scrape_ikman_cars(
-                self.district, self.min_price, self.max_price, self.brand, self.min_yom,
-                self.max_yom, self.fuel_type, self.transmission, self.pages_to_scrape_ikman,
-                output_csv="ikman_cars_filtered.csv", stop_flag=self.stop_scraping_flag  # Pass the stop flag
+        import pandas as pd
+
+        from adapters import ADAPTERS, Search
+        from concurrency import format_limits
+        from http_session import format_connection_stats
+        from normalize import normalize_frame
+        from orchestrator import ScrapeJob, scrape_all
+        from sinks import CsvSink
+        from storage import write_results
+        from telemetry import get_metrics
+
+        csv_files = {
+            'ikman.lk': "ikman_cars_filtered.csv",
+            'riyasewana.com': "riyasewana_cars_filtered.csv"
+        }
+        pages_to_scrape = {
+            'ikman.lk': self.pages_to_scrape_ikman,
+            'riyasewana.com': self.pages_to_scrape_riyasewana
+        }
+        search = Search(
+            self.district, self.min_price, self.max_price, self.brand,
+            self.min_yom, self.max_yom, self.fuel_type, self.transmission
+        )
+
+        # Stream records to the CSVs page by page so a stop or crash keeps them
+        # (summary mode records every ad each run, so it only appends when resuming)
+        append = (self.incremental and not self.summary) or self.resume
+        sinks = {site: CsvSink(path, append=append) for site, path in csv_files.items()}
+        jobs = [ScrapeJob(ADAPTERS[site], search, pages_to_scrape[site], sinks[site]) for site in csv_files]
+
+        # One orchestrator schedules both sites' requests, parsing pages in
+        # worker processes off the GUI process's GIL
+        logging.info("Starting scrape of " + ", ".join(csv_files))
+        try:
+            _, stats = scrape_all(
+                jobs, stop_flag=self.stop_scraping_flag, parse_pool=self.get_parse_pool(),
+                seen_index=self.seen_index if self.incremental else None,
+                checkpoint=self.checkpoint, history=self.history, log=self.log_message,
+                summary=self.summary, enrich_new=self.summary and self.incremental
             )
-            logging.info("Completed scrape_ikman_cars")
-            return df
+            logging.info(f"Scraped {stats['ads']} ads in {stats['elapsed']:.1f}s ({stats['errors']} errors)")
+        except Exception as e:
+            logging.error(f"An error occurred while scraping: {e}")
+            self.log_message(f"An error occurred while scraping: {e}")
+        finally:
+            for sink in sinks.values():
+                sink.close()
+
+        # Collect the results for each site
+        for site, sink in sinks.items():
+            self.log_message(f"{site}: {sink.count} ads scraped this run.")
+            try:
+                result_df = pd.read_csv(csv_files[site], dtype=str)
+            except Exception as e:
+                logging.error(f"Could not read results for {site}: {e}")
+                self.results[site] = None
+                continue
+
+            with get_metrics().timer("normalize", site):
+                self.results[site] = normalize_frame(result_df)
+            # Add this run's records to the typed Parquet store
+            if sink.count:
+                with get_metrics().timer("write", site):
+                    write_results(result_df.tail(sink.count), site)
+                # Fold the new records into the stored statistics
+                if self.get_price_stats() is not None:
+                    self.price_stats.update(self.results[site].tail(sink.count))
+                    self.price_stats.save()
 
-        def scrape_riyasewana():
             if self.stop_scraping_flag.is_set():
-                return None
-            logging.info("Starting scrape_riyasewana_cars")
-            df = scrape_riyasewana_cars(
-                self.district, self.min_price, self.max_price, self.brand, self.min_yom,
-                self.max_yom, self.fuel_type, self.transmission, self.pages_to_scrape_riyasewana,
-                output_csv="riyasewana_cars_filtered.csv", stop_flag=self.stop_scraping_flag  # Pass the stop flag
-            )
-            logging.info("Completed scrape_riyasewana_cars")
-            return df
-
-        # Run the scrapers
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = {
-                executor.submit(scrape_ikman): 'ikman.lk',
-                executor.submit(scrape_riyasewana): 'riyasewana.com'
-            }
-
-            # Collect the results as they complete
-            for future in as_completed(futures):
-                site = futures[future]
-                try:
-                    result_df = future.result()
-                    if result_df is None:
-                        self.output_text.insert(tk.END, f"Scraping {site} was stopped by user.\n")
-                        self.results[site] = None
-                    else:
-                        self.results[site] = result_df
-                        logging.info(f"Scraping {site} completed successfully.")
-                        self.output_text.insert(tk.END, f"Scraping {site} completed successfully.\n")
-                except Exception as e:
-                    logging.error(f"An error occurred while scraping {site}: {e}")
-                    self.output_text.insert(tk.END, f"An error occurred while scraping {site}: {e}\n")
-                    self.results[site] = None
-
-        self.on_scraping_complete()
+                self.log_message(f"Scraping {site} was stopped by user.")
+            else:
+                logging.info(f"Scraping {site} completed successfully.")
+                self.log_message(f"Scraping {site} completed successfully.")
+
+        self.index_results()
+
+        # Report keep-alive connection reuse for the run
+        for line in format_connection_stats():
+            logging.info(f"Connection reuse: {line}")
+            self.log_message(f"Connections: {line}")
+        # And how many requests in flight each site sustained
+        for line in format_limits():
+            logging.info(f"Concurrency: {line}")
+            self.log_message(f"Concurrency: {line}")
+        if self.response_cache is not None:
+            logging.info(f"Response cache: {self.response_cache.format_stats()}")
+            self.log_message(f"Response cache: {self.response_cache.format_stats()}")
+
+        # Per-stage latency summary for the run
+        for line in get_metrics().format_summary():
+            logging.info(f"Telemetry: {line}")
+            self.log_message(line)
+
+        self.events.call(self.on_scraping_complete)
+
+    def update_progress(self):
+        """Shows ads done, rate and ETA per site, refreshing every second while scraping."""
+        from adapters import ADAPTERS
+        from telemetry import get_metrics
+
+        parts = []
+        for site in ADAPTERS:
+            done, expected, rate = get_metrics().progress(site)
+            text = f"{site}: {done} ads, {rate:.1f}/s"
+            if expected and rate > 0 and expected > done:
+                text += f", ETA {(expected - done) / rate:.0f}s"
+            parts.append(text)
+        self.progress_label.config(text=" | ".join(parts))
+        if self.scrape_thread is not None and self.scrape_thread.is_alive():
+            self.root.after(1000, self.update_progress)
 
     def on_scraping_complete(self):
-        self.output_text.insert(tk.END, "Scraping tasks have completed.\n")
-        self.output_text.see(tk.END)
+        self.log_message("Scraping tasks have completed.")
         self.filter_button.config(state="normal")
+        self.analytics_button.config(state="normal")
         self.start_stop_button.config(text="Start Scraping", state="normal")
 
         # Show the number of records obtained for each site
         for site, df in self.results.items():
             if df is not None and not df.empty:
                 num_records = len(df)
-                self.output_text.insert(tk.END, f"Number of records obtained from {site}: {num_records}\n")
+                self.log_message(f"Number of records obtained from {site}: {num_records}")
             else:
-                self.output_text.insert(tk.END, f"No data obtained from {site}.\n")
+                self.log_message(f"No data obtained from {site}.")
 
-        self.output_text.see(tk.END)
 
     def filter_results(self):
         """Open a new window for filtering the loaded data."""
@@ -276,83 +518,147 @@ class CarScraperGUI:
         # Filtering options
         ttk.Label(self.filter_window, text="Model name (or part):").grid(row=0, column=0, sticky="e")
         self.model_entry = ttk.Entry(self.filter_window)
-        self.model_entry.grid(row=0, column=1, padx=5, pady=5)
-
-        ttk.Label(self.filter_window, text="Mileage Min:").grid(row=1, column=0, sticky="e")
-        self.mileage_min_entry = ttk.Entry(self.filter_window)
-        self.mileage_min_entry.grid(row=1, column=1, padx=5, pady=5)
-
-        ttk.Label(self.filter_window, text="Mileage Max:").grid(row=2, column=0, sticky="e")
-        self.mileage_max_entry = ttk.Entry(self.filter_window)
-        self.mileage_max_entry.grid(row=2, column=1, padx=5, pady=5)
+        self.model_entry.grid(row=0, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
+
+        # Min/max entries for the range filters
+        self.range_entries = {}
+        for row, (label, column) in enumerate([
+            ("Price", "Price"), ("Mileage", "Mileage"), ("Year", "Year of Manufacture")
+        ], start=1):
+            ttk.Label(self.filter_window, text=f"{label} Min / Max:").grid(row=row, column=0, sticky="e")
+            min_entry = ttk.Entry(self.filter_window, width=12)
+            min_entry.grid(row=row, column=1, padx=5, pady=5)
+            max_entry = ttk.Entry(self.filter_window, width=12)
+            max_entry.grid(row=row, column=2, padx=5, pady=5)
+            self.range_entries[column] = (label, min_entry, max_entry)
+
+        # Drop-downs of the values present in the loaded data
+        self.value_combos = {}
+        for row, column in enumerate(["Fuel Type", "Transmission", "District"], start=4):
+            options = sorted({
+                value.title() for index in self.indexes.values()
+                if column in index.values for value in index.values[column].values
+            })
+            ttk.Label(self.filter_window, text=f"{column}:").grid(row=row, column=0, sticky="e")
+            combo = ttk.Combobox(self.filter_window, values=[""] + options, state="readonly")
+            combo.grid(row=row, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
+            self.value_combos[column] = combo
+
+        # Count a car listed on both sites (or twice on one) only once
+        self.collapse_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.filter_window, text="Count duplicate listings once", variable=self.collapse_var).grid(row=7, column=0, columnspan=3, sticky="w", padx=5)
 
         # Apply filter button
-        ttk.Button(self.filter_window, text="Apply Filter", command=self.apply_filter).grid(row=3, column=0, columnspan=2, pady=10)
+        ttk.Button(self.filter_window, text="Apply Filter", command=self.apply_filter).grid(row=8, column=0, columnspan=3, pady=10)
 
         # Close window button
-        ttk.Button(self.filter_window, text="Close", command=self.filter_window.destroy).grid(row=4, column=0, columnspan=2, pady=5)
+        ttk.Button(self.filter_window, text="Close", command=self.filter_window.destroy).grid(row=9, column=0, columnspan=3, pady=5)
 
-    def apply_filter(self):
-        """Apply filters to the data based on user input."""
-        model_name = self.model_entry.get().strip().lower()
-        mileage_min_input = self.mileage_min_entry.get().strip()
-        mileage_max_input = self.mileage_max_entry.get().strip()
-
-        # Convert mileage inputs to integers, handle exceptions
-        mileage_min = None
-        mileage_max = None
+    def read_bound(self, entry, label):
+        """Reads an integer filter bound; shows an error and returns None if invalid."""
+        text = entry.get().strip()
+        if not text:
+            return None
         try:
-            if mileage_min_input:
-                mileage_min = int(mileage_min_input)
+            return int(text.replace(",", ""))
         except ValueError:
-            messagebox.showerror("Input Error", "Invalid input for Mileage Min. Ignoring minimum filter.")
+            messagebox.showerror("Input Error", f"Invalid input for {label}. Ignoring this filter.")
+            return None
 
-        try:
-            if mileage_max_input:
-                mileage_max = int(mileage_max_input)
-        except ValueError:
-            messagebox.showerror("Input Error", "Invalid input for Mileage Max. Ignoring maximum filter.")
+    def apply_filter(self):
+        """Apply filters to the data based on user input, using the prebuilt indexes."""
+        import numpy as np
+
+        from dedupe import CLUSTER_COLUMN
+
+        model_name = self.model_entry.get().strip()
+        ranges = {
+            column: (self.read_bound(min_entry, f"{label} Min"), self.read_bound(max_entry, f"{label} Max"))
+            for column, (label, min_entry, max_entry) in self.range_entries.items()
+        }
+        values = {column: combo.get() for column, combo in self.value_combos.items()}
+        collapse = self.collapse_var.get()
+        clusters, prices = [], []
 
         # Apply filters to both datasets
-        for site, df in self.results.items():
-            if df is not None and not df.empty:
-                df_filtered = df.copy()
-
-                # Convert relevant columns to the appropriate types
-                df_filtered['Model'] = df_filtered['Model'].astype(str).str.lower()
-                df_filtered['Mileage'] = pd.to_numeric(df_filtered['Mileage'], errors='coerce')
-                df_filtered['Price'] = pd.to_numeric(df_filtered['Price'], errors='coerce')
-
-                # Apply model filter
-                if model_name:
-                    df_filtered = df_filtered[df_filtered['Model'].str.contains(model_name, na=False)]
-
-                # Apply mileage filters
-                if mileage_min is not None:
-                    df_filtered = df_filtered[df_filtered['Mileage'] >= mileage_min]
-                if mileage_max is not None:
-                    df_filtered = df_filtered[df_filtered['Mileage'] <= mileage_max]
-
-                # Display the number of records and average price
-                num_filtered = len(df_filtered)
-                self.output_text.insert(tk.END, f"{site}: {num_filtered} records after filtering.\n")
-
-                if not df_filtered.empty:
-                    average_price = df_filtered['Price'].mean()
-                    self.output_text.insert(tk.END, f"Average price for {site}: {average_price:.2f}\n")
-                else:
-                    self.output_text.insert(tk.END, f"No matching records found for {site}.\n")
+        for site in self.results:
+            index = self.indexes.get(site)
+            if index is None:
+                self.log_message(f"No data from {site} to filter.")
+                continue
+
+            rows = index.query(model=model_name, ranges=ranges, values=values)
+            if CLUSTER_COLUMN in index.frame.columns:
+                clusters.append(index.frame[CLUSTER_COLUMN].to_numpy()[rows])
+                prices.append(index.price[rows])
+
+            # Display the number of records and average price
+            self.log_message(f"{site}: {len(rows)} records after filtering.")
+            if len(rows):
+                average_price = index.average_price(rows)
+                self.log_message(f"Average price for {site}: {average_price:.2f}")
+                site_prices = index.price[rows]
+                if not np.isnan(site_prices).all():
+                    p10, median, p90 = np.nanpercentile(site_prices, [10, 50, 90])
+                    self.log_message(f"Median price for {site}: {median:.2f} (10th-90th percentile: {p10:.2f} - {p90:.2f})")
             else:
-                self.output_text.insert(tk.END, f"No data from {site} to filter.\n")
+                self.log_message(f"No matching records found for {site}.")
+
+        # Across both sites, each duplicate cluster counts as one car
+        if collapse and clusters:
+            clusters = np.concatenate(clusters)
+            prices = np.concatenate(prices)
+            _, first = np.unique(clusters, return_index=True)
+            duplicates = len(clusters) - len(first)
+            self.log_message(f"All sites: {len(first)} unique cars ({duplicates} duplicate listings removed).")
+            unique_prices = prices[first]
+            unique_prices = unique_prices[~np.isnan(unique_prices)]
+            if len(unique_prices):
+                self.log_message(f"Average price of unique cars: {unique_prices.mean():.2f}")
 
         self.filter_window.destroy()
-        self.output_text.see(tk.END)
+
+    def show_analytics(self):
+        """Open a window with price percentiles, depreciation and outliers per model."""
+        import pandas as pd
+
+        from analytics import model_report
+        from storage import has_results
+
+        frames = [df for df in self.results.values() if df is not None and not df.empty]
+        if not frames:
+            messagebox.showinfo("Price Analytics", "No data loaded.")
+            return
+        combined = pd.concat(frames, ignore_index=True)
+        # The store's statistics cover the full history; CSV data is summarized exactly
+        stats = self.get_price_stats() if has_results() else None
+        report = model_report(combined, stats)
+
+        window = tk.Toplevel(self.root)
+        window.title("Price Analytics")
+        text = tk.Text(window, wrap="none", width=110, height=22)
+        text.grid(row=0, column=0, sticky="nsew")
+        source = f"full history ({stats.rows} records)" if stats is not None else f"{len(combined)} loaded records"
+        text.insert(tk.END, f"Most listed models, from {source}:\n\n")
+        text.insert(tk.END, report.to_string(float_format=lambda value: f"{value:,.2f}"))
+        text.insert(tk.END, "\n\nyearly_depreciation: share of value lost per year of age (log-linear fit on year).\n")
+        text.insert(tk.END, "outliers: loaded listings priced outside 1.5 IQR of their brand/model/year/mileage group.\n")
+        if self.history is not None:
+            drops = self.history.price_changes(days=7, drops_only=True).sort_values("change_pct").head(10)
+            text.insert(tk.END, f"\nLargest price drops in the last 7 days ({len(drops)} shown):\n\n")
+            if len(drops):
+                text.insert(tk.END, drops[["observed", "old_price", "new_price", "change_pct", "url"]].to_string(
+                    index=False, float_format=lambda value: f"{value:,.1f}"))
+        text.config(state="disabled")
+        ttk.Button(window, text="Close", command=window.destroy).grid(row=1, column=0, pady=5)
 
     def on_closing(self):
         # Stop any running threads
         if self.scrape_thread and self.scrape_thread.is_alive():
             self.stop_scraping_flag.set()
             self.scrape_thread.join()
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
         self.root.destroy()
 
 if __name__ == "__main__":
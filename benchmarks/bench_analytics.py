@@ -0,0 +1,64 @@
+# bench_analytics.py
+#
+# Compares recomputing grouped price percentiles over a synthetic history
+# with folding a new scrape into a saved PriceStats sketch, and checks the
+# sketch's percentiles against the exact ones.
+#
+#   python benchmarks/bench_analytics.py --rows 1000000 --batch 5000
+
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+import pandas as pd
+
+from analytics import PriceStats, price_percentiles
+
+
+def make_history(rows, seed=1):
+    """Listings whose prices fall about 10% per year of age."""
+    rng = np.random.default_rng(seed)
+    year = rng.integers(2000, 2025, rows)
+    return pd.DataFrame({
+        "Brand": rng.choice(["Toyota", "Honda", "Nissan", "Suzuki"], rows),
+        "Model": rng.choice([f"Model {i}" for i in range(60)], rows),
+        "Year of Manufacture": year,
+        "Price": (9_000_000 * 0.9 ** (2025 - year) * rng.lognormal(0, 0.15, rows)).round(),
+        "Mileage": rng.integers(0, 300, rows) * 1_000,
+    })
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<34} {time.perf_counter() - start:6.2f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs incremental price analytics.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows of history")
+    parser.add_argument("--batch", type=int, default=5_000, help="Rows in the new scrape")
+    args = parser.parse_args()
+
+    history = make_history(args.rows + args.batch)
+    old, new = history.iloc[:args.rows], history.iloc[args.rows:]
+
+    stats = timed("build sketch from history", lambda: PriceStats().update(old))
+    exact = timed("exact percentiles, full recompute", lambda: price_percentiles(history, interpolation="lower"))
+    timed("fold new scrape into sketch", lambda: stats.update(new))
+    approx = timed("percentiles from sketch", stats.percentiles)
+
+    error = (approx[exact.columns[1:]] / exact[exact.columns[1:]] - 1).abs().max().max()
+    print(f"groups: {len(exact)}, max relative percentile error: {error:.2%} (bound {stats.accuracy:.0%})")
+    fits = stats.depreciation()["yearly_depreciation"]
+    print(f"fitted yearly depreciation: median {fits.median():.1%} (generated at 10%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# bench_dedupe.py
+#
+# Times duplicate clustering on synthetic listings from two sites, where a
+# known share of the second site's ads are reposts of the first site's
+# with slightly different price, mileage and spelling. Reports how many of
+# the planted duplicates were found and how many unrelated ads were merged.
+#
+# A second case puts every listing in one crowded brand/model/year block
+# (same car, similar prices and mileages), where loose matching merges
+# unrelated cars. The run fails (exit code 1) if more than
+# MAX_FALSE_MERGE_SHARE of its listings end up merged with a different car.
+#
+#   python benchmarks/bench_dedupe.py --rows 300000
+#   python benchmarks/bench_dedupe.py --dense-rows 500
+
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+import pandas as pd
+
+from dedupe import cluster_sites
+
+# Share of the dense block's listings that may be merged with a different car
+MAX_FALSE_MERGE_SHARE = 0.02
+
+DISTRICTS = ["Colombo", "Gampaha", "Kandy", "Galle", "Kurunegala"]
+
+
+def make_sites(rows, duplicate_share, seed=1):
+    """Returns (ikman frame, riyasewana frame, index of the ikman ad each riyasewana ad reposts or -1)."""
+    rng = np.random.default_rng(seed)
+    ikman = pd.DataFrame({
+        "Brand": rng.choice(["Toyota", "Honda", "Nissan", "Suzuki", "Mitsubishi"], rows),
+        "Model": rng.choice([f"Model {i}" for i in range(80)], rows),
+        "Year of Manufacture": rng.integers(2000, 2025, rows),
+        "Price": rng.integers(40, 800, rows) * 25_000,
+        "Mileage": rng.integers(0, 300, rows) * 1_000,
+        "Engine Capacity": rng.choice([660, 1000, 1300, 1500, 1800, 2000], rows),
+        "District": rng.choice(DISTRICTS, rows),
+    })
+
+    riyasewana = ikman.sample(n=rows, random_state=seed + 1).reset_index()
+    source = riyasewana.pop("index").to_numpy().copy()
+    reposted = rng.random(rows) < duplicate_share
+    source[~reposted] = -1
+    fresh = ~reposted
+    # Unrelated ads get fresh values; reposts keep the car but drift a little
+    riyasewana.loc[fresh, "Price"] = rng.integers(40, 800, fresh.sum()) * 25_000
+    riyasewana.loc[fresh, "Mileage"] = rng.integers(0, 300, fresh.sum()) * 1_000
+    riyasewana.loc[reposted, "Price"] = (riyasewana.loc[reposted, "Price"] * rng.uniform(0.998, 1.002, reposted.sum())).round()
+    riyasewana.loc[reposted, "Mileage"] += rng.integers(0, 400, reposted.sum())
+    riyasewana["Model"] = riyasewana["Model"].str.upper()
+    return ikman, riyasewana, source
+
+
+def make_dense_block(rows, duplicate_share, seed=1):
+    """Like make_sites, but every listing is a 2015 Toyota Axio priced 5-7M with 50-150k km."""
+    rng = np.random.default_rng(seed)
+
+    def listings():
+        return pd.DataFrame({
+            "Brand": "Toyota",
+            "Model": "Axio",
+            "Year of Manufacture": 2015,
+            "Price": rng.integers(5_000, 7_000, rows) * 1_000,
+            "Mileage": rng.integers(500, 1_500, rows) * 100,
+            "Engine Capacity": 1500,
+            "District": rng.choice(DISTRICTS, rows),
+        })
+
+    ikman, riyasewana = listings(), listings()
+    source = np.where(rng.random(rows) < duplicate_share, rng.permutation(rows), -1)
+    reposted = source >= 0
+    copied = ikman.iloc[source[reposted]][["Price", "Mileage", "District"]].to_numpy()
+    riyasewana.loc[reposted, ["Price", "Mileage", "District"]] = copied
+    riyasewana.loc[reposted, "Price"] = (riyasewana.loc[reposted, "Price"] * rng.uniform(0.998, 1.002, reposted.sum())).round()
+    riyasewana.loc[reposted, "Mileage"] += rng.integers(0, 400, reposted.sum())
+    return ikman, riyasewana, source
+
+
+def score(results, source):
+    """Returns (planted duplicates found, listings merged with a different car, clusters)."""
+    ikman_clusters = results["ikman.lk"]["Cluster"].to_numpy()
+    riyasewana_clusters = results["riyasewana.com"]["Cluster"].to_numpy()
+    reposted = source >= 0
+    found = (riyasewana_clusters[reposted] == ikman_clusters[source[reposted]]).sum()
+
+    # The car behind every listing: a repost is the ikman ad it copies
+    rows = len(ikman_clusters)
+    cars = np.concatenate([np.arange(rows), np.where(reposted, source, rows + np.arange(len(source)))])
+    listings = pd.DataFrame({"cluster": np.concatenate([ikman_clusters, riyasewana_clusters]), "car": cars})
+    falsely_merged = (listings.groupby("cluster")["car"].transform("nunique") > 1).sum()
+    return found, falsely_merged, listings["cluster"].nunique()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-site duplicate clustering.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Listings per site")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Share of the second site's ads that are reposts")
+    parser.add_argument("--dense-rows", type=int, default=250, help="Listings per site in the single crowded block")
+    args = parser.parse_args()
+
+    ikman, riyasewana, source = make_sites(args.rows, args.duplicates)
+    start = time.perf_counter()
+    results = cluster_sites({"ikman.lk": ikman, "riyasewana.com": riyasewana})
+    elapsed = time.perf_counter() - start
+    found, falsely_merged, clusters = score(results, source)
+
+    print(f"{2 * args.rows} listings clustered in {elapsed:.2f}s ({2 * args.rows / elapsed:.0f} rows/s)")
+    print(f"planted duplicates found: {found}/{(source >= 0).sum()}")
+    print(f"listings merged with a different car: {falsely_merged}")
+    print(f"clusters: {clusters} (expected about {2 * args.rows - (source >= 0).sum()})")
+
+    ikman, riyasewana, source = make_dense_block(args.dense_rows, args.duplicates)
+    results = cluster_sites({"ikman.lk": ikman, "riyasewana.com": riyasewana})
+    found, falsely_merged, clusters = score(results, source)
+    share = falsely_merged / (2 * args.dense_rows)
+
+    print(f"dense block of {2 * args.dense_rows} listings:")
+    print(f"  planted duplicates found: {found}/{(source >= 0).sum()}")
+    print(f"  listings merged with a different car: {falsely_merged} ({share:.1%}, limit {MAX_FALSE_MERGE_SHARE:.0%})")
+    print(f"  clusters: {clusters} (expected about {2 * args.dense_rows - (source >= 0).sum()})")
+    if share > MAX_FALSE_MERGE_SHARE:
+        print("FAIL: unrelated cars merged in the dense block")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
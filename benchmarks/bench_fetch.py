@@ -0,0 +1,66 @@
+# bench_fetch.py
+#
+# Compares the serial ikman.lk ad loop against the concurrent fetch engine,
+# using the local fixture server in place of the real site.
+#
+#   python benchmarks/bench_fetch.py --pages 3 --latency 0.2
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper
+from fixture_server import FixtureServer
+
+
+def serial_scrape(pages, serial_sleep):
+    """The pre-engine loop: one ad at a time with a fixed pause."""
+    search_url = scraper.construct_ikman_search_url("colombo", "toyota", 2000, 2024, "petrol", "automatic")
+    details = []
+    for page in range(1, pages + 1):
+        page_url = f"{search_url}&page={page}" if page > 1 else search_url
+        for ad_url in scraper.get_ikman_ads_from_page(page_url):
+            details.append(scraper.get_ikman_ad_details(ad_url))
+            time.sleep(serial_sleep)
+    return details
+
+
+def concurrent_scrape(pages, max_workers, requests_per_second):
+    df = scraper.scrape_ikman_cars(
+        "colombo", 0, 0, "toyota", 2000, 2024, "petrol", "automatic", pages,
+        max_workers=max_workers, requests_per_second=requests_per_second
+    )
+    return df.to_dict("records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ikman.lk fetch engine against the serial loop.")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="Server delay per request in seconds")
+    parser.add_argument("--serial-sleep", type=float, default=1.0, help="Pause between ads in the serial loop")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rps", type=float, default=5.0, help="Per-host requests per second")
+    args = parser.parse_args()
+
+    with FixtureServer(latency=args.latency) as server:
+        scraper.IKMAN_BASE_URL = server.base_url
+
+        start = time.perf_counter()
+        serial = serial_scrape(args.pages, args.serial_sleep)
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = concurrent_scrape(args.pages, args.workers, args.rps)
+        concurrent_time = time.perf_counter() - start
+
+    assert len(serial) == len(concurrent), "Both loops should scrape the same ads"
+    print(f"serial:     {len(serial)} ads in {serial_time:.2f}s ({len(serial) / serial_time:.2f} ads/s)")
+    print(f"concurrent: {len(concurrent)} ads in {concurrent_time:.2f}s ({len(concurrent) / concurrent_time:.2f} ads/s)")
+    print(f"speedup:    {serial_time / concurrent_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
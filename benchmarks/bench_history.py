@@ -0,0 +1,138 @@
+# bench_history.py
+#
+# Builds a listing history (history.py) from simulated daily scrapes of a
+# market of ads (new ads, price and mileage changes, removals, relistings)
+# and reports the cost of recording a day and of the history queries as
+# the history grows. Exits non-zero if a query gets slower than --max-query-ms.
+#
+#   python benchmarks/bench_history.py --days 1095 --ads 5000
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import SECONDS_PER_DAY, ListingHistory
+
+BRANDS = {"Toyota": ["Axio", "Aqua", "Premio", "Vitz"], "Honda": ["Fit", "Vezel", "Grace"], "Suzuki": ["Alto", "Wagon R"]}
+DISTRICTS = ["Colombo", "Gampaha", "Kandy", "Galle", "Kurunegala"]
+
+SITE = "ikman.lk"
+SEARCH_KEY = "https://ikman.lk/en/ads/sri-lanka/cars"
+
+
+def new_ad(rng, number):
+    brand = rng.choice(list(BRANDS))
+    return f"https://ikman.lk/en/ad/car-{number}", {
+        "Price": f"Rs {rng.randrange(2_000, 20_000) * 1000:,}",
+        "District": rng.choice(DISTRICTS),
+        "Brand": brand,
+        "Model": rng.choice(BRANDS[brand]),
+        "Year of Manufacture": str(rng.randrange(2000, 2024)),
+        "Fuel Type": rng.choice(["Petrol", "Hybrid"]),
+        "Transmission": "Automatic",
+        "Engine Capacity": f"{rng.choice([1000, 1300, 1500, 1800])} cc",
+        "Mileage": f"{rng.randrange(5, 250) * 1000:,} km",
+    }
+
+
+def simulate_day(rng, market, removed, next_number, change_rate, churn):
+    """Changes the market the way a day of trading would; returns the next ad number."""
+    for url in rng.sample(list(market), int(len(market) * change_rate)):
+        record = dict(market[url])
+        if rng.random() < 0.8:
+            price = int(record["Price"][3:].replace(",", ""))
+            record["Price"] = f"Rs {int(price * rng.uniform(0.85, 1.05)) // 1000 * 1000:,}"
+        else:
+            record["Mileage"] = f"{int(record['Mileage'][:-3].replace(',', '')) + 1000:,} km"
+        market[url] = record
+    turnover = int(len(market) * churn)
+    for url in rng.sample(list(market), turnover):
+        removed[url] = market.pop(url)
+    for _ in range(turnover):
+        # A few removed ads come back
+        if removed and rng.random() < 0.05:
+            url = rng.choice(list(removed))
+            market[url] = removed.pop(url)
+        else:
+            url, record = new_ad(rng, next_number)
+            market[url] = record
+            next_number += 1
+    return next_number
+
+
+def timed_ms(func, repeat=5):
+    """Best of a few runs, in milliseconds, and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the listing history over simulated daily scrapes.")
+    parser.add_argument("--days", type=int, default=1095, help="Days of daily scrapes to simulate")
+    parser.add_argument("--ads", type=int, default=2000, help="Ads listed on any one day")
+    parser.add_argument("--change-rate", type=float, default=0.03, help="Share of ads edited per day")
+    parser.add_argument("--churn", type=float, default=0.04, help="Share of ads removed (and replaced) per day")
+    parser.add_argument("--report-every", type=int, default=365, help="Report query times every this many days")
+    parser.add_argument("--max-query-ms", type=float, default=100.0, help="Fail if a query takes longer")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    market = dict(new_ad(rng, number) for number in range(args.ads))
+    removed = {}
+    next_number = args.ads
+    start_time = time.time() - args.days * SECONDS_PER_DAY
+
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        history = ListingHistory(os.path.join(directory, "history.sqlite"))
+        record_seconds = 0.0
+        for day in range(1, args.days + 1):
+            now = start_time + day * SECONDS_PER_DAY
+            start = time.perf_counter()
+            history.observe(SITE, SEARCH_KEY, market.items(), observed=now)
+            history.mark_removed(SITE, SEARCH_KEY, market, observed=now)
+            record_seconds += time.perf_counter() - start
+
+            if day % args.report_every and day != args.days:
+                next_number = simulate_day(rng, market, removed, next_number, args.change_rate, args.churn)
+                continue
+            week_ms, week = timed_ms(lambda: history.price_changes(7, now=now))
+            month_ms, month = timed_ms(lambda: history.price_changes(30, now=now, drops_only=True))
+            removed_ms, gone = timed_ms(lambda: history.changes(7, ["removed"], now=now))
+            ad_ms, _ = timed_ms(lambda: history.ad_history(next(iter(market))))
+            rows = history.conn.execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+            size_mb = sum(
+                os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+            ) / 1e6
+            print(
+                f"day {day}: {rows} change rows, {size_mb:.1f} MB, recording {record_seconds * 1000 / day:.0f} ms/day "
+                f"({args.ads * day / record_seconds:.0f} ads/s)"
+            )
+            print(
+                f"  price changes 7d: {len(week)} rows in {week_ms:.1f} ms; drops 30d: {len(month)} rows in {month_ms:.1f} ms; "
+                f"removed 7d: {len(gone)} rows in {removed_ms:.1f} ms; one ad: {ad_ms:.1f} ms"
+            )
+            slowest = max(week_ms, month_ms, removed_ms, ad_ms)
+            if slowest > args.max_query_ms:
+                print(f"  slowest query {slowest:.1f} ms exceeds {args.max_query_ms} ms")
+                ok = False
+            next_number = simulate_day(rng, market, removed, next_number, args.change_rate, args.churn)
+        history.close()
+
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# bench_normalize.py
+#
+# Compares normalizing scraped records one field at a time (the old
+# clean_number / to_numeric path) with the vectorized normalize_frame,
+# in rows per second.
+#
+#   python benchmarks/bench_normalize.py --rows 200000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pandas as pd
+
+from normalize import normalize_frame
+from parsers import CAR_COLUMNS, clean_number
+
+
+def make_records(rows, seed=1):
+    """Builds raw string records with the spellings both sites produce."""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(rows):
+        records.append({
+            "Price": rng.choice([f"Rs. {rng.randrange(20, 600) * 25_000:,}", "Rs. 12.5 Mn", "45 Lakhs", "N/A", "Negotiable"]),
+            "District": rng.choice(["Colombo", "Gampaha", "Kandy", "Unknown"]),
+            "Brand": rng.choice(["Toyota", "TOYOTA", "honda", "Mercedes Benz", "N/A"]),
+            "Model": rng.choice(["Axio", "AXIO", "premio", "C-HR", "Vezel"]),
+            "Year of Manufacture": rng.choice(["2015", "2018", "N/A"]),
+            "Fuel Type": rng.choice(["Petrol", "petrol", "Hybrid", "Diesel", "N/A"]),
+            "Transmission": rng.choice(["Automatic", "auto", "Manual", "N/A"]),
+            "Engine Capacity": rng.choice(["1,500 cc", "1500", "1.5L", "N/A"]),
+            "Mileage": rng.choice([f"{rng.randrange(1, 300) * 1_000:,} km", "45000", "N/A"]),
+        })
+    return records
+
+
+def normalize_per_record(records):
+    """The old path: per-field cleaning in Python, then to_numeric per column."""
+    cleaned = []
+    for record in records:
+        row = {}
+        for column in CAR_COLUMNS:
+            value = record.get(column, "N/A")
+            if column in ("Price", "Mileage", "Engine Capacity", "Year of Manufacture"):
+                value = clean_number(value)
+            else:
+                value = value.strip().replace("N/A", "").replace("Unknown", "")
+            row[column] = value
+        cleaned.append(row)
+    df = pd.DataFrame(cleaned, columns=CAR_COLUMNS)
+    for column in ("Price", "Mileage", "Engine Capacity", "Year of Manufacture"):
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def timed(label, func, records):
+    start = time.perf_counter()
+    func(records)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>12}: {len(records) / elapsed:10.0f} rows/s ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-record vs vectorized normalization.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of synthetic records")
+    args = parser.parse_args()
+
+    records = make_records(args.rows)
+    timed("per-record", normalize_per_record, records)
+    timed("vectorized", lambda rows: normalize_frame(pd.DataFrame(rows, columns=CAR_COLUMNS)), records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench_parsers.py
+#
+# Checks every parser backend against the golden outputs of the saved pages
+# in fixtures/, then reports pages parsed per second for each backend.
+# Exits non-zero if any backend disagrees with a golden file.
+#
+#   python benchmarks/bench_parsers.py
+#   python benchmarks/bench_parsers.py --update-golden   # after a deliberate change
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import parsers
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+GOLDEN_DIR = os.path.join(BENCH_DIR, "golden")
+
+# Fixture file prefix -> backend method that parses it, and the suffix of
+# its golden file (pages read by more than one method get one per method)
+PAGE_KINDS = [
+    ("ikman_ad", "parse_ikman_ad", ""),
+    ("ikman_search", "parse_ikman_search_page", ""),
+    ("ikman_search", "parse_ikman_search_cards", ".cards"),
+    ("riyasewana_ad", "parse_riyasewana_listing", ""),
+    ("riyasewana_search", "parse_riyasewana_search_page", ""),
+]
+
+
+def load_pages():
+    """Returns (fixture name, parse method name, golden file, raw bytes) for every saved page and method."""
+    pages = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+            content = f.read()
+        for prefix, method, suffix in PAGE_KINDS:
+            if name.startswith(prefix):
+                golden = os.path.join(GOLDEN_DIR, name.replace(".html", f"{suffix}.json"))
+                pages.append((name, method, golden, content))
+    return pages
+
+
+def update_golden(pages):
+    """Regenerates golden files from the reference bs4 backend."""
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    reference = parsers.get_backend("bs4")
+    for _, method, golden, content in pages:
+        with open(golden, "w", encoding="utf-8") as f:
+            json.dump(getattr(reference, method)(content), f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"wrote {golden}")
+
+
+def check_golden(pages):
+    """Compares every backend's output with the golden files. Returns the failure count."""
+    failures = 0
+    for backend_name in parsers.BACKENDS:
+        backend = parsers.get_backend(backend_name)
+        for name, method, golden, content in pages:
+            with open(golden, encoding="utf-8") as f:
+                expected = json.load(f)
+            actual = getattr(backend, method)(content)
+            if actual != expected:
+                failures += 1
+                print(f"MISMATCH {backend_name} {name} ({method}):\n  expected {expected}\n  actual   {actual}")
+    return failures
+
+
+def benchmark(pages, seconds):
+    """Parses the saved pages round-robin for about `seconds` per backend."""
+    for backend_name in parsers.BACKENDS:
+        backend = parsers.get_backend(backend_name)
+        parsed = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            for _, method, _, content in pages:
+                getattr(backend, method)(content)
+            parsed += len(pages)
+        elapsed = time.perf_counter() - start
+        print(f"{backend_name:>6}: {parsed / elapsed:8.0f} pages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify parser backends against golden files and benchmark them.")
+    parser.add_argument("--update-golden", action="store_true", help="Rewrite golden files from the bs4 backend")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Benchmark time per backend")
+    args = parser.parse_args()
+
+    pages = load_pages()
+    if args.update_golden:
+        update_golden(pages)
+        return
+
+    failures = check_golden(pages)
+    if failures:
+        print(f"{failures} golden mismatches")
+        sys.exit(1)
+    print(f"{len(pages)} pages match the golden files for: {', '.join(parsers.BACKENDS)}")
+    benchmark(pages, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
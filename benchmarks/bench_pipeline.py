@@ -0,0 +1,214 @@
+# bench_pipeline.py
+#
+# End-to-end benchmark of the scrape engines against the recorded fixture
+# pages (fixture_server.py), with configurable latency, jitter, error
+# injection and a server capacity beyond which requests get a 429. Each
+# engine runs in its own process, so its peak RSS and CPU time are its
+# own, and reports ads per second, p50/p95 request latency, peak RSS and
+# CPU milliseconds per ad.
+#
+#   python benchmarks/bench_pipeline.py
+#   python benchmarks/bench_pipeline.py --engines ikman orchestrator --latency 0.1 --error-rate 0.05
+#   python benchmarks/bench_pipeline.py --pages 10 --capacity 3 --retry-after 1
+#
+# With --check, the run fails (exit code 1) if any engine misses the limits
+# in pipeline_thresholds.json. The thresholds are set for the default
+# settings with a good margin; raise or lower them deliberately when an
+# engine's performance is meant to change.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+THRESHOLDS_FILE = os.path.join(BENCH_DIR, "pipeline_thresholds.json")
+
+ENGINES = ["ikman", "riyasewana", "orchestrator", "summary"]
+
+# The search every engine runs; the fixture server ignores the filters
+SEARCH = ("colombo", "", "", "toyota", "2000", "2024", "petrol", "automatic")
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_engine(engine, pages, rps):
+    """Runs one engine against the already patched base URLs; returns the ads scraped."""
+    import scraper
+
+    if engine == "ikman":
+        return len(scraper.scrape_ikman_cars(*SEARCH, pages, requests_per_second=rps))
+    if engine == "riyasewana":
+        return len(scraper.scrape_riyasewana_cars(*SEARCH, pages))
+
+    from adapters import ADAPTERS, Search
+    from orchestrator import ScrapeJob, scrape_all
+
+    jobs = [ScrapeJob(adapter, Search(*SEARCH), pages) for adapter in ADAPTERS.values()]
+    _, stats = scrape_all(jobs, requests_per_second=rps, log=lambda message: None, summary=engine == "summary")
+    return stats["ads"]
+
+
+def child_main(engine, base_url, pages, rps):
+    """Runs in the engine's own process: times every request and prints a JSON result."""
+    import http_session
+    import scraper
+
+    scraper.IKMAN_BASE_URL = scraper.RIYASEWANA_BASE_URL = base_url
+
+    # Every engine fetches through http_session.get
+    latencies = []
+    lock = threading.Lock()
+    untimed_get = http_session.get
+
+    def timed_get(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return untimed_get(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    http_session.get = timed_get
+
+    # The scrapers import these on first use; load them up front so the
+    # numbers are per-ad work, not startup (bench_startup.py measures that)
+    import bs4  # noqa: F401
+    import pandas  # noqa: F401
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    # The legacy engines print every ad; keep the result line clean
+    with contextlib.redirect_stdout(io.StringIO()):
+        ads = run_engine(engine, pages, rps)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    latencies.sort()
+    result = {
+        "engine": engine,
+        "ads": ads,
+        "requests": len(latencies),
+        "elapsed_s": elapsed,
+        "ads_per_s": ads / elapsed if elapsed else 0.0,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000 if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "cpu_ms_per_ad": cpu * 1000 / ads if ads else None,
+    }
+    print(json.dumps(result))
+
+
+def run_child(engine, base_url, pages, rps):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", engine,
+         "--base-url", base_url, "--pages", str(pages), "--rps", str(rps)],
+        capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{engine} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def check_thresholds(result, limits):
+    """Returns a description of every limit the result misses."""
+    failures = []
+    checks = [
+        ("min_ads", "ads", lambda value, limit: value >= limit),
+        ("min_ads_per_s", "ads_per_s", lambda value, limit: value >= limit),
+        ("max_p95_ms", "p95_ms", lambda value, limit: value <= limit),
+        ("max_peak_rss_mb", "peak_rss_mb", lambda value, limit: value <= limit),
+        ("max_cpu_ms_per_ad", "cpu_ms_per_ad", lambda value, limit: value <= limit),
+    ]
+    for name, key, passes in checks:
+        limit, value = limits.get(name), result.get(key)
+        if limit is None or value is None:
+            continue
+        if not passes(value, limit):
+            failures.append(f"{key} = {value:.2f}, limit {name} = {limit}")
+    return failures
+
+
+def format_value(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrape engines end to end against recorded pages.")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("--pages", type=int, default=2, help="Listing pages per site")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server delay per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random delay of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument("--capacity", type=int, help="Requests the server handles at once; more get a 429")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with 429 and 503 responses")
+    parser.add_argument("--rps", type=float, default=20.0, help="Per-host requests per second for the rate-limited engines")
+    parser.add_argument("--check", action="store_true", help="Fail if an engine misses its limits in pipeline_thresholds.json")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.base_url, args.pages, args.rps)
+        return 0
+
+    from fixture_server import FixtureServer
+
+    results = []
+    with FixtureServer(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, last_page=args.pages,
+        capacity=args.capacity, retry_after=args.retry_after,
+    ) as server:
+        for engine in args.engines:
+            requests_before, errors_before, throttled_before = server.requests, server.errors, server.throttled
+            result = run_child(engine, server.base_url, args.pages, args.rps)
+            result["injected_errors"] = server.errors - errors_before
+            result["throttled"] = server.throttled - throttled_before
+            result["served"] = server.requests - requests_before
+            results.append(result)
+
+    print(f"{'engine':<14}{'ads':>6}{'ads/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'RSS MB':>9}{'CPU ms/ad':>11}{'503s':>6}{'429s':>6}")
+    for result in results:
+        print(
+            f"{result['engine']:<14}{result['ads']:>6}{result['ads_per_s']:>9.2f}"
+            f"{format_value(result['p50_ms'], '.1f'):>9}{format_value(result['p95_ms'], '.1f'):>9}"
+            f"{format_value(result['peak_rss_mb'], '.0f'):>9}{format_value(result['cpu_ms_per_ad'], '.1f'):>11}"
+            f"{result['injected_errors']:>6}{result['throttled']:>6}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if not args.check:
+        return 0
+    with open(THRESHOLDS_FILE, encoding="utf-8") as f:
+        thresholds = json.load(f)
+    failed = False
+    for result in results:
+        for failure in check_thresholds(result, thresholds.get(result["engine"], {})):
+            print(f"REGRESSION {result['engine']}: {failure}")
+            failed = True
+    print("FAIL" if failed else "All engines within their thresholds.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
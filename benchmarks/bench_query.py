@@ -0,0 +1,93 @@
+# bench_query.py
+#
+# Builds the Filter Results indexes (query.py) over a synthetic multi-million
+# row history, checks typical queries against a plain pandas scan, and
+# reports the time of each. Exits non-zero if a query returns different
+# rows or exceeds the interactive budget.
+#
+#   python benchmarks/bench_query.py --rows 2000000
+
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+import pandas as pd
+
+from query import ResultIndex
+
+# Interactive filtering must stay under this, in milliseconds
+BUDGET_MS = 50
+
+QUERIES = [
+    {"model": "vezel"},
+    {"model": "axio"},
+    {"ranges": {"Mileage": (0, 100_000)}},
+    {"ranges": {"Year of Manufacture": (2015, None), "Price": (None, 5_000_000)}},
+    {"model": "axio 12", "ranges": {"Price": (1_000_000, 5_000_000)}, "values": {"Fuel Type": "hybrid"}},
+    {"values": {"District": "colombo", "Transmission": "manual"}},
+]
+
+
+def make_history(rows, seed=1):
+    rng = np.random.default_rng(seed)
+    models = [f"Axio {i}" for i in range(3000)] + ["Vezel", "Premio", "Corolla Axio"]
+    return pd.DataFrame({
+        "Brand": rng.choice(["Toyota", "Honda", "Nissan"], rows),
+        "Model": rng.choice(models, rows),
+        "Year of Manufacture": rng.integers(2000, 2025, rows),
+        "Price": rng.integers(20, 600, rows) * 25_000,
+        "Mileage": rng.integers(0, 300, rows) * 1_000,
+        "Fuel Type": rng.choice(["Petrol", "Hybrid", "Diesel"], rows),
+        "Transmission": rng.choice(["Automatic", "Manual"], rows),
+        "District": rng.choice(["Colombo", "Gampaha", "Kandy", "Galle"], rows),
+    })
+
+
+def scan(df, model=None, ranges=None, values=None):
+    """The same query as a full pandas scan, for checking results."""
+    mask = np.ones(len(df), dtype=bool)
+    if model:
+        mask &= df["Model"].str.lower().str.contains(model.lower(), regex=False).to_numpy()
+    for column, (low, high) in (ranges or {}).items():
+        if low is not None:
+            mask &= (df[column] >= low).to_numpy()
+        if high is not None:
+            mask &= (df[column] <= high).to_numpy()
+    for column, value in (values or {}).items():
+        mask &= (df[column].str.lower() == value.lower()).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the indexed filter queries.")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Rows of synthetic history")
+    args = parser.parse_args()
+
+    df = make_history(args.rows)
+    start = time.perf_counter()
+    index = ResultIndex(df)
+    print(f"indexed {args.rows} rows in {time.perf_counter() - start:.2f}s")
+
+    failures = 0
+    for query in QUERIES:
+        start = time.perf_counter()
+        rows = index.query(**query)
+        index.average_price(rows)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        ok = np.array_equal(rows, scan(df, **query))
+        slow = elapsed_ms > BUDGET_MS
+        failures += (not ok) + slow
+        status = "MISMATCH" if not ok else "SLOW" if slow else "ok"
+        print(f"{elapsed_ms:7.1f} ms {len(rows):>9} rows  {status:<8} {query}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
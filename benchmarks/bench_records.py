@@ -0,0 +1,141 @@
+# bench_records.py
+#
+# Measures with tracemalloc what scraped records cost in memory: a list of
+# per-ad dicts (how the scrapers used to collect them) against a
+# records.RecordBatch, for records made from the saved pages in fixtures/
+# with a distinct price and mileage each. Also reports how much of a
+# BeautifulSoup tree is left behind per parsed page when it is not
+# decomposed, against the parsers backend, which decomposes it.
+# Exits non-zero if the batch does not use at most 1/--min-reduction of the
+# dicts' memory or builds a different DataFrame, or if the backend leaves
+# more than a tenth of an undecomposed tree behind.
+#
+#   python benchmarks/bench_records.py --records 200000
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import parsers
+from parsers import CAR_COLUMNS
+from records import RecordBatch
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+# Fixture file prefix -> backend method that parses it into a record
+DETAIL_PAGES = {"ikman_ad": "parse_ikman_ad", "riyasewana_ad": "parse_riyasewana_listing"}
+
+
+def load_detail_pages():
+    pages = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        method = next((method for prefix, method in DETAIL_PAGES.items() if name.startswith(prefix)), None)
+        if method is not None:
+            with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+                pages.append((method, f.read()))
+    return pages
+
+
+def fresh(value):
+    """A new string object equal to value, as a parser would return for each page."""
+    return value if value is None else (value + " ")[:-1]
+
+
+def scraped_records(templates, count):
+    """Yields count records like the parsers return: new dicts of new strings, each ad with its own price and mileage."""
+    for number in range(count):
+        record = {name: fresh(value) for name, value in templates[number % len(templates)].items()}
+        record["Price"] = str(1_000_000 + number * 1000)
+        record["Mileage"] = str(10_000 + number * 7 % 250_000)
+        yield record
+
+
+def measure(build):
+    """Bytes still allocated after build() returns, with its result alive, and the result."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def left_behind_per_page(parse, pages, repeat):
+    """Bytes per parsed page still allocated before the cycle collector runs."""
+    gc.collect()
+    gc.disable()
+    try:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(repeat):
+            for method, content in pages:
+                parse(method, content)
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    finally:
+        gc.enable()
+        gc.collect()
+    return (after - before) / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per record with tracemalloc.")
+    parser.add_argument("--records", type=int, default=100_000, help="Records to hold in memory")
+    parser.add_argument("--pages", type=int, default=20, help="Times to parse each saved page for the soup check")
+    parser.add_argument("--min-reduction", type=float, default=2.0, help="Fail unless the batch is this many times smaller")
+    args = parser.parse_args()
+
+    pages = load_detail_pages()
+    backend = parsers.get_backend("bs4")
+    templates = [getattr(backend, method)(content) for method, content in pages]
+
+    dict_bytes, dicts = measure(lambda: list(scraped_records(templates, args.records)))
+    batch_bytes, batch = measure(lambda: RecordBatch(scraped_records(templates, args.records)))
+    reduction = dict_bytes / batch_bytes
+    print(f"{args.records} records:")
+    print(f"  list of dicts: {dict_bytes / args.records:7.0f} bytes/record ({dict_bytes / 1e6:.1f} MB)")
+    print(f"  RecordBatch:   {batch_bytes / args.records:7.0f} bytes/record ({batch_bytes / 1e6:.1f} MB), {reduction:.1f}x smaller")
+
+    start = time.perf_counter()
+    expected = pd.DataFrame(dicts, columns=CAR_COLUMNS)
+    dicts_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    frame = batch.to_frame()
+    batch_ms = (time.perf_counter() - start) * 1000
+    print(f"  DataFrame build: {dicts_ms:.0f} ms from dicts, {batch_ms:.0f} ms from the batch")
+    same = frame.equals(expected)
+    del dicts, batch, expected, frame
+
+    kept = left_behind_per_page(lambda method, content: BeautifulSoup(content, "html.parser"), pages, args.pages)
+    parsed = left_behind_per_page(lambda method, content: getattr(backend, method)(content), pages, args.pages)
+    print("Per detail page, before the cycle collector runs:")
+    print(f"  soup not decomposed: {kept / 1024:7.1f} KB left behind")
+    print(f"  bs4 backend:         {parsed / 1024:7.1f} KB left behind")
+
+    ok = True
+    if not same:
+        print("RecordBatch built a different DataFrame than the dicts")
+        ok = False
+    if reduction < args.min_reduction:
+        print(f"RecordBatch is only {reduction:.1f}x smaller; expected at least {args.min_reduction}x")
+        ok = False
+    if parsed > kept / 10:
+        print("The bs4 backend leaves parse trees behind for the cycle collector")
+        ok = False
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
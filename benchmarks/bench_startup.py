@@ -0,0 +1,166 @@
+# bench_startup.py
+#
+# Cold-start latency of the two entry points, each run in a fresh
+# interpreter with -X importtime:
+#
+#   gui     python app.py up to the window being drawn (or, without a
+#           display, up to app.py being imported)
+#   scrape  a one-page ikman.lk scrape through cli.py against the local
+#           fixture server, from interpreter start to exit
+#
+# For each it reports the median wall time over --repeat runs, the time
+# spent importing, the slowest top-level imports, and which of the heavy
+# libraries were loaded. With --check the run fails (exit code 1) if a
+# heavy library loads before the window appears or during a headless
+# one-page scrape, or if a median exceeds --max-gui-ms / --max-scrape-ms.
+#
+#   python benchmarks/bench_startup.py
+#   python benchmarks/bench_startup.py --repeat 10 --check
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from fixture_server import FixtureServer
+
+# Libraries that should only load on the code paths that need them
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "bs4", "requests"]
+
+# Not needed before the GUI window appears, nor for a one-page CLI scrape
+# (requests is, to fetch the pages)
+GUI_DEFERRED = ["pandas", "numpy", "pyarrow", "bs4", "requests"]
+SCRAPE_DEFERRED = ["pandas", "numpy", "pyarrow", "bs4"]
+
+# Runs in the child interpreter; prints a JSON line with wall clock times
+GUI_DRIVER = """
+import json, sys, time
+import tkinter as tk
+import app
+result = {"imported": time.time()}
+try:
+    root = tk.Tk()
+except tk.TclError:
+    result["window"] = None
+else:
+    gui = app.CarScraperGUI(root)
+    root.update()
+    result["window"] = time.time()
+    result["loaded_before_window"] = sorted(sys.modules)
+    gui.services_loaded.wait()
+    result["ready"] = time.time()
+    root.destroy()
+result.setdefault("loaded_before_window", sorted(sys.modules))
+print(json.dumps(result))
+"""
+
+SCRAPE_DRIVER = """
+import json, sys, time
+import scraper
+scraper.IKMAN_BASE_URL = scraper.RIYASEWANA_BASE_URL = sys.argv[1]
+import cli
+status = cli.main(sys.argv[2:])
+print(json.dumps({"done": time.time(), "status": status, "loaded": sorted(sys.modules)}))
+"""
+
+
+def parse_importtime(stderr):
+    """Returns (total import seconds, [(cumulative seconds, module)] of top-level imports)."""
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that triggered them
+        if name.startswith("  "):
+            continue
+        top_level.append((int(cumulative) / 1e6, name.strip()))
+    return sum(seconds for seconds, _ in top_level), top_level
+
+
+def run(code, args=()):
+    """Runs code in a fresh interpreter; returns (seconds from spawn, its JSON result, import stats)."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="")
+    start = time.time()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args],
+        cwd=ROOT_DIR, capture_output=True, text=True, env=env,
+    )
+    if completed.returncode not in (0, 1):
+        raise RuntimeError(completed.stderr[-2000:])
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return start, result, parse_importtime(completed.stderr)
+
+
+def summarize(name, samples, deferred, limit_ms):
+    """Prints one scenario's medians; returns a list of problems found."""
+    wall_ms = statistics.median(wall for wall, _, _, _ in samples) * 1000
+    import_ms = statistics.median(imports for _, imports, _, _ in samples) * 1000
+    _, _, top_level, loaded = samples[-1]
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    print(f"{name}: {wall_ms:.0f} ms median, {import_ms:.0f} ms of it importing")
+    for seconds, module in sorted(top_level, reverse=True)[:6]:
+        print(f"  {seconds * 1000:7.1f} ms  {module}")
+    print(f"  heavy libraries loaded: {', '.join(heavy) or 'none'}")
+
+    problems = [f"{name} loads {module}" for module in deferred if module in loaded]
+    if limit_ms is not None and wall_ms > limit_ms:
+        problems.append(f"{name} takes {wall_ms:.0f} ms, limit {limit_ms} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start latency of the GUI and a one-page scrape.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario; medians are reported")
+    parser.add_argument("--check", action="store_true", help="Fail on deferred libraries loading early or slow starts")
+    parser.add_argument("--max-gui-ms", type=float, help="With --check, limit on the median time to the window")
+    parser.add_argument("--max-scrape-ms", type=float, help="With --check, limit on the median one-page scrape")
+    args = parser.parse_args()
+
+    problems = []
+
+    gui_samples = []
+    for _ in range(args.repeat):
+        start, result, (imports, top_level) = run(GUI_DRIVER)
+        shown = result["window"] or result["imported"]
+        gui_samples.append((shown - start, imports, top_level, set(result["loaded_before_window"])))
+    if result["window"] is None:
+        print("No display: measuring the GUI up to importing app.py, not to the window.")
+    else:
+        ready_ms = (result["ready"] - start) * 1000
+        print(f"(last run: stores and caches loaded in the background by {ready_ms:.0f} ms)")
+    problems += summarize("gui", gui_samples, GUI_DEFERRED, args.max_gui_ms)
+
+    scrape_samples = []
+    with FixtureServer(latency=0.0, last_page=1) as server, tempfile.TemporaryDirectory() as directory:
+        job_file = os.path.join(directory, "job.json")
+        with open(job_file, "w", encoding="utf-8") as f:
+            json.dump({"sites": ["ikman.lk"], "pages": 1, "searches": [{"districts": "colombo", "brands": "toyota"}]}, f)
+        output = os.path.join(directory, "out.csv")
+        for _ in range(args.repeat):
+            start, result, (imports, top_level) = run(
+                SCRAPE_DRIVER, [server.base_url, job_file, "--output", output, "--quiet"]
+            )
+            if result["status"] != 0:
+                problems.append(f"scrape exited with status {result['status']}")
+            scrape_samples.append((result["done"] - start, imports, top_level, set(result["loaded"])))
+    problems += summarize("scrape", scrape_samples, SCRAPE_DEFERRED, args.max_scrape_ms)
+
+    if not args.check:
+        return 0
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    print("FAIL" if problems else "OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
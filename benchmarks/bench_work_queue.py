@@ -0,0 +1,106 @@
+# bench_work_queue.py
+#
+# Runs the distributed work queue (work_queue.py) against the local fixture
+# server with 1, 2 and 4 worker processes and reports how throughput
+# scales, then kills a worker mid-run and checks that every ad is still
+# scraped exactly once. Exits non-zero if any run loses or duplicates ads.
+#
+#   python benchmarks/bench_work_queue.py --pages 4 --latency 0.1
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper
+from adapters import Search
+from fixture_server import FixtureServer
+from work_queue import WorkQueue, Worker, plan
+
+SEARCH = Search("colombo", "", "", "toyota", "2000", "2024", "petrol", "automatic")
+
+
+def worker_process(path, base_url, visibility_timeout):
+    # Worker processes may be spawned rather than forked; point them at the fixtures
+    scraper.IKMAN_BASE_URL = scraper.RIYASEWANA_BASE_URL = base_url
+    queue = WorkQueue(path, visibility_timeout=visibility_timeout)
+    Worker(queue, requests_per_second=0, log=lambda message: None).run()
+    queue.close()
+
+
+def start_workers(path, base_url, count, visibility_timeout):
+    processes = [
+        multiprocessing.Process(target=worker_process, args=(path, base_url, visibility_timeout))
+        for _ in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def new_queue(directory, name, base_url, pages, visibility_timeout):
+    scraper.IKMAN_BASE_URL = scraper.RIYASEWANA_BASE_URL = base_url
+    path = os.path.join(directory, f"{name}.sqlite")
+    queue = WorkQueue(path, visibility_timeout=visibility_timeout)
+    plan(queue, [SEARCH], ["ikman.lk", "riyasewana.com"], pages)
+    return path, queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark work queue scaling and crash recovery.")
+    parser.add_argument("--pages", type=int, default=4, help="Result pages per site")
+    parser.add_argument("--latency", type=float, default=0.1, help="Server delay per request in seconds")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    ok = True
+    with FixtureServer(latency=args.latency, last_page=args.pages) as server, tempfile.TemporaryDirectory() as directory:
+        baseline = None
+        expected = None
+        for count in args.workers:
+            path, queue = new_queue(directory, f"workers{count}", server.base_url, args.pages, 60)
+            start = time.perf_counter()
+            for process in start_workers(path, server.base_url, count, 60):
+                process.join()
+            elapsed = time.perf_counter() - start
+
+            records = queue.record_count()
+            expected = expected or records
+            rate = records / elapsed
+            baseline = baseline or rate
+            print(f"{count} worker(s): {records} ads in {elapsed:.2f}s ({rate:.1f} ads/s, {rate / baseline:.2f}x)")
+            if records != expected or queue.unfinished():
+                print(f"  expected {expected} ads and no unfinished tasks")
+                ok = False
+            queue.close()
+
+        # Kill one of two workers mid-run; its leased task must come back
+        visibility_timeout = 2
+        path, queue = new_queue(directory, "killed", server.base_url, args.pages, visibility_timeout)
+        processes = start_workers(path, server.base_url, 2, visibility_timeout)
+        time.sleep(max(0.5, 5 * args.latency))
+        processes[0].kill()
+        for process in processes:
+            process.join()
+        # The survivor may have drained the rest before the lease expired
+        if queue.unfinished():
+            for process in start_workers(path, server.base_url, 1, visibility_timeout):
+                process.join()
+        records = queue.record_count()
+        done = sum(count for (kind, state), count in queue.counts().items() if state == "done")
+        print(f"killed worker: {records} ads, {done} tasks done, {queue.unfinished()} unfinished")
+        if records != expected or queue.unfinished():
+            print(f"  expected {expected} ads and no unfinished tasks")
+            ok = False
+        queue.close()
+
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
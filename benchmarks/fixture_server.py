@@ -0,0 +1,151 @@
+# fixture_server.py
+
+import os
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# URL path prefix -> fixture file served for it
+ROUTES = [
+    ("/en/ads/", "ikman_search.html"),
+    ("/en/ad/", "ikman_ad.html"),
+    ("/search/cars/", "riyasewana_search.html"),
+    ("/buy/", "riyasewana_ad.html"),
+]
+
+
+def load_fixture(name):
+    """Reads a recorded page from the fixtures directory."""
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Serves the recorded ikman and riyasewana pages with an artificial
+    delay, failing a share of requests with a 503 and throttling requests
+    beyond the server's capacity with a 429 if asked to.
+    """
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        page = query.get("page", ["1"])[0]
+
+        for prefix, fixture in ROUTES:
+            if parsed.path.startswith(prefix):
+                break
+        else:
+            self.send_error(404)
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            if server.capacity is not None and server.in_flight >= server.capacity:
+                server.throttled += 1
+                self.send_refusal(429)
+                return
+            server.in_flight += 1
+            delay = server.latency + server.random.uniform(0, server.jitter)
+            fail = server.random.random() < server.error_rate
+            if fail:
+                server.errors += 1
+        try:
+            time.sleep(delay)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        if fail:
+            self.send_refusal(503)
+            return
+
+        # Past the last page, serve the last page again like the real sites do
+        last_page = self.server.last_page
+        if last_page is not None and int(page) > last_page:
+            page = str(last_page)
+
+        # Search pages get unique ad links per page number
+        body = self.server.fixtures[fixture].replace("__PAGE__", page).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away, e.g. a killed benchmark worker
+
+    def send_refusal(self, status):
+        self.send_response(status)
+        if self.server.retry_after is not None:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+
+class FixtureServer:
+    """
+    A local HTTP stand-in for ikman.lk and riyasewana.com, run on a
+    background thread. Use as a context manager; base_url is set on entry.
+    With last_page, search pages after it repeat the last page.
+
+    Each response waits latency plus a uniform 0..jitter seconds, and a
+    share error_rate of requests get a 503 instead. The random draws are
+    seeded, so runs with the same settings see the same delays and errors.
+    With capacity, requests beyond that many in flight get a 429 at once.
+    Refusals carry a Retry-After of retry_after seconds, if given.
+    requests, errors and throttled count what was served.
+    """
+
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0, last_page=None, jitter=0.0, error_rate=0.0, seed=0,
+                 capacity=None, retry_after=None):
+        self.httpd = ThreadingHTTPServer((host, port), FixtureHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.jitter = jitter
+        self.httpd.error_rate = error_rate
+        self.httpd.random = random.Random(seed)
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.errors = 0
+        self.httpd.capacity = capacity
+        self.httpd.retry_after = retry_after
+        self.httpd.in_flight = 0
+        self.httpd.throttled = 0
+        self.httpd.last_page = last_page
+        self.httpd.fixtures = {name: load_fixture(name) for _, name in ROUTES}
+        self.thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def errors(self):
+        return self.httpd.errors
+
+    @property
+    def throttled(self):
+        return self.httpd.throttled
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
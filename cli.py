@@ -0,0 +1,262 @@
+# cli.py
+#
+# Headless batch mode: expands a job file into searches and runs them all
+# through the orchestrator, e.g. from cron or a container.
+#
+#   python cli.py sweep.json --output results/sweep.csv
+#
+# A job file (JSON, or YAML if PyYAML is installed) looks like:
+#
+#   {
+#     "sites": ["ikman.lk", "riyasewana.com"],
+#     "pages": 5,
+#     "searches": [
+#       {"districts": "all", "brands": ["toyota", "honda"],
+#        "year_ranges": [[2010, 2015], [2016, 2024]],
+#        "fuel_types": ["petrol", "hybrid"], "transmissions": ["automatic"],
+#        "min_price": 100, "max_price": 100000000}
+#     ]
+#   }
+#
+# Every list in a search entry is crossed with the others; scalar values
+# apply to all combinations. "districts": "all" means every district in
+# districts.json.
+#
+# For market-wide price sweeps, --summary (or "summary": true) records the
+# search result cards only, skipping detail pages; --enrich-sample 0.1
+# and --enrich-new still fetch details for a sample of ads or for new ads.
+#
+# --metrics-port 9100 serves live per-stage latency histograms and counters
+# at /metrics (Prometheus text) and /metrics.json while the run goes on;
+# --metrics-json and --profile save the final metrics and a profile.
+#
+# --history keeps a per-ad change history across runs (new ads, price and
+# mileage changes, removals); query it with history.py.
+
+import argparse
+import itertools
+import json
+import os
+import signal
+import sys
+import threading
+
+import concurrency
+import http_session
+from adapters import ADAPTERS, Search
+from history import DEFAULT_HISTORY_PATH, ListingHistory
+from http_cache import ResponseCache
+from orchestrator import ScrapeJob, scrape_all
+from parsers import CAR_COLUMNS
+from pipeline import ParsePool
+from seen_index import SeenIndex
+from sinks import open_sink
+from telemetry import get_metrics, profiled, serve_metrics
+
+DISTRICTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "districts.json")
+
+
+def load_job_file(path):
+    """Reads a JSON or YAML job file."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def all_districts():
+    with open(DISTRICTS_FILE, encoding="utf-8") as f:
+        return [entry["District"].lower() for entry in json.load(f)]
+
+
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def expand_searches(entries):
+    """
+    Expands job file search entries into unique Search tuples, preserving
+    the order of first appearance so overlapping entries are only run once.
+    """
+    searches = {}
+    for entry in entries:
+        districts = entry.get("districts", ["colombo"])
+        districts = all_districts() if districts == "all" else as_list(districts)
+        price_ranges = entry.get("price_ranges") or [[entry.get("min_price", ""), entry.get("max_price", "")]]
+
+        for district, brand, (min_yom, max_yom), fuel_type, transmission, (min_price, max_price) in itertools.product(
+            districts,
+            as_list(entry.get("brands", "")),
+            entry.get("year_ranges", [["", ""]]),
+            as_list(entry.get("fuel_types", "")),
+            as_list(entry.get("transmissions", "")),
+            price_ranges,
+        ):
+            search = Search(
+                str(district).lower(), str(min_price), str(max_price), str(brand).lower(),
+                str(min_yom), str(max_yom), str(fuel_type).lower(), str(transmission).lower()
+            )
+            searches.setdefault(search, None)
+    return list(searches)
+
+
+class SiteTaggingSink:
+    """Adds the site to every record written to a shared sink."""
+
+    def __init__(self, sink, site):
+        self.sink = sink
+        self.site = site
+
+    @property
+    def count(self):
+        return self.sink.count
+
+    def write(self, record):
+        self.sink.write(dict(record, Site=self.site))
+
+    def flush(self):
+        self.sink.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a batch of car ad scrapes from a job file.")
+    parser.add_argument("job_file", help="JSON or YAML job spec")
+    parser.add_argument("--output", help="Output file (.csv, .jsonl) or Parquet directory; overrides the job file")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="Output format if not implied by --output")
+    parser.add_argument("--append", action="store_true", help="Append to the output instead of replacing it")
+    parser.add_argument("--concurrency", type=int, help="Requests in flight across all sites")
+    parser.add_argument("--rps", type=float, help="Cap on requests per second per host (default: adaptive only)")
+    parser.add_argument("--max-per-host", type=int, help="Most requests in flight per host the adaptive limiter may allow")
+    parser.add_argument("--parse-workers", type=int, default=0, help="Parse in this many worker processes")
+    parser.add_argument("--cache", action="store_true", help="Use the on-disk response cache")
+    parser.add_argument("--offline", action="store_true", help="Replay cached pages only (implies --cache)")
+    parser.add_argument("--incremental", action="store_true", help="Skip ads already in the seen-ad index and append to the output")
+    parser.add_argument("--summary", action="store_true", help="Record search result cards only, without detail pages")
+    parser.add_argument("--enrich-sample", type=float, default=0.0, help="With --summary, fetch details for this share of ads")
+    parser.add_argument("--enrich-new", action="store_true", help="With --summary, fetch details for ads not in the seen-ad index")
+    parser.add_argument("--history", nargs="?", const=DEFAULT_HISTORY_PATH,
+                        help=f"Record price changes and removed ads in this database (default: {DEFAULT_HISTORY_PATH})")
+    parser.add_argument("--metrics-port", type=int, help="Serve /metrics and /metrics.json on this port during the run")
+    parser.add_argument("--metrics-json", help="Write the run's metrics to this JSON file")
+    parser.add_argument("--profile", help="Profile the run: cProfile stats, or pyinstrument HTML for a .html path")
+    parser.add_argument("--dry-run", action="store_true", help="Print the expanded searches and exit")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args(argv)
+
+    job = load_job_file(args.job_file)
+    sites = job.get("sites", list(ADAPTERS))
+    pages = int(job.get("pages", 1))
+    searches = expand_searches(job.get("searches", [{}]))
+    unknown_sites = [site for site in sites if site not in ADAPTERS]
+    if unknown_sites:
+        parser.error(f"Unknown sites: {', '.join(unknown_sites)}. Available: {', '.join(ADAPTERS)}")
+    summary = args.summary or job.get("summary")
+    # Without summary mode there are no cards to enrich, and the index would skip known ads
+    if args.enrich_new and not summary:
+        parser.error("--enrich-new needs --summary (or \"summary\": true in the job file)")
+    if args.enrich_sample and not summary:
+        parser.error("--enrich-sample needs --summary (or \"summary\": true in the job file)")
+
+    print(f"{len(searches)} unique searches x {len(sites)} sites x up to {pages} pages")
+    if args.dry_run:
+        for search in searches:
+            print("  " + ", ".join(f"{k}={v}" for k, v in search._asdict().items() if v))
+        return 0
+
+    if args.cache or args.offline:
+        http_session.set_cache(ResponseCache(offline=args.offline))
+
+    seen_index = SeenIndex() if args.incremental or args.enrich_new else None
+    history = ListingHistory(args.history) if args.history else None
+
+    output = args.output or job.get("output", "sweep_results.csv")
+    sink = open_sink(
+        output, format=args.format or job.get("format"), columns=CAR_COLUMNS + ["Site"],
+        # An incremental run only writes ads not seen before, so it adds to
+        # the earlier output rather than replacing it
+        append=args.append or args.incremental,
+    )
+    jobs = [
+        ScrapeJob(ADAPTERS[site], search, pages, SiteTaggingSink(sink, site))
+        for search in searches for site in sites
+    ]
+
+    # Ctrl+C / SIGTERM stop the run cleanly, keeping what was scraped
+    stop_flag = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_flag.set())
+
+    options = {"stop_flag": stop_flag, "seen_index": seen_index, "history": history}
+    if summary:
+        options.update(summary=True, enrich_sample=args.enrich_sample or job.get("enrich_sample", 0.0), enrich_new=args.enrich_new)
+    if args.concurrency:
+        options["max_concurrency"] = args.concurrency
+    elif "max_concurrency" in job:
+        options["max_concurrency"] = job["max_concurrency"]
+    if args.max_per_host:
+        concurrency.configure(max_limit=args.max_per_host)
+    if args.rps:
+        options["requests_per_second"] = args.rps
+    elif "requests_per_second" in job:
+        options["requests_per_second"] = job["requests_per_second"]
+    if args.quiet:
+        options["log"] = lambda message: None
+
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = serve_metrics(args.metrics_port)
+        print(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+
+    parse_pool = None
+    if args.parse_workers:
+        parse_pool = ParsePool(workers=args.parse_workers)
+        options["parse_pool"] = parse_pool
+    try:
+        with profiled(args.profile):
+            _, stats = scrape_all(jobs, **options)
+    finally:
+        sink.close()
+        if parse_pool is not None:
+            parse_pool.shutdown()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    print_summary(jobs, stats, output)
+    if history is not None:
+        changes = history.summary(days=1)
+        print(f"History ({args.history}), last 24h: " + (", ".join(f"{count} {kind}" for kind, count in sorted(changes.items())) or "no changes"))
+        history.close()
+    if args.metrics_json:
+        with open(args.metrics_json, "w", encoding="utf-8") as f:
+            f.write(get_metrics().to_json())
+    return 1 if stop_flag.is_set() else 0
+
+
+def print_summary(jobs, stats, output):
+    """Prints per-site and overall throughput for the run."""
+    per_site = {}
+    for job in jobs:
+        ads, errors = per_site.get(job.adapter.site, (0, 0))
+        per_site[job.adapter.site] = (ads + job.ads, errors + job.errors)
+
+    elapsed = stats["elapsed"] or 1e-9
+    print(f"Finished in {elapsed:.1f}s: {stats['ads']} ads ({stats['ads'] / elapsed:.2f} ads/s), {stats['errors']} errors")
+    if stats['details'] < stats['ads']:
+        print(f"  {stats['details']} ads with detail pages, {stats['ads'] - stats['details']} from search result cards only")
+    for site, (ads, errors) in per_site.items():
+        print(f"  {site}: {ads} ads, {errors} errors")
+    for line in http_session.format_connection_stats():
+        print(f"  connections {line}")
+    for line in concurrency.format_limits():
+        print(f"  concurrency {line}")
+    for line in get_metrics().format_summary():
+        print(f"  {line}")
+    cache = http_session.get_cache()
+    if cache is not None:
+        print(f"  response cache: {cache.format_stats()}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
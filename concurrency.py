@@ -0,0 +1,185 @@
+# concurrency.py
+
+import threading
+import time
+from collections import deque
+
+from telemetry import get_metrics
+
+# Requests in flight per host: where a limiter starts, and its bounds
+INITIAL_LIMIT = 2
+MIN_LIMIT = 1
+MAX_LIMIT = 8
+
+# On throttling, errors or a latency spike the limit is multiplied by this
+DECREASE_FACTOR = 0.5
+
+# Recent responses per host used to judge latency and error rate
+WINDOW = 40
+MIN_SAMPLES = 10
+
+# p95 latency above this multiple of the host's baseline latency is a spike
+LATENCY_SPIKE = 3.0
+
+# The limit only grows while fewer than this share of recent responses failed
+MAX_ERROR_RATE = 0.05
+
+# After a cut, the limit stays below the level that caused it for this
+# many seconds before probing it again, rather than hitting it every few
+# round trips
+CEILING_HOLD = 30.0
+
+# Longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 120
+
+# How often waiting threads check their stop flag, in seconds
+STOP_POLL = 0.25
+
+
+class AdaptiveLimiter:
+    """
+    An AIMD limit on the requests in flight to one host, like TCP's
+    congestion window. Until the first sign of trouble each healthy
+    response while the limit is in use raises it by one (doubling it per
+    round trip); after that by 1/limit, about one more request per round
+    trip. A 429 or 5xx, a failed request or a p95 latency spike halves it,
+    at most once per round trip, and it then stays below the level that
+    caused the cut for CEILING_HOLD seconds. A Retry-After pauses every
+    request to the host.
+    """
+
+    def __init__(self, host, initial=INITIAL_LIMIT, min_limit=MIN_LIMIT, max_limit=MAX_LIMIT):
+        self.host = host
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.latencies = deque(maxlen=WINDOW)
+        self.errors = deque(maxlen=WINDOW)
+        # Typical latency of the host when healthy; drifts up slowly if the host gets slower
+        self.baseline = None
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.round_trip = 0.0
+        self.slow_start = True
+        self.ceiling = max_limit
+        self.ceiling_until = 0.0
+        get_metrics().set_gauge("concurrency_limit", host, int(self.limit))
+
+    def acquire(self, stop_flag=None):
+        """
+        Blocks until a request to the host may start. Returns False if the
+        stop flag was set while waiting, True otherwise.
+        """
+        with self.condition:
+            while True:
+                if stop_flag is not None and stop_flag.is_set():
+                    return False
+                wait_time = self.blocked_until - time.monotonic()
+                if wait_time <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return True
+                self.condition.wait(min(wait_time, STOP_POLL) if wait_time > 0 else STOP_POLL)
+
+    def release(self, latency, error=False):
+        """Records a finished request and adjusts the limit."""
+        with self.condition:
+            # Only grow a limit that is actually being used
+            was_full = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            self.errors.append(error)
+            self._update_baseline()
+
+            if error or self._spiking():
+                self._decrease()
+            elif was_full and sum(self.errors) <= MAX_ERROR_RATE * len(self.errors):
+                limit = self.limit + (1 if self.slow_start else 1 / self.limit)
+                if time.monotonic() < self.ceiling_until:
+                    limit = min(limit, self.ceiling - 1)
+                self._set_limit(max(limit, self.limit))
+            self.condition.notify_all()
+
+    def throttled(self, retry_after=None):
+        """Backs off after a 429/503 (or a failed attempt), pausing for retry_after seconds if given."""
+        with self.condition:
+            self._decrease()
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + min(retry_after, MAX_RETRY_AFTER))
+            self.condition.notify_all()
+
+    def _percentile(self, q):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def _update_baseline(self):
+        if len(self.latencies) < MIN_SAMPLES:
+            return
+        median = self._percentile(0.5)
+        if self.baseline is None or median < self.baseline:
+            self.baseline = median
+        else:
+            self.baseline += (median - self.baseline) * 0.01
+
+    def _spiking(self):
+        # A cut clears the window; one slow response after it is not a spike
+        if self.baseline is None or len(self.latencies) < MIN_SAMPLES:
+            return False
+        return self._percentile(0.95) > LATENCY_SPIKE * self.baseline
+
+    def _decrease(self):
+        now = time.monotonic()
+        # Responses already in flight report the same congestion; count it once
+        if self.latencies:
+            self.round_trip = self._percentile(0.5)
+        if now - self.last_decrease < self.round_trip:
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.ceiling = max(self.min_limit + 1, int(self.limit))
+        self.ceiling_until = now + CEILING_HOLD
+        self._set_limit(self.limit * DECREASE_FACTOR)
+        # Judge the new limit on fresh samples, not the ones that caused the cut
+        self.latencies.clear()
+        self.errors.clear()
+
+    def _set_limit(self, limit):
+        previous = int(self.limit)
+        self.limit = min(self.max_limit, max(self.min_limit, limit))
+        if int(self.limit) != previous:
+            get_metrics().set_gauge("concurrency_limit", self.host, int(self.limit))
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_limits = {"initial": INITIAL_LIMIT, "min_limit": MIN_LIMIT, "max_limit": MAX_LIMIT}
+
+
+def configure(initial=None, min_limit=None, max_limit=None):
+    """Sets the bounds for limiters created from now on."""
+    for name, value in (("initial", initial), ("min_limit", min_limit), ("max_limit", max_limit)):
+        if value is not None:
+            _limits[name] = value
+
+
+def get_limiter(host):
+    """The process-wide limiter for a host."""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = AdaptiveLimiter(host, **_limits)
+        return limiter
+
+
+def reset():
+    """Forgets every host's limiter, e.g. between benchmark runs."""
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def format_limits():
+    """One line per host with its current concurrency limit, for logs."""
+    with _limiters_lock:
+        limiters = sorted(_limiters.items())
+    return [f"{host}: {int(limiter.limit)} requests in flight allowed" for host, limiter in limiters]
@@ -0,0 +1,172 @@
+# dedupe.py
+
+import numpy as np
+import pandas as pd
+
+# Two ads are the same car when their fields agree within these limits. A
+# repost carries the seller's own numbers, so they are tight: looser ones
+# pair up unrelated cars in a crowded brand/model/year block.
+PRICE_TOLERANCE = 0.0025     # fraction of the lower price
+MILEAGE_TOLERANCE = 0.005    # fraction of the lower mileage...
+MIN_MILEAGE_SLACK = 500      # ...but at least this many km
+ENGINE_TOLERANCE = 50        # cc
+
+# Name of the column holding the duplicate cluster of every record
+CLUSTER_COLUMN = "Cluster"
+
+
+def blocking_keys(df):
+    """
+    Hashes brand, model and year into one 64-bit key per record. Only
+    records with the same key are ever compared. Records missing any of
+    the three get a null key and are never matched.
+    """
+    parts = pd.DataFrame({
+        "brand": df["Brand"].astype("string").str.lower(),
+        # "Corolla Axio", "corolla-axio" and "COROLLA AXIO" block together
+        "model": df["Model"].astype("string").str.lower().str.replace(r"[^a-z0-9]", "", regex=True),
+        "year": df["Year of Manufacture"].astype("Int64"),
+    }, index=df.index)
+    missing = parts.isna().any(axis=1) | (parts["model"] == "")
+    keys = pd.Series(pd.util.hash_pandas_object(parts.astype(str), index=False).to_numpy(), index=df.index)
+    return keys.astype("UInt64").mask(missing)
+
+
+def _compatible(values, left, right, tolerance, slack=0):
+    """True where two numeric fields agree within tolerance, or either is missing."""
+    a, b = values[left], values[right]
+    limit = np.maximum(np.fmin(a, b) * tolerance, slack)
+    return np.isnan(a) | np.isnan(b) | (np.abs(a - b) <= limit)
+
+
+def _distance(values, left, right, tolerance, slack=0):
+    """How far apart two numeric fields are, as a share of their allowed difference (1 if either is missing)."""
+    a, b = values[left], values[right]
+    limit = np.maximum(np.fmin(a, b) * tolerance, slack)
+    return np.where(np.isnan(a) | np.isnan(b), 1.0, np.abs(a - b) / np.maximum(limit, 1))
+
+
+def _mutual_pairs(count, left, right, distance):
+    """
+    Labels each of count nodes with the smaller node index of its pair,
+    pairing two nodes only if each is the other's closest match. A node is
+    in at most one pair, so loose matches cannot chain different cars
+    into one cluster.
+    """
+    labels = np.arange(count)
+    if len(left) == 0:
+        return labels
+    nodes = np.concatenate([left, right])
+    others = np.concatenate([right, left])
+    # Each node's matches, closest first
+    order = np.lexsort((np.concatenate([distance, distance]), nodes))
+    nodes, others = nodes[order], others[order]
+    first = np.r_[True, nodes[1:] != nodes[:-1]]
+    closest = np.full(count, -1)
+    closest[nodes[first]] = others[first]
+
+    paired = np.flatnonzero(closest >= 0)
+    partner = closest[paired]
+    mutual = (closest[partner] == paired) & (paired < partner)
+    labels[partner[mutual]] = paired[mutual]
+    return labels
+
+
+def assign_clusters(df, sources=None):
+    """
+    Returns a Series of cluster ids for the records in df (a normalized
+    frame, see normalize.normalize_frame). Two records of the same car
+    share an id; every other record gets an id of its own. With sources
+    (e.g. the site of each record), only records from different sources
+    are paired.
+
+    Records are blocked by a hash of brand, model and year, then sorted by
+    block and price. A car's duplicates must be priced within
+    PRICE_TOLERANCE, so they sit next to it in that order and only a short
+    run of neighbours is compared, instead of every pair. Mileage and
+    district must be known on both records: a missing value could match
+    almost any other car in a crowded block.
+    """
+    count = len(df)
+    if count == 0:
+        return pd.Series([], index=df.index, dtype="int64", name=CLUSTER_COLUMN)
+
+    keys = blocking_keys(df)
+    price = pd.to_numeric(df["Price"], errors="coerce").astype("float64").to_numpy()
+    mileage = pd.to_numeric(df["Mileage"], errors="coerce").astype("float64").to_numpy()
+    district = df["District"].astype("string").str.lower().fillna("").to_numpy()
+    candidates = np.flatnonzero(keys.notna().to_numpy() & ~np.isnan(price) & ~np.isnan(mileage) & (district != ""))
+
+    order = candidates[np.lexsort((price[candidates], keys.to_numpy()[candidates].astype("uint64")))]
+    block = keys.to_numpy()[order].astype("uint64")
+    sorted_price = price[order]
+    fields = {
+        "mileage": mileage[order],
+        "engine": pd.to_numeric(df["Engine Capacity"], errors="coerce").astype("float64").to_numpy()[order],
+    }
+    district = district[order]
+    source = None if sources is None else np.asarray(sources)[order]
+
+    left_edges, right_edges, distances = [np.empty(0, dtype="int64")], [np.empty(0, dtype="int64")], [np.empty(0)]
+    # Positions whose window may still reach further neighbours
+    active = np.arange(len(order) - 1)
+    lag = 1
+    while len(active):
+        left = active
+        right = left + lag
+        in_window = (block[left] == block[right]) & (
+            sorted_price[right] - sorted_price[left] <= sorted_price[left] * PRICE_TOLERANCE
+        )
+        # Sorted by price within a block, so a record whose neighbour at
+        # this distance is out of its window has no matches further on
+        left, right = left[in_window], right[in_window]
+        match = (
+            _compatible(fields["mileage"], left, right, MILEAGE_TOLERANCE, MIN_MILEAGE_SLACK)
+            & _compatible(fields["engine"], left, right, 0, ENGINE_TOLERANCE)
+            & (district[left] == district[right])
+        )
+        if source is not None:
+            match &= source[left] != source[right]
+        matched_left, matched_right = left[match], right[match]
+        left_edges.append(order[matched_left])
+        right_edges.append(order[matched_right])
+        # How close each match is, so each record pairs with its closest
+        distances.append(
+            (sorted_price[matched_right] - sorted_price[matched_left])
+            / np.maximum(sorted_price[matched_left] * PRICE_TOLERANCE, 1)
+            + _distance(fields["mileage"], matched_left, matched_right, MILEAGE_TOLERANCE, MIN_MILEAGE_SLACK)
+            + _distance(fields["engine"], matched_left, matched_right, 0, ENGINE_TOLERANCE)
+        )
+        lag += 1
+        active = left[left + lag < len(order)]
+
+    labels = _mutual_pairs(count, np.concatenate(left_edges), np.concatenate(right_edges), np.concatenate(distances))
+    return pd.Series(labels, index=df.index, name=CLUSTER_COLUMN)
+
+
+def cluster_sites(results):
+    """
+    Clusters the records of every site together and adds a CLUSTER_COLUMN
+    to each frame in results ({site: DataFrame}), in place. The same car
+    listed on two sites gets the same id in both frames; records are only
+    paired across sites.
+    """
+    frames = {site: df for site, df in results.items() if df is not None and not df.empty}
+    if not frames:
+        return results
+    combined = pd.concat(frames.values(), ignore_index=True)
+    sites = np.repeat(np.arange(len(frames)), [len(df) for df in frames.values()])
+    clusters = assign_clusters(combined, sites).to_numpy()
+
+    start = 0
+    for site, df in frames.items():
+        results[site] = df.assign(**{CLUSTER_COLUMN: clusters[start:start + len(df)]})
+        start += len(df)
+    return results
+
+
+def collapse_duplicates(df):
+    """Keeps the first record of each cluster, so every car counts once."""
+    if CLUSTER_COLUMN not in df.columns:
+        return df
+    return df.drop_duplicates(subset=CLUSTER_COLUMN)
@@ -0,0 +1,120 @@
+# fetcher.py
+
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class TokenBucket:
+    """A thread-safe token bucket that refills at a fixed rate."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self, stop_flag=None):
+        """
+        Blocks until a token is available. Returns False if the stop flag
+        was set while waiting, True otherwise.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_time = (1 - self.tokens) / self.rate
+
+            # Wait on the stop flag so a stop request wakes us immediately
+            if stop_flag is not None:
+                if stop_flag.wait(wait_time):
+                    return False
+            else:
+                time.sleep(wait_time)
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per host so each site gets its own request budget."""
+
+    def __init__(self, requests_per_second=2.0, burst=None):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.requests_per_second, self.burst)
+                self.buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url, stop_flag=None):
+        """Waits for a request slot on the URL's host."""
+        if not self.requests_per_second:
+            return not (stop_flag and stop_flag.is_set())
+        return self.bucket_for(url).acquire(stop_flag)
+
+
+def fetch_all(urls, fetch_func, max_workers=4, rate_limiter=None, stop_flag=None, on_result=None):
+    """
+    Runs fetch_func(url) for every URL with at most max_workers requests in
+    flight, pacing each host through rate_limiter.
+
+    Returns a list of (url, result, error) tuples in the same order as urls.
+    URLs that were never started because the stop flag was set are omitted.
+    on_result(url, result, error) is called from the calling thread as each
+    fetch completes.
+    """
+    urls = list(urls)
+    results = [None] * len(urls)
+
+    def run(url):
+        if rate_limiter is not None and not rate_limiter.acquire(url, stop_flag):
+            return None, None, True  # Stopped while waiting for a token
+        if stop_flag and stop_flag.is_set():
+            return None, None, True
+        try:
+            return fetch_func(url), None, False
+        except InterruptedError:
+            return None, None, True  # Stopped while waiting for the host
+        except Exception as e:
+            return None, e, False
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pending = {}
+        next_index = 0
+
+        while next_index < len(urls) or pending:
+            # Keep the pool topped up while we have not been asked to stop
+            while (next_index < len(urls) and len(pending) < max_workers
+                   and not (stop_flag and stop_flag.is_set())):
+                future = executor.submit(run, urls[next_index])
+                pending[future] = next_index
+                next_index += 1
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                result, error, stopped = future.result()
+                if stopped:
+                    continue
+                results[index] = (urls[index], result, error)
+                if on_result:
+                    on_result(urls[index], result, error)
+
+    return [entry for entry in results if entry is not None]
@@ -0,0 +1,151 @@
+# gazetteer.py
+
+import collections
+import functools
+import json
+import os
+import pickle
+import re
+
+DISTRICTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "districts.json")
+
+# Bump when the index layout changes so stale pickles are rebuilt
+INDEX_VERSION = 1
+
+# Minimum trigram similarity for a fuzzy match to be accepted
+FUZZY_THRESHOLD = 0.5
+
+
+def normalize(name):
+    """Lowercases and collapses hyphens, dots and runs of spaces to single spaces."""
+    return re.sub(r"[\s\-_.,/]+", " ", name.lower()).strip()
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Gazetteer:
+    """
+    Maps city names to their district, built from districts.json.
+
+    Lookups try, in order: the normalized name ("Dehiwala-Mount-Lavinia",
+    "dehiwala mount lavinia"), the name with separators removed
+    ("mountlavinia"), unambiguous parts of multi-word names ("Mount
+    Lavinia"), and finally a trigram similarity search for misspellings.
+    """
+
+    def __init__(self, districts):
+        self.exact = {}
+        self.compact = {}
+        parts = collections.defaultdict(set)
+
+        for entry in districts:
+            district = entry["District"]
+            for name in [district] + entry["Cities"]:
+                key = normalize(name)
+                self.exact.setdefault(key, district)
+                self.compact.setdefault(key.replace(" ", ""), district)
+                words = key.split()
+                # Every contiguous run of words in a multi-word name, e.g.
+                # "dehiwala", "mount lavinia" for Dehiwala-Mount-Lavinia
+                for start in range(len(words)):
+                    for end in range(start + 1, len(words) + 1):
+                        if end - start < len(words):
+                            parts[" ".join(words[start:end])].add(district)
+
+        # Only keep parts that point at a single district and are not too short
+        for part, part_districts in parts.items():
+            if len(part_districts) == 1 and len(part) >= 4 and part not in self.exact:
+                self.exact[part] = next(iter(part_districts))
+
+        # Trigram -> keys containing it, for the fuzzy fallback
+        self.trigram_index = collections.defaultdict(list)
+        self.key_trigram_counts = {}
+        for key in self.exact:
+            grams = trigrams(key)
+            self.key_trigram_counts[key] = len(grams)
+            for gram in grams:
+                self.trigram_index[gram].append(key)
+        self.trigram_index = dict(self.trigram_index)
+
+    @classmethod
+    def from_json(cls, path=DISTRICTS_FILE):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def load(cls, path=DISTRICTS_FILE, cache_path=None):
+        """
+        Loads the prebuilt index from its pickle next to the JSON file,
+        rebuilding it when the JSON is newer or the layout has changed.
+        """
+        cache_path = cache_path or os.path.splitext(path)[0] + ".gazetteer.pickle"
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+                with open(cache_path, "rb") as f:
+                    version, gazetteer = pickle.load(f)
+                if version == INDEX_VERSION:
+                    return gazetteer
+        except (OSError, pickle.PickleError, EOFError, ValueError, AttributeError):
+            pass
+
+        gazetteer = cls.from_json(path)
+        try:
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump((INDEX_VERSION, gazetteer), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # A read-only checkout just rebuilds each time
+        return gazetteer
+
+    def fuzzy(self, key):
+        """Returns the district of the most similar known name, or None."""
+        grams = trigrams(key)
+        shared = collections.Counter()
+        for gram in grams:
+            for candidate in self.trigram_index.get(gram, ()):
+                shared[candidate] += 1
+
+        best_key, best_score = None, 0.0
+        for candidate, count in shared.items():
+            score = count / (len(grams) + self.key_trigram_counts[candidate] - count)
+            if score > best_score:
+                best_key, best_score = candidate, score
+        if best_score >= FUZZY_THRESHOLD:
+            return self.exact[best_key]
+        return None
+
+    def lookup(self, city, default=None):
+        """Returns the district for a city name, or default if nothing matches."""
+        if not city:
+            return default
+        key = normalize(city)
+        district = self.exact.get(key) or self.compact.get(key.replace(" ", ""))
+        if district is None and key:
+            district = self.fuzzy(key)
+        return district if district is not None else default
+
+    def lookup_many(self, cities, default=None):
+        """Looks up a batch of city names, resolving each distinct name once."""
+        resolved = {}
+        result = []
+        for city in cities:
+            if city not in resolved:
+                resolved[city] = self.lookup(city, default)
+            result.append(resolved[city])
+        return result
+
+
+@functools.lru_cache(maxsize=1)
+def get_gazetteer():
+    """The shared gazetteer, loaded once per process."""
+    return Gazetteer.load()
+
+
+@functools.lru_cache(maxsize=8192)
+def district_for_city(city, default="Unknown"):
+    """Returns the district of a city name, caching repeated strings."""
+    return get_gazetteer().lookup(city, default)
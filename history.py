@@ -0,0 +1,315 @@
+# history.py
+#
+# An append-only history of every change seen in each ad across scrapes:
+# new ads, price and mileage changes, other edits, removals and relistings.
+#
+#   python history.py --days 7            # price changes in the last week
+#   python history.py --days 30 --drops   # price drops only
+#   python history.py --url https://ikman.lk/en/ad/...
+
+import argparse
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+
+from parsers import CAR_COLUMNS
+
+DEFAULT_HISTORY_PATH = "listing_history.sqlite"
+
+SECONDS_PER_DAY = 86_400
+
+# Kinds of change rows
+NEW, PRICE, MILEAGE, EDIT, REMOVED, RELISTED = "new", "price", "mileage", "edit", "removed", "relisted"
+
+# Stored as both hashes of an ad whose full record has not been seen at its
+# current price and mileage (only a summary card has), so no edit is inferred
+NO_HASH = 0
+
+
+def raw_hash(record):
+    """A signed 64-bit hash of a record exactly as scraped."""
+    values = "\x1f".join(str(record.get(column)) for column in CAR_COLUMNS)
+    return int.from_bytes(hashlib.blake2b(values.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def record_hashes(records):
+    """
+    64-bit hashes of the normalized records, so spelling noise ("Rs.
+    7,450,000" vs "7450000") does not count as a change. Returns the
+    hashes (as int64, for SQLite) and the normalized frame.
+    """
+    # pandas is only loaded once there are records to compare
+    import numpy as np
+    import pandas as pd
+
+    from normalize import normalize_frame
+
+    normalized = normalize_frame(pd.DataFrame(records, columns=CAR_COLUMNS))
+    hashes = pd.util.hash_pandas_object(normalized[CAR_COLUMNS].astype("string"), index=False)
+    return hashes.to_numpy().view(np.int64), normalized
+
+
+class ListingHistory:
+    """
+    Per-ad change history in SQLite. The ads table holds each ad's latest
+    record hashes, price and mileage; the changes table only ever grows,
+    with one row per change observed. An ad scraped again unchanged costs
+    one hash compare and no history row; only ads whose raw record differs
+    are normalized, and only a differing normalized record is a change.
+
+    A record missing a price or mileage (such as a search result card)
+    keeps the ad's last known value, and a record missing any field only
+    records price and mileage changes, not edits.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ads (
+                url TEXT PRIMARY KEY,
+                site TEXT NOT NULL,
+                search_key TEXT NOT NULL,
+                raw_hash INTEGER NOT NULL,
+                hash INTEGER NOT NULL,
+                price INTEGER,
+                mileage INTEGER,
+                active INTEGER NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ads_search ON ads (search_key, active)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS changes (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                site TEXT NOT NULL,
+                observed REAL NOT NULL,
+                kind TEXT NOT NULL,
+                old_price INTEGER,
+                new_price INTEGER,
+                old_mileage INTEGER,
+                new_mileage INTEGER
+            )
+            """
+        )
+        # "Changes of a kind in the last N days" reads one index range
+        self.conn.execute("CREATE INDEX IF NOT EXISTS changes_kind_observed ON changes (kind, observed)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS changes_url ON changes (url, observed)")
+        self.conn.commit()
+
+    def observe(self, site, search_key, observations, observed=None):
+        """
+        Records a batch of scraped ads, given as (url, record) pairs, and
+        writes a change row for every ad that is new, relisted or differs
+        from its last observation. Returns the number of change rows.
+        """
+        observations = list(observations)
+        if not observations:
+            return 0
+        observed = observed or time.time()
+        urls = [url for url, _ in observations]
+        raw_hashes = [raw_hash(record) for _, record in observations]
+
+        with self.lock:
+            known = {}
+            # SQLite allows a limited number of parameters per statement
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT url, raw_hash, hash, price, mileage, active FROM ads WHERE url IN ({placeholders})", chunk
+                ):
+                    known[row[0]] = row[1:]
+
+            unchanged, candidates = [], []
+            for index, (url, new_raw_hash) in enumerate(zip(urls, raw_hashes)):
+                previous = known.get(url)
+                if previous is not None and previous[0] == new_raw_hash and previous[4]:
+                    unchanged.append((observed, search_key, url))
+                else:
+                    candidates.append(index)
+
+            changes, upserts = [], []
+            if candidates:
+                hashes, normalized = record_hashes([observations[index][1] for index in candidates])
+                partial = normalized[CAR_COLUMNS].isna().any(axis=1).tolist()
+                prices, mileages = (
+                    normalized[name].to_numpy(dtype=object, na_value=None).tolist() for name in ("Price", "Mileage")
+                )
+                for index, new_hash, price, mileage, incomplete in zip(candidates, hashes.tolist(), prices, mileages, partial):
+                    url = urls[index]
+                    previous = known.get(url)
+                    new_raw_hash = raw_hashes[index]
+                    if previous is None:
+                        if incomplete:
+                            new_raw_hash = new_hash = NO_HASH
+                        upserts.append((url, site, search_key, new_raw_hash, new_hash, price, mileage, observed, observed))
+                        changes.append((url, site, observed, NEW, None, price, None, mileage))
+                        continue
+                    old_raw_hash, old_hash, old_price, old_mileage, active = previous
+                    price = old_price if price is None else price
+                    mileage = old_mileage if mileage is None else mileage
+                    # A value seen for the first time is not a change
+                    price_moved = old_price is not None and old_price != price
+                    mileage_moved = old_mileage is not None and old_mileage != mileage
+                    if incomplete:
+                        # A summary card never hashes like the full ad: keep the full
+                        # ad's hashes unless its price or mileage has moved on
+                        moved = old_price != price or old_mileage != mileage
+                        new_raw_hash, new_hash = (NO_HASH, NO_HASH) if moved else (old_raw_hash, old_hash)
+                    upserts.append((url, site, search_key, new_raw_hash, new_hash, price, mileage, observed, observed))
+                    if not active:
+                        changes.append((url, site, observed, RELISTED, old_price, price, old_mileage, mileage))
+                    elif new_hash != NO_HASH and new_hash == old_hash:
+                        # Only the formatting changed
+                        continue
+                    elif price_moved:
+                        changes.append((url, site, observed, PRICE, old_price, price, None, None))
+                        if mileage_moved:
+                            changes.append((url, site, observed, MILEAGE, None, None, old_mileage, mileage))
+                    elif mileage_moved:
+                        changes.append((url, site, observed, MILEAGE, None, None, old_mileage, mileage))
+                    elif not incomplete and old_hash != NO_HASH:
+                        changes.append((url, site, observed, EDIT, old_price, price, old_mileage, mileage))
+
+            self.conn.executemany("UPDATE ads SET last_seen = ?, search_key = ? WHERE url = ?", unchanged)
+            self.conn.executemany(
+                """
+                INSERT INTO ads (url, site, search_key, raw_hash, hash, price, mileage, active, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    search_key = excluded.search_key, raw_hash = excluded.raw_hash, hash = excluded.hash,
+                    price = excluded.price, mileage = excluded.mileage, active = 1, last_seen = excluded.last_seen
+                """,
+                upserts,
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO changes (url, site, observed, kind, old_price, new_price, old_mileage, new_mileage)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                changes,
+            )
+            self.conn.commit()
+        return len(changes)
+
+    def mark_removed(self, site, search_key, listed_urls, observed=None):
+        """
+        After a search was read to the end of its results, marks its active
+        ads that were not listed as removed. Returns the number removed.
+        """
+        observed = observed or time.time()
+        listed_urls = set(listed_urls)
+        with self.lock:
+            active = self.conn.execute(
+                "SELECT url, price, mileage FROM ads WHERE search_key = ? AND active = 1", (search_key,)
+            ).fetchall()
+            removed = [(url, price, mileage) for url, price, mileage in active if url not in listed_urls]
+            self.conn.executemany("UPDATE ads SET active = 0 WHERE url = ?", [(url,) for url, _, _ in removed])
+            self.conn.executemany(
+                """
+                INSERT INTO changes (url, site, observed, kind, old_price, old_mileage)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [(url, site, observed, REMOVED, price, mileage) for url, price, mileage in removed],
+            )
+            self.conn.commit()
+        return len(removed)
+
+    def changes(self, days=7, kinds=None, site=None, now=None):
+        """Change rows of the given kinds (all if None) observed in the last `days` days, oldest first."""
+        import pandas as pd
+
+        since = (now or time.time()) - days * SECONDS_PER_DAY
+        kinds = list(kinds or [NEW, PRICE, MILEAGE, EDIT, REMOVED, RELISTED])
+        query = f"""
+            SELECT url, site, observed, kind, old_price, new_price, old_mileage, new_mileage FROM changes
+            WHERE kind IN ({",".join("?" * len(kinds))}) AND observed >= ?
+        """
+        params = kinds + [since]
+        if site is not None:
+            query += " AND site = ?"
+            params.append(site)
+        with self.lock:
+            frame = pd.read_sql_query(query + " ORDER BY observed", self.conn, params=params)
+        frame["observed"] = pd.to_datetime(frame["observed"], unit="s")
+        return frame
+
+    def price_changes(self, days=7, site=None, drops_only=False, now=None):
+        """Price changes in the last `days` days, with the change in rupees and percent."""
+        frame = self.changes(days, [PRICE], site, now)
+        frame = frame.drop(columns=["kind", "old_mileage", "new_mileage"])
+        frame["change"] = frame["new_price"] - frame["old_price"]
+        frame["change_pct"] = 100 * frame["change"] / frame["old_price"]
+        if drops_only:
+            frame = frame[frame["change"] < 0]
+        return frame.reset_index(drop=True)
+
+    def ad_history(self, url):
+        """Every change row of one ad, oldest first."""
+        import pandas as pd
+
+        with self.lock:
+            frame = pd.read_sql_query(
+                "SELECT observed, kind, old_price, new_price, old_mileage, new_mileage FROM changes WHERE url = ? ORDER BY observed",
+                self.conn, params=[url],
+            )
+        frame["observed"] = pd.to_datetime(frame["observed"], unit="s")
+        return frame
+
+    def summary(self, days=7):
+        """Counts per kind of change in the last `days` days, with price drops and rises split."""
+        since = time.time() - days * SECONDS_PER_DAY
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT CASE WHEN kind = 'price' AND new_price < old_price THEN 'price drop'
+                            WHEN kind = 'price' THEN 'price rise' ELSE kind END, COUNT(*)
+                FROM changes WHERE observed >= ? GROUP BY 1
+                """,
+                (since,),
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the listing change history.")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH, help="History database")
+    parser.add_argument("--days", type=float, default=7, help="How far back to look")
+    parser.add_argument("--site", help="Only this site")
+    parser.add_argument("--drops", action="store_true", help="Only price drops")
+    parser.add_argument("--url", help="Show the full history of one ad instead")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    history = ListingHistory(args.history)
+    try:
+        with pd.option_context("display.width", 200, "display.max_colwidth", 80):
+            if args.url:
+                print(history.ad_history(args.url).to_string(index=False))
+            else:
+                changes = history.price_changes(args.days, args.site, args.drops)
+                print(f"{len(changes)} price changes in the last {args.days:g} days")
+                if len(changes):
+                    print(changes.to_string(index=False, float_format=lambda value: f"{value:.1f}"))
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
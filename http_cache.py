@@ -0,0 +1,173 @@
+# http_cache.py
+
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "http_cache.sqlite"
+
+
+class CachedResponse:
+    """The subset of requests.Response the scrapers use, served from the cache."""
+
+    def __init__(self, url, status_code, content, headers=None, from_cache=True):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+
+class ResponseCache:
+    """
+    A persistent SQLite cache of GET responses keyed by URL.
+
+    Entries younger than ttl seconds are served without touching the network.
+    Older entries are revalidated with If-None-Match / If-Modified-Since when
+    the server sent an ETag or Last-Modified. When the stored bodies exceed
+    max_bytes the least recently used entries are evicted. In offline mode
+    nothing is fetched and misses come back as 504 responses.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=3600, max_bytes=500 * 1024 * 1024, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0, "evicted": 0, "bytes_saved": 0}
+
+    def _count(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _lookup(self, url):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT status, headers, body, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+    def _touch(self, url, refresh=False):
+        now = time.time()
+        with self.lock:
+            if refresh:
+                self.conn.execute("UPDATE responses SET accessed_at = ?, stored_at = ? WHERE url = ?", (now, now, url))
+            else:
+                self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+            self.conn.commit()
+
+    def _store(self, url, response):
+        headers = {k: v for k, v in response.headers.items()
+                   if k.lower() in ("content-type", "etag", "last-modified")}
+        body = response.content
+        now = time.time()
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, response.status_code, json.dumps(headers), body,
+                 response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                 now, now, len(body)),
+            )
+            self.conn.commit()
+        self._count(stored=1)
+        self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries until the cache fits in max_bytes."""
+        with self.lock:
+            if self.total_bytes <= self.max_bytes:
+                return
+            doomed = []
+            rows = self.conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+            for url, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                doomed.append((url,))
+                self.total_bytes -= size
+            self.conn.executemany("DELETE FROM responses WHERE url = ?", doomed)
+            self.conn.commit()
+        self._count(evicted=len(doomed))
+
+    def get(self, url, fetch, headers=None):
+        """
+        Returns a cached or fresh response for url. fetch(headers) performs
+        the real request and must return a requests.Response.
+        """
+        row = self._lookup(url)
+
+        if row is not None:
+            status, stored_headers, body, etag, last_modified, stored_at = row
+            cached = CachedResponse(url, status, body, json.loads(stored_headers))
+
+            if self.offline or time.time() - stored_at < self.ttl:
+                self._count(hits=1, bytes_saved=len(body))
+                self._touch(url)
+                return cached
+
+            # Stale: ask the server whether our copy is still current
+            conditional = dict(headers or {})
+            if etag:
+                conditional["If-None-Match"] = etag
+            if last_modified:
+                conditional["If-Modified-Since"] = last_modified
+            response = fetch(conditional)
+            if response.status_code == 304:
+                self._count(hits=1, revalidated=1, bytes_saved=len(body))
+                self._touch(url, refresh=True)
+                return cached
+        else:
+            if self.offline:
+                self._count(misses=1)
+                return CachedResponse(url, 504, b"", from_cache=False)
+            response = fetch(dict(headers or {}))
+
+        self._count(misses=1)
+        if response.status_code == 200:
+            self._store(url, response)
+        return response
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.total_bytes = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def format_stats(self):
+        s = self.stats
+        return (
+            f"{s['hits']} hits ({s['revalidated']} revalidated), {s['misses']} misses, "
+            f"{s['bytes_saved'] / 1024:.1f} KiB saved"
+        )
@@ -0,0 +1,262 @@
+# http_session.py
+
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from concurrency import get_limiter
+from telemetry import get_metrics
+
+# Connect and read timeouts in seconds, applied when the caller passes none
+DEFAULT_TIMEOUT = (5, 20)
+
+# Hosts kept in the pool manager, and connections kept alive per host
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 16
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Per thread: seconds the current request spent sleeping between retries
+_backoff = threading.local()
+
+
+def _accept_encoding():
+    """Advertise brotli only when urllib3 can decode it."""
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            return "gzip, deflate, br"
+        except ImportError:
+            return "gzip, deflate"
+
+
+def _host(url):
+    return urllib.parse.urlsplit(url).hostname or url
+
+
+class CountingRetry(Retry):
+    """
+    A Retry that counts every retry in the telemetry, per host, and tells
+    the host's concurrency limiter to back off (for a Retry-After's
+    duration, if the response has one).
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        host = _pool.host if _pool is not None else "unknown"
+        get_metrics().increment("retries", host)
+        if error is not None or (response is not None and response.status in RETRY_STATUSES):
+            retry_after = self.get_retry_after(response) if response is not None else None
+            get_limiter(host).throttled(retry_after)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    def sleep(self, response=None):
+        # Time spent waiting to retry is not the host's latency
+        start = time.perf_counter()
+        try:
+            super().sleep(response)
+        finally:
+            _backoff.slept = getattr(_backoff, "slept", 0.0) + time.perf_counter() - start
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """Records how long opening each connection (DNS lookup and TCP connect) takes."""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        get_metrics().observe("connect", self.host, time.perf_counter() - start)
+        get_metrics().increment("connections", self.host)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """Like TimedHTTPConnection, including the TLS handshake."""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        get_metrics().observe("connect", self.host, time.perf_counter() - start)
+        get_metrics().increment("connections", self.host)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """An HTTPAdapter whose pools time new connections."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def _build_retry(total=4, backoff_factor=0.5, backoff_jitter=0.5):
+    """Exponential backoff with jitter on 429 and 5xx, honouring Retry-After."""
+    return CountingRetry(
+        total=total,
+        connect=total,
+        read=total,
+        status=total,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def create_session(pool_maxsize=POOL_MAXSIZE, retries=None):
+    """Creates a requests session with keep-alive pools, retries and compression."""
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        max_retries=retries if retries is not None else _build_retry(),
+        pool_block=False,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = _accept_encoding()
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the process-wide session shared by both scrapers' threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+_cache = None
+
+
+def set_cache(cache):
+    """Routes every get() through a ResponseCache, or bypasses it when None."""
+    global _cache
+    _cache = cache
+
+
+def get_cache():
+    return _cache
+
+
+def _timed_get(url, timeout, stop_flag=None, **kwargs):
+    """
+    Sends a GET once the host's adaptive concurrency limit allows, and
+    records its time to first byte and download time, plus request, error
+    and byte counters, under the URL's host. Raises InterruptedError if
+    stop_flag is set while waiting for the limit (or a Retry-After pause).
+    """
+    metrics = get_metrics()
+    host = _host(url)
+    limiter = get_limiter(host)
+    if not limiter.acquire(stop_flag):
+        raise InterruptedError(f"Stopped before requesting {url}")
+    metrics.increment("requests", host)
+    _backoff.slept = 0.0
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, timeout=timeout, **kwargs)
+    except requests.RequestException:
+        limiter.release(time.perf_counter() - start - _backoff.slept, error=True)
+        metrics.increment("errors", host)
+        raise
+    except BaseException:
+        limiter.release(time.perf_counter() - start - _backoff.slept)
+        raise
+    total = time.perf_counter() - start - _backoff.slept
+    limiter.release(total, error=response.status_code in RETRY_STATUSES)
+    # requests measures up to the parsed headers; the body is read after
+    ttfb = min(response.elapsed.total_seconds(), total)
+    metrics.observe("ttfb", host, ttfb)
+    metrics.observe("download", host, total - ttfb)
+    metrics.increment("bytes", host, len(response.content))
+    if response.status_code >= 400:
+        metrics.increment("errors", host)
+    return response
+
+
+def get(url, timeout=DEFAULT_TIMEOUT, stop_flag=None, **kwargs):
+    """
+    Sends a GET through the shared session with a default timeout. With a
+    stop_flag, raises InterruptedError if it is set before the request starts.
+    """
+    if _cache is None:
+        return _timed_get(url, timeout, stop_flag, **kwargs)
+
+    headers = kwargs.pop("headers", None)
+
+    def fetch(request_headers):
+        return _timed_get(url, timeout, stop_flag, headers=request_headers, **kwargs)
+
+    response = _cache.get(url, fetch, headers)
+    if getattr(response, "from_cache", False):
+        get_metrics().increment("cache_hits", _host(url))
+    return response
+
+
+def connection_stats(session=None):
+    """
+    Reports, per host, how many TCP/TLS connections were opened and how many
+    requests were sent over them. 'reused' counts requests that did not need
+    a new connection.
+    """
+    session = session or _session
+    stats = {}
+    if session is None:
+        return stats
+
+    seen_adapters = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen_adapters:
+            continue
+        seen_adapters.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}" if pool.port else f"{pool.scheme}://{pool.host}"
+            entry = stats.setdefault(host, {"connections": 0, "requests": 0, "reused": 0})
+            entry["connections"] += pool.num_connections
+            entry["requests"] += pool.num_requests
+            entry["reused"] = max(0, entry["requests"] - entry["connections"])
+    return stats
+
+
+def format_connection_stats(stats=None):
+    """One line per host, for logs and the GUI output pane."""
+    stats = connection_stats() if stats is None else stats
+    lines = []
+    for host, entry in sorted(stats.items()):
+        netloc = urllib.parse.urlsplit(host).netloc or host
+        lines.append(
+            f"{netloc}: {entry['requests']} requests over {entry['connections']} "
+            f"connections ({entry['reused']} reused)"
+        )
+    return lines
@@ -0,0 +1,158 @@
+# normalize.py
+
+import functools
+
+import pandas as pd
+
+from parsers import CAR_COLUMNS
+
+# Placeholders the scrapers use for missing values
+NULL_PLACEHOLDERS = ["n/a", "na", "unknown", "none", "null", "-", ""]
+
+# Multipliers for price units, e.g. "Rs. 12.5 Mn" or "45 Lakhs"
+PRICE_UNITS = {
+    "mn": 1_000_000, "million": 1_000_000, "m": 1_000_000,
+    "lakh": 100_000, "lakhs": 100_000, "lk": 100_000,
+    "k": 1_000,
+}
+
+# Lowercase spelling -> canonical value, shared by ikman.lk and riyasewana.com
+BRANDS = {
+    "mercedes benz": "Mercedes-Benz", "mercedes-benz": "Mercedes-Benz", "benz": "Mercedes-Benz",
+    "bmw": "BMW", "mg": "MG", "kia": "Kia", "mini": "MINI", "byd": "BYD", "dfsk": "DFSK",
+    "land rover": "Land Rover", "landrover": "Land Rover", "micro": "Micro",
+    "perodua": "Perodua", "proton": "Proton", "tata": "Tata", "maruti suzuki": "Suzuki",
+}
+FUEL_TYPES = {
+    "petrol": "Petrol", "gasoline": "Petrol",
+    "diesel": "Diesel",
+    "hybrid": "Hybrid", "petrol hybrid": "Hybrid", "diesel hybrid": "Hybrid", "plug-in hybrid": "Hybrid",
+    "electric": "Electric", "ev": "Electric",
+    "cng": "CNG", "gas": "CNG",
+}
+TRANSMISSIONS = {
+    "automatic": "Automatic", "auto": "Automatic", "tiptronic": "Automatic",
+    "triptonic": "Automatic", "cvt": "Automatic",
+    "manual": "Manual",
+}
+
+# Output dtypes, matching the typed results store
+INTEGER_DTYPES = {
+    "Price": "Int64",
+    "Mileage": "Int64",
+    "Engine Capacity": "Int32",
+    "Year of Manufacture": "Int16",
+}
+CATEGORICAL_COLUMNS = ["District", "Brand", "Fuel Type", "Transmission"]
+
+
+def per_unique(func):
+    """
+    Runs a column parser on the distinct values only and broadcasts the
+    result back. Scraped columns repeat the same few spellings, so this
+    turns a pass over every row into a pass over a handful of strings.
+    """
+    @functools.wraps(func)
+    def wrapper(series, *args, **kwargs):
+        codes, uniques = pd.factorize(series)
+        parsed = func(pd.Series(uniques, dtype="string"), *args, **kwargs)
+        # Missing inputs have code -1; parse one null to get their result
+        parsed = pd.concat([parsed, func(pd.Series([pd.NA], dtype="string"), *args, **kwargs)], ignore_index=True)
+        result = parsed.take(codes)
+        result.index = series.index
+        return result
+    return wrapper
+
+
+def clean_text(series):
+    """Strips and collapses whitespace, turning placeholders into nulls."""
+    text = series.astype("string").str.strip().str.replace(r"\s+", " ", regex=True)
+    return text.mask(text.str.lower().isin(NULL_PLACEHOLDERS))
+
+
+@per_unique
+def parse_price(series):
+    """
+    Parses prices such as "Rs. 7,450,000", "7450000", "Rs. 12.5 Mn" or
+    "45 Lakhs" into whole rupees. Text without a number ("Negotiable")
+    becomes null.
+    """
+    text = clean_text(series).str.lower().str.replace(",", "", regex=False)
+    parts = text.str.extract(r"(?P<number>\d+(?:\.\d+)?)\s*(?P<unit>million|mn|lakhs|lakh|lk|m|k)?\b")
+    number = pd.to_numeric(parts["number"], errors="coerce")
+    multiplier = parts["unit"].map(PRICE_UNITS).astype("float64").fillna(1)
+    return (number * multiplier).round().astype(INTEGER_DTYPES["Price"])
+
+
+@per_unique
+def parse_mileage(series):
+    """Parses mileage such as "98,000 km" or "98000" into kilometres."""
+    text = clean_text(series).str.replace(",", "", regex=False)
+    number = pd.to_numeric(text.str.extract(r"(\d+(?:\.\d+)?)", expand=False), errors="coerce")
+    return number.round().astype(INTEGER_DTYPES["Mileage"])
+
+
+@per_unique
+def parse_engine_capacity(series):
+    """Parses engine capacity such as "1,500 cc", "1500" or "1.5L" into cc."""
+    text = clean_text(series).str.lower().str.replace(",", "", regex=False)
+    parts = text.str.extract(r"(?P<number>\d+(?:\.\d+)?)\s*(?P<litres>l\b|litre|liter)?")
+    number = pd.to_numeric(parts["number"], errors="coerce")
+    litres = parts["litres"].notna() | (number < 20)
+    return number.where(~litres, number * 1000).round().astype(INTEGER_DTYPES["Engine Capacity"])
+
+
+@per_unique
+def parse_year(series):
+    """Extracts a four-digit year of manufacture."""
+    text = clean_text(series)
+    year = pd.to_numeric(text.str.extract(r"\b((?:19|20)\d{2})\b", expand=False), errors="coerce")
+    return year.astype(INTEGER_DTYPES["Year of Manufacture"])
+
+
+@per_unique
+def canonicalize(series, vocabulary, title_case=True):
+    """
+    Maps known spellings to their canonical value; other values are title
+    cased when they are all lower case, or all upper case letters
+    ("TOYOTA" -> "Toyota", but "C-HR" is kept).
+    """
+    text = clean_text(series)
+    lower = text.str.lower()
+    known = lower.map(vocabulary)
+    if title_case:
+        single_case = text.str.islower() | (text.str.isupper() & text.str.fullmatch(r"[A-Za-z ]+"))
+        text = text.where(~single_case.fillna(False), text.str.title())
+    return known.fillna(text).astype("string")
+
+
+def normalize_frame(df):
+    """
+    Normalizes a whole frame of scraped records in one vectorized pass:
+    integer price/mileage/engine capacity/year, canonical brand, model,
+    fuel and transmission spellings, and nulls instead of 'N/A'. Columns
+    other than CAR_COLUMNS are kept as they are.
+    """
+    def column(name):
+        if name in df.columns:
+            return df[name]
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+
+    normalized = pd.DataFrame({
+        "Price": parse_price(column("Price")),
+        "District": clean_text(column("District")),
+        "Brand": canonicalize(column("Brand"), BRANDS),
+        "Model": canonicalize(column("Model"), {}),
+        "Year of Manufacture": parse_year(column("Year of Manufacture")),
+        "Fuel Type": canonicalize(column("Fuel Type"), FUEL_TYPES),
+        "Transmission": canonicalize(column("Transmission"), TRANSMISSIONS),
+        "Engine Capacity": parse_engine_capacity(column("Engine Capacity")),
+        "Mileage": parse_mileage(column("Mileage")),
+    }, index=df.index)
+    for name in CATEGORICAL_COLUMNS:
+        normalized[name] = normalized[name].astype("category")
+
+    for name in df.columns:
+        if name not in CAR_COLUMNS:
+            normalized[name] = df[name]
+    return normalized
@@ -0,0 +1,373 @@
+# orchestrator.py
+
+import asyncio
+import time
+import urllib.parse
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import http_session
+from records import RecordBatch
+from telemetry import get_metrics
+
+# Listing pages requested ahead of the one being processed
+PREFETCH_PAGES = 2
+
+
+class AsyncTokenBucket:
+    """A per-host request budget for coroutines on one event loop."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+
+    async def acquire(self, stop_flag=None):
+        """Waits for a token; returns False if the stop flag was set meanwhile."""
+        while True:
+            if stop_flag and stop_flag.is_set():
+                return False
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            # Sleep in short steps so a stop request is noticed promptly
+            await asyncio.sleep(min((1 - self.tokens) / self.rate, 0.25))
+
+
+class ScrapeJob:
+    """One search on one site: what to fetch, and where its records go."""
+
+    def __init__(self, adapter, search, pages, sink=None):
+        self.adapter = adapter
+        self.search = search
+        self.pages = pages
+        self.sink = sink
+        self.records = RecordBatch()
+        self.ads = 0
+        self.details = 0
+        self.errors = 0
+        self.completed_pages = set()
+        # For the listing history: (url, record) pairs not yet recorded, and
+        # every ad URL the search listed this run
+        self.observed = []
+        self.listed_urls = set()
+
+    @property
+    def key(self):
+        return self.adapter.build_search_url(self.search, 1)
+
+
+class Orchestrator:
+    """
+    Runs scrape jobs for any number of sites on one asyncio event loop.
+
+    Listing and detail page fetches from every job share max_concurrency
+    in-flight requests. Within that, each host gets as many requests in
+    flight as its adaptive limiter (concurrency.py) finds it can sustain,
+    and with requests_per_second each host is also paced by its own token
+    bucket, so total wall time is bound by the slowest site rather than by
+    the sum of per-site sleeps. Blocking HTTP calls and parsing run on a
+    thread pool (or a pipeline.ParsePool, if given).
+
+    Each job reads the number of result pages from its first listing page,
+    prefetches up to prefetch_pages listing pages ahead, and stops at the
+    first empty page or a page that repeats the one before it.
+
+    In summary mode, records are built from the search result cards alone
+    and only ads picked for enrichment get their detail page fetched: a
+    stable enrich_sample share of ads (chosen by URL hash), and with
+    enrich_new, ads not yet in seen_index. Enriched ads are marked seen.
+
+    With a history.ListingHistory, every saved record is also recorded
+    there after its page finishes, and a job that read its search to the
+    end marks the search's ads that were no longer listed as removed.
+    """
+
+    def __init__(self, max_concurrency=8, requests_per_second=None, stop_flag=None,
+                 parse_pool=None, seen_index=None, checkpoint=None, history=None, log=print,
+                 prefetch_pages=PREFETCH_PAGES, summary=False, enrich_sample=0.0, enrich_new=False):
+        self.max_concurrency = max_concurrency
+        self.summary = summary
+        self.enrich_sample = enrich_sample
+        self.enrich_new = enrich_new
+        self.prefetch_pages = prefetch_pages
+        self.requests_per_second = requests_per_second
+        self.stop_flag = stop_flag
+        self.parse_pool = parse_pool
+        self.seen_index = seen_index
+        self.checkpoint = checkpoint
+        self.history = history
+        self.log = log
+        self.buckets = {}
+        self.scheduled_urls = set()
+
+    def stopped(self):
+        return bool(self.stop_flag and self.stop_flag.is_set())
+
+    def bucket_for(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = AsyncTokenBucket(self.requests_per_second)
+        return self.buckets[host]
+
+    async def fetch(self, url, headers=None):
+        """Fetches url within the shared budget; returns the body, or None if stopped."""
+        if self.requests_per_second and not await self.bucket_for(url).acquire(self.stop_flag):
+            return None
+        async with self.semaphore:
+            if self.stopped():
+                return None
+            try:
+                response = await self.loop.run_in_executor(
+                    self.executor, lambda: http_session.get(url, headers=headers, stop_flag=self.stop_flag)
+                )
+            except InterruptedError:
+                # Stopped while the host was paused or at its limit
+                return None
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} for {url}")
+        return response.content
+
+    async def parse(self, func, method, content, site=None):
+        """Runs a parser off the event loop, in the parse pool when there is one."""
+        with get_metrics().timer("parse", site):
+            if self.parse_pool is not None and method is not None:
+                return await self.loop.run_in_executor(self.executor, self.parse_pool.parse, method, content)
+            return await self.loop.run_in_executor(self.executor, func, content)
+
+    def save_record(self, job, record, url):
+        if job.sink is not None:
+            job.sink.write(record)
+        else:
+            job.records.append(record)
+        if self.history is not None:
+            job.observed.append((url, record))
+        job.ads += 1
+        get_metrics().increment("ads", job.adapter.site)
+
+    async def scrape_ad(self, job, listing, fallback=None):
+        """Scrapes an ad's detail page; on failure, saves the fallback record if given."""
+        adapter = job.adapter
+        try:
+            content = await self.fetch(listing['url'], adapter.request_headers)
+            if content is None:
+                return False
+            details = await self.parse(adapter.parse_detail_page, adapter.detail_parser, content, adapter.site)
+            record = adapter.map_fields(details, listing)
+        except Exception as e:
+            job.errors += 1
+            get_metrics().increment("failed_ads", adapter.site)
+            self.log(f"Failed to scrape {listing['url']}: {e}")
+            if fallback is not None:
+                self.save_record(job, fallback, listing['url'])
+            return False
+
+        self.save_record(job, record, listing['url'])
+        job.details += 1
+        get_metrics().increment("details", adapter.site)
+        if self.seen_index is not None:
+            self.seen_index.mark_seen([listing['url']], adapter.site)
+        self.log(f"Scraped: {listing['url']}")
+        return True
+
+    def picked_for_enrichment(self, url, new_urls):
+        """Whether a summary-mode ad also gets its detail page fetched."""
+        if self.enrich_new and url in new_urls:
+            return True
+        # crc32 rather than hash(), so the same ads are sampled on every run
+        return zlib.crc32(url.encode("utf-8")) / 2 ** 32 < self.enrich_sample
+
+    def summarize_page(self, job, listings):
+        """Saves card records for a summary-mode page; returns detail tasks for enriched ads."""
+        new_urls = set()
+        if self.enrich_new and self.seen_index is not None:
+            new_urls = set(self.seen_index.split_new([listing['url'] for listing in listings])[0])
+        ad_tasks = []
+        for listing in listings:
+            record = job.adapter.summary_record(listing, job.search)
+            if self.picked_for_enrichment(listing['url'], new_urls):
+                ad_tasks.append(asyncio.ensure_future(self.scrape_ad(job, listing, fallback=record)))
+            else:
+                self.save_record(job, record, listing['url'])
+        return ad_tasks
+
+    async def finish_page(self, job, page, ad_tasks):
+        """Waits for a page's ads, then flushes the sink and advances the checkpoint."""
+        await asyncio.gather(*ad_tasks)
+        if self.stopped():
+            return
+        job.completed_pages.add(page)
+        get_metrics().increment("pages", job.adapter.site)
+        if job.sink is not None:
+            with get_metrics().timer("write", job.adapter.site):
+                job.sink.flush()
+        if self.history is not None and job.observed:
+            observed, job.observed = job.observed, []
+            await self.loop.run_in_executor(
+                self.executor, self.history.observe, job.adapter.site, job.key, observed
+            )
+        if self.checkpoint is not None:
+            # Only checkpoint the contiguous run of completed pages
+            last = self.checkpoint.last_page(job.key)
+            while last + 1 in job.completed_pages:
+                last += 1
+            self.checkpoint.mark(job.key, last)
+
+    async def fetch_listing_page(self, job, page):
+        """Fetches and parses one search result page; returns (content, listings), or None if stopped."""
+        adapter = job.adapter
+        url = adapter.build_search_url(job.search, page)
+        self.log(f"Scraping {adapter.site} page {page}: {url}")
+        content = await self.fetch(url, adapter.request_headers)
+        if content is None:
+            return None
+        listings = await self.parse(adapter.parse_listing_page, None, content, adapter.site)
+        return content, listings
+
+    async def run_job(self, job):
+        adapter = job.adapter
+        start_page = self.checkpoint.last_page(job.key) + 1 if self.checkpoint else 1
+        if start_page > 1:
+            self.log(f"Resuming {adapter.site} from page {start_page}.")
+        job.completed_pages.update(range(1, start_page))
+        last_page = job.pages
+        page_tasks = []
+        # Listing pages being fetched ahead of the one being processed
+        prefetched = {}
+        previous_urls = None
+        # Whether every result page was read, so unlisted ads can be called removed
+        reached_end = False
+        page_count = None
+        failed_pages = 0
+
+        try:
+            for page in range(start_page, job.pages + 1):
+                if page > last_page:
+                    reached_end = True
+                    break
+                if self.stopped():
+                    self.log(f"Scraping {adapter.site} stopped by user.")
+                    break
+
+                # Once the page count is known, keep the next few listing
+                # pages downloading while this page's ads are scraped
+                if page > start_page:
+                    for ahead in range(page, min(page + self.prefetch_pages, last_page) + 1):
+                        if ahead not in prefetched:
+                            prefetched[ahead] = asyncio.ensure_future(self.fetch_listing_page(job, ahead))
+                task = prefetched.pop(page, None) or asyncio.ensure_future(self.fetch_listing_page(job, page))
+                try:
+                    fetched = await task
+                    if fetched is None:
+                        break
+                    content, listings = fetched
+                except Exception as e:
+                    job.errors += 1
+                    failed_pages += 1
+                    self.log(f"Failed to retrieve page {adapter.build_search_url(job.search, page)}: {e}")
+                    continue
+
+                # The first page says how many pages the search really has
+                if page == start_page:
+                    page_count = adapter.page_count(content)
+                    if page_count is not None and page_count < last_page:
+                        self.log(f"{adapter.site} has {page_count} result pages; not requesting more.")
+                        last_page = page_count
+                    # For the progress display: remaining pages at this page's size
+                    metrics = get_metrics()
+                    metrics.set_gauge(
+                        "expected_ads", adapter.site,
+                        metrics.counter("ads", adapter.site) + len(listings) * (last_page - page + 1)
+                    )
+
+                for listing in listings:
+                    if 'error' in listing:
+                        self.log(f"Error extracting data for a listing: {listing['error']}")
+                listings = [listing for listing in listings if 'error' not in listing]
+                if not listings:
+                    self.log(f"No listings on {adapter.site} page {page}. Stopping.")
+                    reached_end = True
+                    break
+
+                # Past the last page some sites serve the last page again
+                page_urls = [listing['url'] for listing in listings]
+                if page_urls == previous_urls:
+                    self.log(f"{adapter.site} page {page} repeats page {page - 1}. Stopping.")
+                    reached_end = True
+                    break
+                previous_urls = page_urls
+                job.listed_urls.update(page_urls)
+
+                # Skip ads scraped on earlier runs (summary mode records
+                # every ad and uses the index only to pick ads to enrich)
+                if self.seen_index is not None and not self.summary:
+                    new_urls, known_urls = self.seen_index.split_new(page_urls)
+                    new_urls = set(new_urls)
+                    listings = [listing for listing in listings if listing['url'] in new_urls]
+                    if known_urls and not listings:
+                        self.log(f"All ads on {adapter.site} page {page} were already scraped. Stopping.")
+                        break
+
+                # Overlapping searches in one run fetch each ad only once
+                listings = [listing for listing in listings if listing['url'] not in self.scheduled_urls]
+                self.scheduled_urls.update(listing['url'] for listing in listings)
+
+                # Detail pages are fetched in the background while the next
+                # listing page is requested
+                if self.summary:
+                    ad_tasks = self.summarize_page(job, listings)
+                else:
+                    ad_tasks = [asyncio.ensure_future(self.scrape_ad(job, listing)) for listing in listings]
+                page_tasks.append(asyncio.ensure_future(self.finish_page(job, page, ad_tasks)))
+            else:
+                reached_end = page_count is not None and page_count <= job.pages
+        finally:
+            # Pages fetched ahead of a stop are not needed
+            for task in prefetched.values():
+                task.cancel()
+            await asyncio.gather(*prefetched.values(), return_exceptions=True)
+
+        await asyncio.gather(*page_tasks)
+
+        # A resumed run or a failed listing page did not see every listed ad
+        if self.history is not None and reached_end and start_page == 1 and not failed_pages and not self.stopped():
+            removed = await self.loop.run_in_executor(
+                self.executor, self.history.mark_removed, adapter.site, job.key, job.listed_urls
+            )
+            if removed:
+                self.log(f"{removed} {adapter.site} ads are no longer listed.")
+
+    async def run(self, jobs):
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        # One thread per in-flight request, plus room for parsing
+        with ThreadPoolExecutor(max_workers=self.max_concurrency * 2) as self.executor:
+            await asyncio.gather(*(self.run_job(job) for job in jobs))
+
+
+def scrape_all(jobs, **kwargs):
+    """
+    Runs the jobs to completion and returns {site: DataFrame} of the records
+    of jobs without a sink (jobs for the same site are combined; sites with
+    no records are left out, so sink-only runs never load pandas), plus
+    {'elapsed', 'ads', 'details', 'errors'} stats.
+    """
+    start = time.perf_counter()
+    asyncio.run(Orchestrator(**kwargs).run(jobs))
+    elapsed = time.perf_counter() - start
+
+    batches = {}
+    for job in jobs:
+        batches.setdefault(job.adapter.site, RecordBatch()).extend(job.records)
+    results = {site: batch.to_frame() for site, batch in batches.items() if batch}
+    stats = {
+        'elapsed': elapsed,
+        'ads': sum(job.ads for job in jobs),
+        'details': sum(job.details for job in jobs),
+        'errors': sum(job.errors for job in jobs),
+    }
+    return results, stats
@@ -0,0 +1,425 @@
+# parsers.py
+#
+# HTML parsing for both sites, with interchangeable backends. The "bs4"
+# backend is the reference implementation (BeautifulSoup with html.parser,
+# exactly as the scrapers originally parsed pages). The "lxml" backend walks
+# the same elements with precompiled XPath expressions and must produce
+# identical dicts; benchmarks/bench_parsers.py checks both against golden
+# files of saved pages.
+
+import contextlib
+import re
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the reference parser
+    lxml = None
+
+
+def clean_number(text):
+    """Cleans and extracts numeric values from a text."""
+    return re.sub(r'\D', '', text)  # Remove non-digit characters
+
+# Columns of every scraped record, in output order
+CAR_COLUMNS = [
+    "Price", "District", "Brand", "Model",
+    "Year of Manufacture", "Fuel Type",
+    "Transmission", "Engine Capacity", "Mileage"
+]
+
+# ikman.lk ad metadata label -> car_info key, and whether the value is numeric
+IKMAN_META_FIELDS = {
+    "Brand": ("Brand", False),
+    "Model": ("Model", False),
+    "Year of Manufacture": ("Year of Manufacture", False),
+    "Fuel type": ("Fuel Type", False),
+    "Transmission": ("Transmission", False),
+    "Engine capacity": ("Engine Capacity", True),
+    "Mileage": ("Mileage", True),
+}
+
+
+def empty_ikman_car_info():
+    return {
+        "Price": None, "District": None, "Brand": None,
+        "Model": None, "Year of Manufacture": None,
+        "Fuel Type": None, "Transmission": None,
+        "Engine Capacity": None, "Mileage": None
+    }
+
+
+def map_riyasewana_fields(car_data):
+    """Maps the riyasewana.com details table to the required fields."""
+    return {
+        'Price': car_data.get('Price', 'N/A').replace('Rs.', '').replace(',', '').strip(),
+        'District': 'N/A',  # Will be updated in scrape_riyasewana_page function
+        'Brand': car_data.get('Make', 'N/A'),
+        'Model': car_data.get('Model', 'N/A'),
+        'Year of Manufacture': car_data.get('YOM', 'N/A'),
+        'Fuel Type': car_data.get('Fuel Type', 'N/A'),
+        'Transmission': car_data.get('Gear', 'N/A'),
+        'Engine Capacity': car_data.get('Engine (cc)', 'N/A').replace('cc', '').strip(),
+        'Mileage': car_data.get('Mileage (km)', 'N/A').replace(',', '').replace('km', '').strip(),
+    }
+
+
+def riyasewana_card_fields(classes_and_texts):
+    """Picks city, price and mileage out of a listing card's (classes, text) boxes."""
+    city = price = mileage = 'N/A'
+    for classes, text in classes_and_texts:
+        if 'b' in classes:
+            price = text.replace('Rs.', '').replace(',', '').strip()
+        elif 's' in classes:
+            pass  # skip date posted
+        else:
+            if city == 'N/A':
+                city = text
+            elif mileage == 'N/A':
+                mileage = text.replace(',', '').replace('km', '').strip()
+    return city, price, mileage
+
+
+def ikman_card_fields(title, description, price):
+    """Builds an ikman.lk search card dict from its title, "City, Category" line and price text."""
+    return {
+        'title': title.strip() if title else 'N/A',
+        'location': description.split(',')[0].strip() if description else 'N/A',
+        'price': clean_number(price) if price else 'N/A',
+    }
+
+
+# "Showing 1-25 of 1,248 ads" (ikman.lk), "Showing 1 - 40 of 612 ads" (riyasewana.com)
+RESULT_COUNT_PATTERN = re.compile(rb"Showing\s+([\d,]+)\s*-\s*([\d,]+)\s+of\s+([\d,]+)")
+
+
+def parse_result_count(content):
+    """
+    Reads the result counter of a search page of either site. Returns
+    (page_size, total_results), or None if the page has no counter. A plain
+    regex on the raw bytes, so it is the same for every backend.
+    """
+    match = RESULT_COUNT_PATTERN.search(content)
+    if match is None:
+        return None
+    first, last, total = (int(group.replace(b",", b"")) for group in match.groups())
+    if last < first:
+        return None
+    return last - first + 1, total
+
+
+@contextlib.contextmanager
+def parsed_soup(content):
+    """
+    Parses content with BeautifulSoup and decomposes the tree on exit, even
+    if reading a field fails. A tree is a web of parent/child references
+    that reference counting alone never frees, so it would otherwise stay
+    in memory until the cycle collector runs.
+    """
+    # Only the reference backend needs bs4, which is slow to import
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    try:
+        yield soup
+    finally:
+        # Decomposing the BeautifulSoup object alone leaves its children
+        # intact (recent bs4 versions walk from its next_element, which is
+        # None), so take the top-level nodes apart one by one
+        for child in list(soup.contents):
+            child.decompose()
+        soup.decompose()
+
+
+class BeautifulSoupBackend:
+    """The reference parser: BeautifulSoup with Python's html.parser."""
+
+    name = "bs4"
+
+    def parse_ikman_ad(self, content):
+        with parsed_soup(content) as ad_soup:
+            car_info = empty_ikman_car_info()
+
+            # Extract price and clean it
+            price_tag = ad_soup.find('div', class_='amount--3NTpl')
+            car_info['Price'] = clean_number(price_tag.text) if price_tag else None
+
+            # Extract district
+            district_tag = ad_soup.find('a', class_='subtitle-location-link--1q5zA',
+                                        attrs={'data-testid': 'subtitle-parentlocation-link'})
+            car_info['District'] = district_tag.text.strip() if district_tag else "N/A"
+
+            # Extract ad metadata
+            for meta in ad_soup.find_all('div', class_='full-width--XovDn'):
+                label_tag = meta.find('div', class_='label--3oVZK')
+                value_tag = meta.find('div', class_='value--1lKHt')
+
+                if label_tag and value_tag:
+                    label = label_tag.text.strip().replace(':', '')
+                    field = IKMAN_META_FIELDS.get(label)
+                    if field:
+                        value = ' '.join(value_tag.stripped_strings)
+                        key, numeric = field
+                        car_info[key] = clean_number(value) if numeric else value
+        return car_info
+
+    def parse_ikman_search_page(self, content):
+        with parsed_soup(content) as soup:
+            hrefs = []
+            for ad in soup.find_all('a', class_='card-link--3ssYv'):
+                href = ad.get('href')
+                if href and "boost-ad" not in href:
+                    hrefs.append(href)
+        return hrefs
+
+    def parse_ikman_search_cards(self, content):
+        with parsed_soup(content) as soup:
+            cards = []
+            for ad in soup.find_all('a', class_='card-link--3ssYv'):
+                href = ad.get('href')
+                if href and "boost-ad" not in href:
+                    title = ad.find('h2', class_='title--3yncE')
+                    description = ad.find('div', class_='description--2-ez3')
+                    price = ad.find('div', class_='price--3SnqI')
+                    card = ikman_card_fields(
+                        title.get_text(strip=True) if title else None,
+                        description.get_text(strip=True) if description else None,
+                        price.get_text(strip=True) if price else None,
+                    )
+                    cards.append(dict(href=href, **card))
+        return cards
+
+    def parse_riyasewana_listing(self, content):
+        with parsed_soup(content) as soup:
+            car_data = {}
+
+            # Vehicle Details Table
+            table = soup.find('table', class_='moret')
+            if table:
+                for row in table.find_all('tr'):
+                    cols = row.find_all('td')
+                    if len(cols) >= 4:
+                        car_data[cols[0].get_text(strip=True)] = cols[1].get_text(strip=True)
+                        car_data[cols[2].get_text(strip=True)] = cols[3].get_text(strip=True)
+                    elif len(cols) >= 2:
+                        car_data[cols[0].get_text(strip=True)] = cols[1].get_text(strip=True)
+        return map_riyasewana_fields(car_data)
+
+    def parse_riyasewana_search_page(self, content):
+        with parsed_soup(content) as soup:
+            cards = []
+            for listing in soup.find_all('li', class_='item round'):
+                h2_tag = listing.find('h2', class_='more')
+                link = h2_tag.find('a') if h2_tag else None
+                if link is None or not link.get('href'):
+                    cards.append({'error': "listing has no ad link"})
+                    continue
+                boxtext_div = listing.find('div', class_='boxtext')
+                if boxtext_div is None:
+                    cards.append({'error': "listing has no price/location box"})
+                    continue
+                city, price, mileage = riyasewana_card_fields(
+                    (div.get('class', []), div.get_text(strip=True))
+                    for div in boxtext_div.find_all('div', class_='boxintxt')
+                )
+                cards.append({
+                    'href': link['href'], 'title': link.get_text(strip=True),
+                    'city': city, 'price': price, 'mileage': mileage,
+                })
+        return cards
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _stripped_text(element):
+    """Equivalent of BeautifulSoup's get_text(strip=True)."""
+    return ''.join(text.strip() for text in element.itertext() if text.strip())
+
+
+# Byte order marks bs4 recognizes, and the encoding each implies
+_BOMS = [
+    (b"\xef\xbb\xbf", "utf-8"),
+    (b"\xff\xfe", "utf-16-le"),
+    (b"\xfe\xff", "utf-16-be"),
+]
+
+# A charset declared in a <meta> tag (the pattern bs4 uses)
+_META_CHARSET = re.compile(rb"""<\s*meta[^>]+charset\s*=\s*["']?([^>]*?)[ /;'">]""", re.I)
+
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+
+def _decode_page(content):
+    """
+    Decodes page bytes the way bs4 does: a byte order mark, then a declared
+    charset, then UTF-8, then windows-1252. libxml2 itself reads pages
+    without a declared charset as latin-1, garbling UTF-8 text.
+    """
+    for bom, encoding in _BOMS:
+        if content.startswith(bom):
+            return content[len(bom):].decode(encoding, "replace")
+    declared = _META_CHARSET.search(content, 0, max(2048, len(content) // 20))
+    encodings = [declared.group(1).decode("ascii", "ignore")] if declared else []
+    for encoding in encodings + ["utf-8", "windows-1252"]:
+        try:
+            return content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return content.decode("windows-1252", "replace")
+
+
+class LxmlBackend:
+    """libxml2's HTML parser with precompiled XPath selectors."""
+
+    name = "lxml"
+
+    def __init__(self):
+        self.ikman_price = etree.XPath(f"(//div[{_has_class('amount--3NTpl')}])[1]")
+        self.ikman_district = etree.XPath(
+            f"(//a[{_has_class('subtitle-location-link--1q5zA')}]"
+            f"[@data-testid='subtitle-parentlocation-link'])[1]"
+        )
+        self.ikman_meta = etree.XPath(f"//div[{_has_class('full-width--XovDn')}]")
+        self.ikman_label = etree.XPath(f"(.//div[{_has_class('label--3oVZK')}])[1]")
+        self.ikman_value = etree.XPath(f"(.//div[{_has_class('value--1lKHt')}])[1]")
+        self.ikman_cards = etree.XPath(f"//a[{_has_class('card-link--3ssYv')}]")
+        self.ikman_card_title = etree.XPath(f"(.//h2[{_has_class('title--3yncE')}])[1]")
+        self.ikman_card_description = etree.XPath(f"(.//div[{_has_class('description--2-ez3')}])[1]")
+        self.ikman_card_price = etree.XPath(f"(.//div[{_has_class('price--3SnqI')}])[1]")
+        self.riyasewana_table = etree.XPath(f"(//table[{_has_class('moret')}])[1]")
+        self.rows = etree.XPath(".//tr")
+        self.cells = etree.XPath(".//td")
+        self.riyasewana_listings = etree.XPath("//li[normalize-space(@class)='item round']")
+        self.riyasewana_link = etree.XPath(f"(.//h2[{_has_class('more')}])[1]")
+        self.riyasewana_boxtext = etree.XPath(f"(.//div[{_has_class('boxtext')}])[1]")
+        self.riyasewana_boxes = etree.XPath(f".//div[{_has_class('boxintxt')}]")
+
+    @staticmethod
+    def _document(content):
+        if not content or not content.strip():
+            content = b"<html></html>"
+        if isinstance(content, bytes):
+            # lxml refuses text that still declares an encoding
+            content = _XML_DECLARATION.sub("", _decode_page(content), count=1)
+        return lxml.html.document_fromstring(content)
+
+    @staticmethod
+    def _first(xpath, node):
+        found = xpath(node)
+        return found[0] if found else None
+
+    def parse_ikman_ad(self, content):
+        doc = self._document(content)
+        car_info = empty_ikman_car_info()
+
+        price_tag = self._first(self.ikman_price, doc)
+        car_info['Price'] = clean_number(price_tag.text_content()) if price_tag is not None else None
+
+        district_tag = self._first(self.ikman_district, doc)
+        car_info['District'] = district_tag.text_content().strip() if district_tag is not None else "N/A"
+
+        for meta in self.ikman_meta(doc):
+            label_tag = self._first(self.ikman_label, meta)
+            value_tag = self._first(self.ikman_value, meta)
+
+            if label_tag is not None and value_tag is not None:
+                label = label_tag.text_content().strip().replace(':', '')
+                field = IKMAN_META_FIELDS.get(label)
+                if field:
+                    value = ' '.join(text.strip() for text in value_tag.itertext() if text.strip())
+                    key, numeric = field
+                    car_info[key] = clean_number(value) if numeric else value
+
+        return car_info
+
+    def parse_ikman_search_page(self, content):
+        doc = self._document(content)
+        hrefs = []
+        for ad in self.ikman_cards(doc):
+            href = ad.get('href')
+            if href and "boost-ad" not in href:
+                hrefs.append(href)
+        return hrefs
+
+    def parse_ikman_search_cards(self, content):
+        doc = self._document(content)
+        cards = []
+        for ad in self.ikman_cards(doc):
+            href = ad.get('href')
+            if href and "boost-ad" not in href:
+                title = self._first(self.ikman_card_title, ad)
+                description = self._first(self.ikman_card_description, ad)
+                price = self._first(self.ikman_card_price, ad)
+                card = ikman_card_fields(
+                    _stripped_text(title) if title is not None else None,
+                    _stripped_text(description) if description is not None else None,
+                    _stripped_text(price) if price is not None else None,
+                )
+                cards.append(dict(href=href, **card))
+        return cards
+
+    def parse_riyasewana_listing(self, content):
+        doc = self._document(content)
+        car_data = {}
+
+        table = self._first(self.riyasewana_table, doc)
+        if table is not None:
+            for row in self.rows(table):
+                cols = self.cells(row)
+                if len(cols) >= 4:
+                    car_data[_stripped_text(cols[0])] = _stripped_text(cols[1])
+                    car_data[_stripped_text(cols[2])] = _stripped_text(cols[3])
+                elif len(cols) >= 2:
+                    car_data[_stripped_text(cols[0])] = _stripped_text(cols[1])
+
+        return map_riyasewana_fields(car_data)
+
+    def parse_riyasewana_search_page(self, content):
+        doc = self._document(content)
+        cards = []
+        for listing in self.riyasewana_listings(doc):
+            h2_tag = self._first(self.riyasewana_link, listing)
+            link = h2_tag.find('.//a') if h2_tag is not None else None
+            if link is None or not link.get('href'):
+                cards.append({'error': "listing has no ad link"})
+                continue
+            boxtext_div = self._first(self.riyasewana_boxtext, listing)
+            if boxtext_div is None:
+                cards.append({'error': "listing has no price/location box"})
+                continue
+            city, price, mileage = riyasewana_card_fields(
+                (div.get('class', '').split(), _stripped_text(div))
+                for div in self.riyasewana_boxes(boxtext_div)
+            )
+            cards.append({
+                'href': link.get('href'), 'title': _stripped_text(link),
+                'city': city, 'price': price, 'mileage': mileage,
+            })
+        return cards
+
+
+BACKENDS = {"bs4": BeautifulSoupBackend}
+if lxml is not None:
+    BACKENDS["lxml"] = LxmlBackend
+
+_backend = None
+
+
+def get_backend(name=None):
+    """Returns a parser backend by name, or the active default."""
+    if name is not None:
+        return BACKENDS[name]()
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS["lxml" if "lxml" in BACKENDS else "bs4"]()
+    return _backend
+
+
+def set_backend(name):
+    """Selects the backend used by the scrapers."""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}'. Available: {', '.join(BACKENDS)}")
+    _backend = BACKENDS[name]()
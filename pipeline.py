@@ -0,0 +1,117 @@
+# pipeline.py
+
+import os
+import threading
+
+import http_session
+import parsers
+from fetcher import fetch_all
+
+
+def _init_worker(backend_name):
+    """Selects the parser backend inside each worker process."""
+    if backend_name:
+        parsers.set_backend(backend_name)
+
+
+def _parse_in_worker(method, content):
+    """
+    Parses one page in a worker process. Dict results are sent back as a
+    (keys, values) pair of tuples, which pickles smaller than the dict.
+    """
+    result = getattr(parsers.get_backend(), method)(content)
+    if isinstance(result, dict):
+        return tuple(result), tuple(result.values())
+    return result
+
+
+def _unpack(result):
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], tuple):
+        return dict(zip(*result))
+    return result
+
+
+class ParsePool:
+    """
+    A process pool of parser workers fed with raw HTML bytes.
+
+    At most max_pending pages may be queued or parsing at once; submit()
+    blocks beyond that, so downloads cannot outrun parsing and grow memory
+    without bound.
+    """
+
+    def __init__(self, workers=None, max_pending=None, backend=None, mp_context=None):
+        # Only runs with a parse pool need multiprocessing
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        if mp_context is None:
+            # Forking a process that runs threads (the GUI, download threads)
+            # can copy a lock while another thread holds it and hang the
+            # worker; start workers from a clean process instead
+            methods = multiprocessing.get_all_start_methods()
+            mp_context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=mp_context, initializer=_init_worker, initargs=(backend,)
+        )
+
+    def submit(self, method, content):
+        """
+        Queues content for parsing with the named parsers backend method and
+        returns a future of the parsed result.
+        """
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(_parse_in_worker, method, content)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def parse(self, method, content):
+        """Parses content in a worker and waits for the result."""
+        return _unpack(self.submit(method, content).result())
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+def fetch_and_parse(urls, method, parse_pool, max_workers=4, rate_limiter=None,
+                    stop_flag=None, headers=None, on_result=None):
+    """
+    Downloads urls on max_workers threads and hands the raw bytes to
+    parse_pool, so download threads never spend time parsing.
+
+    Returns (url, parsed, error) tuples in the same order as urls; URLs
+    skipped because of the stop flag are omitted.
+    """
+    def download(url):
+        response = http_session.get(url, headers=headers, stop_flag=stop_flag)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return parse_pool.submit(method, response.content)
+
+    results = []
+    for url, future, error in fetch_all(urls, download, max_workers=max_workers,
+                                        rate_limiter=rate_limiter, stop_flag=stop_flag):
+        parsed = None
+        if error is None:
+            try:
+                parsed = _unpack(future.result())
+            except Exception as e:
+                error = e
+        if on_result:
+            on_result(url, parsed, error)
+        results.append((url, parsed, error))
+    return results
@@ -0,0 +1,189 @@
+# query.py
+
+import numpy as np
+import pandas as pd
+
+# Numeric columns with a sorted index, for range filters
+RANGE_COLUMNS = ["Price", "Mileage", "Year of Manufacture"]
+
+# Low-cardinality columns with an exact-match index
+VALUE_COLUMNS = ["Fuel Type", "Transmission", "District", "Brand"]
+
+# A filter matching more than this share of rows is read by scanning its
+# column rather than gathering (and sorting) rows from its index
+SCAN_SHARE = 0.1
+
+# Substring queries shorter than this scan the distinct model names instead
+NGRAM = 3
+
+
+def ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SortedIndex:
+    """Row positions ordered by one numeric column; nulls are left out."""
+
+    def __init__(self, values):
+        self.column = pd.to_numeric(values, errors="coerce").astype("float64").to_numpy()
+        known = np.flatnonzero(~np.isnan(self.column))
+        order = np.argsort(self.column[known], kind="stable")
+        self.rows = known[order]
+        self.values = self.column[known][order]
+
+    def bounds(self, low=None, high=None):
+        start = 0 if low is None else np.searchsorted(self.values, low, side="left")
+        end = len(self.values) if high is None else np.searchsorted(self.values, high, side="right")
+        return start, end
+
+    def count(self, low=None, high=None):
+        start, end = self.bounds(low, high)
+        return end - start
+
+    def lookup(self, low=None, high=None):
+        """Row positions with low <= value <= high (either bound may be None)."""
+        start, end = self.bounds(low, high)
+        return self.rows[start:end]
+
+    def mask(self, values, low=None, high=None):
+        """True where values (read from the column) are within the range."""
+        mask = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def scan(self, low=None, high=None):
+        """Like lookup, but reads the whole column in row order; cheaper for broad ranges."""
+        return np.flatnonzero(self.mask(self.column, low, high))
+
+    def keep(self, rows, low=None, high=None):
+        """Narrows rows to those in the range, by reading their values directly."""
+        return rows[self.mask(self.column[rows], low, high)]
+
+
+class ValueIndex:
+    """Row positions grouped by the distinct (lowercased) values of a column."""
+
+    def __init__(self, values):
+        values = values.astype("string").str.strip().str.lower()
+        self.codes, uniques = pd.factorize(values)
+        self.values = [str(value) for value in uniques]
+        # Rows of value i are rows[starts[i]:starts[i + 1]]
+        self.rows = np.argsort(self.codes, kind="stable")
+        self.starts = np.searchsorted(self.codes[self.rows], np.arange(len(self.values) + 1))
+
+    def ids_equal(self, value):
+        value = value.strip().lower()
+        return [i for i, known in enumerate(self.values) if known == value]
+
+    def count(self, ids):
+        ids = np.asarray(ids, dtype=np.intp)
+        return int((self.starts[ids + 1] - self.starts[ids]).sum())
+
+    def lookup(self, ids):
+        slices = [self.rows[self.starts[i]:self.starts[i + 1]] for i in ids]
+        if not slices:
+            return np.array([], dtype=np.intp)
+        return np.concatenate(slices)
+
+    def id_table(self, ids):
+        # Indexed by code; nulls have code -1 and hit the last, False entry
+        table = np.zeros(len(self.values) + 1, dtype=bool)
+        table[list(ids)] = True
+        return table
+
+    def scan(self, ids):
+        return np.flatnonzero(self.id_table(ids)[self.codes])
+
+    def keep(self, rows, ids):
+        return rows[self.id_table(ids)[self.codes[rows]]]
+
+
+class SubstringIndex(ValueIndex):
+    """A ValueIndex that also finds values containing a substring, via an n-gram index."""
+
+    def __init__(self, values):
+        super().__init__(values)
+        self.postings = {}
+        for value_id, value in enumerate(self.values):
+            for gram in ngrams(value):
+                self.postings.setdefault(gram, []).append(value_id)
+
+    def ids_containing(self, text):
+        """Ids of the distinct values containing text, ignoring case."""
+        text = text.strip().lower()
+        grams = ngrams(text)
+        if grams:
+            # Only values sharing every n-gram of the query can contain it
+            candidates = None
+            for gram in sorted(grams, key=lambda gram: len(self.postings.get(gram, ()))):
+                ids = set(self.postings.get(gram, ()))
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    break
+        else:
+            candidates = range(len(self.values))
+        return sorted(i for i in candidates if text in self.values[i])
+
+
+class ResultIndex:
+    """
+    Prebuilt indexes over one site's loaded results, so filtering only
+    touches matching rows: sorted indexes for price, mileage and year,
+    exact-match indexes for fuel, transmission, district and brand, and an
+    n-gram index over model names for substring search.
+    """
+
+    def __init__(self, df):
+        self.frame = df.reset_index(drop=True)
+        self.ranges = {column: SortedIndex(self.frame[column]) for column in RANGE_COLUMNS if column in self.frame.columns}
+        self.values = {column: ValueIndex(self.frame[column]) for column in VALUE_COLUMNS if column in self.frame.columns}
+        self.model = SubstringIndex(self.frame["Model"]) if "Model" in self.frame.columns else None
+        self.price = pd.to_numeric(self.frame["Price"], errors="coerce").astype("float64").to_numpy()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def query(self, model=None, ranges=None, values=None):
+        """
+        Returns the sorted row positions matching every given filter:
+        model is a substring, ranges maps a RANGE_COLUMNS column to
+        (low, high) and values maps a VALUE_COLUMNS column to a value.
+        Columns that were not loaded are ignored.
+        """
+        # (index, lookup arguments) for every active filter
+        filters = []
+        if model and self.model is not None:
+            filters.append((self.model, (self.model.ids_containing(model),)))
+        for column, (low, high) in (ranges or {}).items():
+            if column in self.ranges and (low is not None or high is not None):
+                filters.append((self.ranges[column], (low, high)))
+        for column, value in (values or {}).items():
+            if column in self.values and value:
+                index = self.values[column]
+                filters.append((index, (index.ids_equal(value),)))
+
+        if not filters:
+            return np.arange(len(self.frame))
+        # Read the most selective filter from its index, then check the
+        # others against just those rows
+        filters.sort(key=lambda item: item[0].count(*item[1]))
+        index, args = filters[0]
+        if index.count(*args) > SCAN_SHARE * len(self.frame):
+            rows = index.scan(*args)
+        else:
+            rows = np.sort(index.lookup(*args))
+        for index, args in filters[1:]:
+            rows = index.keep(rows, *args)
+        return rows
+
+    def average_price(self, rows):
+        """Mean price of the given rows, ignoring missing prices (NaN if none)."""
+        prices = self.price[rows]
+        prices = prices[~np.isnan(prices)]
+        return prices.mean() if len(prices) else float("nan")
+
+    def select(self, rows):
+        return self.frame.iloc[rows]
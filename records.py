@@ -0,0 +1,57 @@
+# records.py
+
+from parsers import CAR_COLUMNS
+
+# Columns with few distinct values; within a batch, every occurrence of a
+# value shares one string object
+POOLED_COLUMNS = frozenset([
+    "District", "Brand", "Model", "Year of Manufacture",
+    "Fuel Type", "Transmission", "Engine Capacity",
+])
+
+
+class RecordBatch:
+    """
+    Scraped records held column by column: one list per CAR_COLUMNS field
+    instead of a dict per ad, with repeated brand, model, district etc.
+    values pooled to a single string. Appending copies the fields out of
+    the record dict, so the parser's dict is freed straight away.
+    """
+
+    __slots__ = ("columns", "pool")
+
+    def __init__(self, records=()):
+        self.columns = {name: [] for name in CAR_COLUMNS}
+        self.pool = {}
+        self.extend(records)
+
+    def append(self, record):
+        pool = self.pool
+        for name, values in self.columns.items():
+            value = record.get(name)
+            if name in POOLED_COLUMNS:
+                value = pool.setdefault(value, value)
+            values.append(value)
+
+    def extend(self, records):
+        if isinstance(records, RecordBatch):
+            # Already pooled; the values may be shared as they are
+            for name, values in self.columns.items():
+                values.extend(records.columns[name])
+            return
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.columns[CAR_COLUMNS[0]])
+
+    def __iter__(self):
+        """Yields the records as dicts, for code that wants them one at a time."""
+        for values in zip(*self.columns.values()):
+            yield dict(zip(CAR_COLUMNS, values))
+
+    def to_frame(self):
+        """A DataFrame with CAR_COLUMNS, one row per record in order."""
+        import pandas as pd
+
+        return pd.DataFrame(self.columns, columns=CAR_COLUMNS)
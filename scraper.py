@@ -1,48 +1,80 @@
 # car_scraper.py
 
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import time
 import urllib.parse
-import re
 import json
+import os
+
+import http_session
+import parsers
+from fetcher import HostRateLimiter, fetch_all
+from gazetteer import district_for_city
+from pipeline import fetch_and_parse
+from parsers import clean_number
+from records import RecordBatch
+
+# Site roots, kept as module constants so the benchmarks can point the
+# scrapers at a local stand-in server
+IKMAN_BASE_URL = "https://ikman.lk"
+RIYASEWANA_BASE_URL = "https://riyasewana.com"
+
+def save_results_csv(df, output_csv, append=False):
+    """Writes results to CSV, appending to an existing file when requested."""
+    if append and os.path.exists(output_csv):
+        df.to_csv(output_csv, mode='a', header=False, index=False)
+    else:
+        df.to_csv(output_csv, index=False)
 
-# Helper function for cleaning numbers
-def clean_number(text):
-    """Cleans and extracts numeric values from a text."""
-    return re.sub(r'\D', '', text)  # Remove non-digit characters
-
-# Include the districts data directly in the code
-districts_data = [
-    {
-        "District": "Colombo",
-        "Cities": ["Colombo", "Dehiwala", "Mount Lavinia", "Moratuwa", "Negombo", "Kotte", "Battaramulla"]
-    },
-    # Add other districts and their cities as needed
-    # ...
-]
-
-# Create a dictionary mapping city names to district names
-city_to_district = {}
-for district_info in districts_data:
-    district_name = district_info['District']
-    for city_name in district_info['Cities']:
-        city_to_district[city_name.lower()] = district_name  # Use lowercase for case-insensitive matching
+def complete_page(sink, checkpoint, search_key, page, stop_flag=None):
+    """Flushes the sink and checkpoints a page, unless it was cut short by a stop."""
+    if sink is not None:
+        sink.flush()
+    if checkpoint is not None and not (stop_flag and stop_flag.is_set()):
+        checkpoint.mark(search_key, page)
 
 def scrape_ikman_cars(
     district, min_price, max_price, brand, min_yom, max_yom,
-    fuel_type, transmission, pages_to_scrape, output_csv=None, stop_flag=None
+    fuel_type, transmission, pages_to_scrape, output_csv=None, stop_flag=None,
+    max_workers=4, requests_per_second=None, seen_index=None, parse_pool=None,
+    sink=None, checkpoint=None
 ):
     """
     Scrapes car listings from ikman.lk based on the provided filters.
+
+    Ad detail pages are fetched with up to max_workers requests in flight;
+    how many actually run at once is adapted to the site's health by the
+    per-host limiter in concurrency.py. requests_per_second, if given,
+    also caps the request rate with a per-host token bucket.
+
+    With a seen_index, only ads not scraped before are fetched, pagination
+    stops at the first page made up entirely of known ads, and output_csv
+    is appended to rather than overwritten.
+
+    With a parse_pool (pipeline.ParsePool), download threads only fetch
+    raw pages and parsing runs in the pool's worker processes.
+
+    With a sink (sinks.RecordSink), records are streamed to it as they are
+    scraped and flushed after every page instead of being collected in
+    memory; the returned DataFrame is then empty. With a checkpoint
+    (sinks.ScrapeCheckpoint), the run resumes after the last completed page.
     """
-    all_car_details = []  # List to store all car details
+    all_car_details = RecordBatch()  # All car details, stored column by column
+    rate_limiter = HostRateLimiter(requests_per_second)
+
+    def report(ad_url, car_details, error):
+        if error is not None:
+            print(f"Failed to scrape {ad_url}: {error}")
+        else:
+            print(f"Scraped: {ad_url}")
 
     # Construct the base search URL
     search_url = construct_ikman_search_url(district, brand, min_yom, max_yom, fuel_type, transmission)
 
-    for page in range(1, pages_to_scrape + 1):
+    start_page = checkpoint.last_page(search_url) + 1 if checkpoint else 1
+    if start_page > 1:
+        print(f"Resuming ikman.lk from page {start_page}.")
+    previous_urls = None
+
+    for page in range(start_page, pages_to_scrape + 1):
         # Check the stop flag before processing each page
         if stop_flag and stop_flag.is_set():
             print("Scraping ikman.lk stopped by user.")
@@ -52,108 +84,78 @@ def scrape_ikman_cars(
         print(f"Scraping ikman.lk page {page}...")
 
         # Extract ad URLs from the current page
+        if not rate_limiter.acquire(page_url, stop_flag):
+            print("Scraping ikman.lk stopped by user.")
+            break
         ad_urls = get_ikman_ads_from_page(page_url)
 
-        for ad_url in ad_urls:
-            # Check the stop flag before processing each ad
-            if stop_flag and stop_flag.is_set():
-                print("Scraping ikman.lk stopped by user.")
+        # Stop at the end of the results instead of requesting empty pages
+        if not ad_urls:
+            print(f"No listings on ikman.lk page {page}. Stopping.")
+            break
+        if ad_urls == previous_urls:
+            print(f"ikman.lk page {page} repeats page {page - 1}. Stopping.")
+            break
+        previous_urls = ad_urls
+
+        # Skip ads scraped on earlier runs
+        if seen_index is not None:
+            ad_urls, known_urls = seen_index.split_new(ad_urls)
+            if known_urls and not ad_urls:
+                print(f"All ads on ikman.lk page {page} were already scraped. Stopping.")
                 break
 
-            try:
-                car_details = get_ikman_ad_details(ad_url)  # Scrape individual ad details
-                all_car_details.append(car_details)
-                print(f"Scraped: {ad_url}")
-                time.sleep(1)  # Respectful pause between requests
-            except Exception as e:
-                print(f"Failed to scrape {ad_url}: {e}")
+        # Scrape individual ad details concurrently, keeping the page order
+        if parse_pool is not None:
+            fetched = fetch_and_parse(
+                ad_urls, "parse_ikman_ad", parse_pool, max_workers=max_workers,
+                rate_limiter=rate_limiter, stop_flag=stop_flag, on_result=report
+            )
+        else:
+            fetched = fetch_all(
+                ad_urls, lambda ad_url: get_ikman_ad_details(ad_url, stop_flag), max_workers=max_workers,
+                rate_limiter=rate_limiter, stop_flag=stop_flag, on_result=report
+            )
+        for ad_url, car_details, error in fetched:
+            if error is None:
+                if sink is not None:
+                    sink.write(car_details)
+                else:
+                    all_car_details.append(car_details)
+                if seen_index is not None:
+                    seen_index.mark_seen([ad_url], "ikman.lk")
+
+        complete_page(sink, checkpoint, search_url, page, stop_flag)
 
         # Additional check after processing each page
         if stop_flag and stop_flag.is_set():
             print("Scraping ikman.lk stopped by user after page processing.")
             break
 
-    # Convert the list of dictionaries to a DataFrame with the required columns
-    df = pd.DataFrame(all_car_details, columns=[
-        "Price", "District", "Brand", "Model",
-        "Year of Manufacture", "Fuel Type",
-        "Transmission", "Engine Capacity", "Mileage"
-    ])
+    # Convert the collected records to a DataFrame with the required columns
+    df = all_car_details.to_frame()
 
     # Save the DataFrame to a CSV file if output_csv is provided
-    if output_csv:
-        df.to_csv(output_csv, index=False)
+    if output_csv and sink is None:
+        save_results_csv(df, output_csv, append=seen_index is not None)
         print(f"Data saved to {output_csv}")
 
     return df
 
-def get_ikman_ad_details(ad_url):
+def get_ikman_ad_details(ad_url, stop_flag=None):
     """Extracts the required details from a single ikman.lk ad page."""
-    response = requests.get(ad_url)
-    ad_soup = BeautifulSoup(response.content, 'html.parser')
-
-    # Define placeholders only for the required fields
-    car_info = {
-        "Price": None, "District": None, "Brand": None,
-        "Model": None, "Year of Manufacture": None,
-        "Fuel Type": None, "Transmission": None,
-        "Engine Capacity": None, "Mileage": None
-    }
-
-    # Extract price and clean it
-    price_tag = ad_soup.find('div', class_='amount--3NTpl')
-    car_info['Price'] = clean_number(price_tag.text) if price_tag else None
-
-    # Extract district
-    district_tag = ad_soup.find('a', class_='subtitle-location-link--1q5zA',
-                                attrs={'data-testid': 'subtitle-parentlocation-link'})
-    car_info['District'] = district_tag.text.strip() if district_tag else "N/A"
-
-    # Extract ad metadata
-    meta_tags = ad_soup.find_all('div', class_='full-width--XovDn')
-    for meta in meta_tags:
-        label_tag = meta.find('div', class_='label--3oVZK')
-        value_tag = meta.find('div', class_='value--1lKHt')
-
-        if label_tag and value_tag:
-            label = label_tag.text.strip().replace(':', '')
-            value = ' '.join(value_tag.stripped_strings)
-
-            # Map label to the required keys in car_info
-            if label == "Brand":
-                car_info['Brand'] = value
-            elif label == "Model":
-                car_info['Model'] = value
-            elif label == "Year of Manufacture":
-                car_info['Year of Manufacture'] = value
-            elif label == "Fuel type":
-                car_info['Fuel Type'] = value
-            elif label == "Transmission":
-                car_info['Transmission'] = value
-            elif label == "Engine capacity":
-                car_info['Engine Capacity'] = clean_number(value)  # Clean engine capacity
-            elif label == "Mileage":
-                car_info['Mileage'] = clean_number(value)  # Clean mileage
-
-    return car_info
+    response = http_session.get(ad_url, stop_flag=stop_flag)
+    return parsers.get_backend().parse_ikman_ad(response.content)
 
 def get_ikman_ads_from_page(url):
     """Extracts ad URLs from an ikman.lk page."""
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    ad_cards = soup.find_all('a', class_='card-link--3ssYv')
-
-    ad_urls = []
-    for ad in ad_cards:
-        href = ad.get('href')
-        if href and "boost-ad" not in href:
-            ad_urls.append(f"https://ikman.lk{href}")
-
-    return ad_urls
+    response = http_session.get(url)
+    hrefs = parsers.get_backend().parse_ikman_search_page(response.content)
+    return [f"{IKMAN_BASE_URL}{href}" for href in hrefs]
 
 def construct_ikman_search_url(district, brand, min_yom, max_yom, fuel_type, transmission):
     """Constructs the ikman.lk search URL based on the provided filters."""
-    base_url = f"https://ikman.lk/en/ads/{urllib.parse.quote(district)}/cars"
+    base_url = f"{IKMAN_BASE_URL}/en/ads/{urllib.parse.quote(district)}/cars"
     search_params = []
 
     if brand:
@@ -174,21 +176,40 @@ def construct_ikman_search_url(district, brand, min_yom, max_yom, fuel_type, tra
 
 def scrape_riyasewana_cars(
     district, min_price, max_price, brand, min_yom,
-    max_yom, fuel_type, transmission, pages_to_scrape, output_csv=None, stop_flag=None
+    max_yom, fuel_type, transmission, pages_to_scrape, output_csv=None, stop_flag=None,
+    seen_index=None, parse_pool=None, sink=None, checkpoint=None, max_workers=4
 ):
     """
     Scrapes car listings from riyasewana.com based on the provided filters.
+
+    Listing pages are fetched with up to max_workers requests in flight;
+    how many actually run at once is adapted to the site's health by the
+    per-host limiter in concurrency.py.
+
+    With a seen_index, only listings not scraped before are fetched,
+    pagination stops at the first page with no new listings, and output_csv
+    is appended to rather than overwritten.
+
+    With a parse_pool (pipeline.ParsePool), pages are parsed in the pool's
+    worker processes instead of on the scraping thread.
+
+    sink and checkpoint behave as in scrape_ikman_cars.
     """
     # Add '-district' suffix to the district input
     district += "-district"
 
     # Base URL without the '?page=' parameter
     base_url = (
-        f"https://riyasewana.com/search/cars/{brand}/{district}/{min_yom}-{max_yom}/"
+        f"{RIYASEWANA_BASE_URL}/search/cars/{brand}/{district}/{min_yom}-{max_yom}/"
         f"{fuel_type}/{transmission}/price-{min_price}-{max_price}"
     )
-    data_list = []
-    for page in range(1, pages_to_scrape + 1):
+    data_list = RecordBatch()
+    start_page = checkpoint.last_page(base_url) + 1 if checkpoint else 1
+    if start_page > 1:
+        print(f"Resuming riyasewana.com from page {start_page}.")
+    previous_urls = None
+
+    for page in range(start_page, pages_to_scrape + 1):
         # Check the stop flag before processing each page
         if stop_flag and stop_flag.is_set():
             print("Scraping riyasewana.com stopped by user.")
@@ -199,8 +220,35 @@ def scrape_riyasewana_cars(
         else:
             url = f"{base_url}?page={page}"
         print(f"Scraping riyasewana.com page {page}: {url}")
-        scrape_riyasewana_page(url, data_list, stop_flag)
-        time.sleep(1)
+        cards = get_riyasewana_cards(url, parse_pool)
+        # Leave a page that failed to load uncheckpointed, so a resumed run retries it
+        if cards is None:
+            print(f"Failed to retrieve riyasewana.com page {page}. Stopping.")
+            break
+
+        # Stop at the end of the results instead of requesting empty pages
+        if not cards:
+            print(f"No listings on riyasewana.com page {page}. Stopping.")
+            break
+        page_urls = [riyasewana_listing_url(card['href']) for card in cards if 'href' in card]
+        if page_urls == previous_urls:
+            print(f"riyasewana.com page {page} repeats page {page - 1}. Stopping.")
+            break
+        previous_urls = page_urls
+
+        page_records = []
+        new_listings = scrape_riyasewana_page(cards, page_records, stop_flag, seen_index, parse_pool, max_workers)
+        if sink is not None:
+            for record in page_records:
+                sink.write(record)
+        else:
+            data_list.extend(page_records)
+        complete_page(sink, checkpoint, base_url, page, stop_flag)
+
+        # A page with only known ads is where earlier runs got to
+        if not new_listings:
+            print(f"No new listings on riyasewana.com page {page}. Stopping.")
+            break
 
         # Additional check after processing each page
         if stop_flag and stop_flag.is_set():
@@ -208,129 +256,108 @@ def scrape_riyasewana_cars(
             break
 
     # Create DataFrame with only the required fields
-    df = pd.DataFrame(data_list, columns=[
-        'Price',
-        'District',
-        'Brand',
-        'Model',
-        'Year of Manufacture',
-        'Fuel Type',
-        'Transmission',
-        'Engine Capacity',
-        'Mileage'
-    ])
+    df = data_list.to_frame()
 
     # Save to CSV if output_csv is provided
-    if output_csv:
-        df.to_csv(output_csv, index=False)
+    if output_csv and sink is None:
+        save_results_csv(df, output_csv, append=seen_index is not None)
         print(f"Data saved to {output_csv}.")
 
     return df
 
-def scrape_riyasewana_page(url, data_list, stop_flag=None):
+def riyasewana_listing_url(href):
+    """Returns the absolute ad URL for a riyasewana.com search result link."""
+    return f"{RIYASEWANA_BASE_URL}{href}" if not href.startswith('http') else href
+
+def parse_page(method, content, parse_pool=None):
+    """Parses content with the active backend, or in parse_pool's workers if given."""
+    if parse_pool is not None:
+        return parse_pool.parse(method, content)
+    return getattr(parsers.get_backend(), method)(content)
+
+def get_riyasewana_cards(url, parse_pool=None):
+    """Returns the listing cards of a riyasewana.com search page, or None if the page failed to load."""
     headers = {'User-Agent': 'Mozilla/5.0'}
-    response = requests.get(url, headers=headers)
+    response = http_session.get(url, headers=headers)
     if response.status_code != 200:
         print(f"Failed to retrieve page {url}")
-        return
-    soup = BeautifulSoup(response.content, 'html.parser')
-    listings = soup.find_all('li', class_='item round')
+        return None
+    return parse_page("parse_riyasewana_search_page", response.content, parse_pool)
 
-    for listing in listings:
-        # Check the stop flag before processing each listing
-        if stop_flag and stop_flag.is_set():
-            print("Scraping riyasewana.com stopped by user.")
-            break
+def scrape_riyasewana_page(cards, data_list, stop_flag=None, seen_index=None, parse_pool=None, max_workers=4):
+    """
+    Scrapes every listing among the cards of a riyasewana.com search page
+    into data_list, with up to max_workers listings fetched at once. Returns
+    the number of listings on the page that were not already in seen_index
+    (all of them when no index is given).
+    """
+    # Skip listings scraped on earlier runs
+    known_urls = set()
+    if seen_index is not None:
+        page_urls = [riyasewana_listing_url(card['href']) for card in cards if 'href' in card]
+        known_urls = set(seen_index.split_new(page_urls)[1])
+
+    # The listings to fetch, in page order, with their overview cards
+    listings = {}
+    for card in cards:
+        if 'error' in card:
+            print(f"Error extracting data for a listing: {card['error']}")
+            continue
+        full_car_url = riyasewana_listing_url(card['href'])
+        if full_car_url not in known_urls:
+            listings[full_car_url] = card
+
+    def report(listing_url, car_data, error):
+        if error is not None:
+            print(f"Error extracting data for a listing: {error}")
+        else:
+            print(f"Scraped: {listing_url}")
 
-        try:
-            h2_tag = listing.find('h2', class_='more')
-            car_url = h2_tag.find('a')['href']
-            full_car_url = f"https://riyasewana.com{car_url}" if not car_url.startswith('http') else car_url
-
-            # Print the URL being scraped
-            print(f"Scraped: {full_car_url}")
-
-            # Extract city and price from listing overview
-            boxtext_div = listing.find('div', class_='boxtext')
-            boxintxt_divs = boxtext_div.find_all('div', class_='boxintxt')
-
-            city = price = 'N/A'
-            for div in boxintxt_divs:
-                text = div.get_text(strip=True)
-                if 'b' in div.get('class', []):
-                    price = text.replace('Rs.', '').replace(',', '').strip()
-                elif 's' in div.get('class', []):
-                    pass  # skip date posted
-                else:
-                    if city == 'N/A':
-                        city = text
-
-            car_data = scrape_riyasewana_individual_listing(full_car_url, stop_flag)
-            if car_data:
-                # Lookup the district using the city name
-                district_name = city_to_district.get(city.lower(), 'Unknown')
-                car_data['District'] = district_name
-
-                # If 'Price' is 'N/A', get from listing overview
-                if car_data['Price'] == 'N/A':
-                    car_data['Price'] = price
-                data_list.append(car_data)
-            time.sleep(1)
-        except Exception as e:
-            print(f"Error extracting data for a listing: {e}")
-
-def scrape_riyasewana_individual_listing(url, stop_flag=None):
+    # Fetch the listings concurrently; the host's adaptive limiter in
+    # http_session decides how many are actually in flight
+    fetched = fetch_all(
+        listings, lambda listing_url: scrape_riyasewana_individual_listing(listing_url, stop_flag, parse_pool),
+        max_workers=max_workers, stop_flag=stop_flag, on_result=report
+    )
+    for full_car_url, car_data, error in fetched:
+        if not car_data:
+            continue
+        # City and price come from the listing overview
+        card = listings[full_car_url]
+        car_data['District'] = district_for_city(card['city'])
+
+        # If 'Price' is 'N/A', get from listing overview
+        if car_data['Price'] == 'N/A':
+            car_data['Price'] = card['price']
+        data_list.append(car_data)
+        if seen_index is not None:
+            seen_index.mark_seen([full_car_url], "riyasewana.com")
+
+    if stop_flag and stop_flag.is_set():
+        print("Scraping riyasewana.com stopped by user.")
+    return len(listings)
+
+def scrape_riyasewana_individual_listing(url, stop_flag=None, parse_pool=None):
     # Check the stop flag before making the request
     if stop_flag and stop_flag.is_set():
         print("Scraping riyasewana.com individual listing stopped by user.")
         return None
 
     headers = {'User-Agent': 'Mozilla/5.0'}
-    response = requests.get(url, headers=headers)
+    response = http_session.get(url, headers=headers, stop_flag=stop_flag)
     if response.status_code != 200:
         print(f"Failed to retrieve listing page {url}")
         return None
-    soup = BeautifulSoup(response.content, 'html.parser')
 
-    car_data = {}
     try:
-        # Vehicle Details Table
-        table = soup.find('table', class_='moret')
-        if table:
-            rows = table.find_all('tr')
-            for row in rows:
-                # Check the stop flag during parsing
-                if stop_flag and stop_flag.is_set():
-                    print("Scraping riyasewana.com individual listing stopped by user.")
-                    return None
-
-                cols = row.find_all('td')
-                if len(cols) >= 4:
-                    label1 = cols[0].get_text(strip=True)
-                    value1 = cols[1].get_text(strip=True)
-                    label2 = cols[2].get_text(strip=True)
-                    value2 = cols[3].get_text(strip=True)
-                    car_data[label1] = value1
-                    car_data[label2] = value2
-                elif len(cols) >= 2:
-                    label = cols[0].get_text(strip=True)
-                    value = cols[1].get_text(strip=True)
-                    car_data[label] = value
-
-        # Map extracted data to required fields
-        mapped_data = {
-            'Price': car_data.get('Price', 'N/A').replace('Rs.', '').replace(',', '').strip(),
-            'District': 'N/A',  # Will be updated in scrape_riyasewana_page function
-            'Brand': car_data.get('Make', 'N/A'),
-            'Model': car_data.get('Model', 'N/A'),
-            'Year of Manufacture': car_data.get('YOM', 'N/A'),
-            'Fuel Type': car_data.get('Fuel Type', 'N/A'),
-            'Transmission': car_data.get('Gear', 'N/A'),
-            'Engine Capacity': car_data.get('Engine (cc)', 'N/A').replace('cc', '').strip(),
-            'Mileage': car_data.get('Mileage (km)', 'N/A').replace(',', '').replace('km', '').strip(),
-        }
-
-        return mapped_data
+        mapped_data = parse_page("parse_riyasewana_listing", response.content, parse_pool)
     except Exception as e:
         print(f"Error extracting data from listing page {url}: {e}")
         return None
+
+    # Check the stop flag after parsing
+    if stop_flag and stop_flag.is_set():
+        print("Scraping riyasewana.com individual listing stopped by user.")
+        return None
+
+    return mapped_data
@@ -0,0 +1,84 @@
+# seen_index.py
+
+import sqlite3
+import threading
+import time
+
+DEFAULT_INDEX_PATH = "seen_ads.sqlite"
+
+
+class SeenIndex:
+    """
+    A persistent index of ad URLs already scraped, with the time each ad was
+    first and last seen in search results.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen_ads (
+                url TEXT PRIMARY KEY,
+                site TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.commit()
+
+    def known(self, urls):
+        """Returns the subset of urls that are already in the index."""
+        urls = list(urls)
+        if not urls:
+            return set()
+        placeholders = ",".join("?" * len(urls))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT url FROM seen_ads WHERE url IN ({placeholders})", urls
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def touch(self, urls):
+        """Updates last_seen for ads that showed up again in search results."""
+        now = time.time()
+        with self.lock:
+            self.conn.executemany("UPDATE seen_ads SET last_seen = ? WHERE url = ?", [(now, url) for url in urls])
+            self.conn.commit()
+
+    def mark_seen(self, urls, site):
+        """Records scraped ads, keeping first_seen for ones already indexed."""
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                """
+                INSERT INTO seen_ads (url, site, first_seen, last_seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET last_seen = excluded.last_seen
+                """,
+                [(url, site, now, now) for url in urls],
+            )
+            self.conn.commit()
+
+    def split_new(self, urls):
+        """
+        Splits a page of ad URLs into (new_urls, known_urls), touching the
+        known ones so last_seen tracks when they were last listed.
+        """
+        known = self.known(urls)
+        if known:
+            self.touch(known)
+        new_urls = [url for url in urls if url not in known]
+        return new_urls, [url for url in urls if url in known]
+
+    def count(self, site=None):
+        with self.lock:
+            if site is None:
+                return self.conn.execute("SELECT COUNT(*) FROM seen_ads").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM seen_ads WHERE site = ?", (site,)).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,171 @@
+# sinks.py
+
+import csv
+import json
+import os
+import threading
+import time
+
+from parsers import CAR_COLUMNS
+
+
+class RecordSink:
+    """
+    Base class for streaming record writers. Records are buffered and
+    written out every batch_size records, on flush(), and on close(), so at
+    most one batch is ever held in memory.
+    """
+
+    def __init__(self, path, columns=CAR_COLUMNS, batch_size=100, append=False):
+        self.path = path
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.append = append
+        self.buffer = []
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        with self.lock:
+            self.buffer.append(record)
+            self.count += 1
+            if len(self.buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.buffer:
+            self._write_batch(self.buffer)
+            self.buffer = []
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSink(RecordSink):
+    """Appends records to a CSV file, writing the header only for a new file."""
+
+    def __init__(self, path, columns=CAR_COLUMNS, batch_size=100, append=False):
+        super().__init__(path, columns, batch_size, append)
+        if not (append and os.path.exists(path)):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(self.columns)
+
+    def _write_batch(self, records):
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns, extrasaction="ignore")
+            writer.writerows(records)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class JsonlSink(RecordSink):
+    """Appends one JSON object per line."""
+
+    def __init__(self, path, columns=CAR_COLUMNS, batch_size=100, append=False):
+        super().__init__(path, columns, batch_size, append)
+        if not append:
+            open(path, "w", encoding="utf-8").close()
+
+    def _write_batch(self, records):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps({column: record.get(column) for column in self.columns}, ensure_ascii=False))
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetSink(RecordSink):
+    """
+    Writes each batch as a new part file in the directory at path, so a
+    resumed run adds parts instead of rewriting earlier ones. The directory
+    reads back as one table with pandas.read_parquet(path). Needs pyarrow.
+    """
+
+    def __init__(self, path, columns=CAR_COLUMNS, batch_size=1000, append=False):
+        super().__init__(path, columns, batch_size, append)
+        import pyarrow  # noqa: F401  Fail early if the optional dependency is missing
+
+        os.makedirs(path, exist_ok=True)
+        if not append:
+            for name in os.listdir(path):
+                if name.endswith(".parquet"):
+                    os.remove(os.path.join(path, name))
+        self.part = 0
+
+    def _write_batch(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({column: [record.get(column) for record in records] for column in self.columns})
+        name = f"part-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{self.part:05d}.parquet"
+        self.part += 1
+        tmp_path = os.path.join(self.path, name + ".tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+
+SINKS = {"csv": CsvSink, "jsonl": JsonlSink, "parquet": ParquetSink}
+
+
+def open_sink(path, format=None, **kwargs):
+    """Creates a sink for path, picking the format from its extension if not given."""
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip(".").lower() or "parquet"
+    if format not in SINKS:
+        raise ValueError(f"Unknown output format '{format}'. Available: {', '.join(SINKS)}")
+    return SINKS[format](path, **kwargs)
+
+
+class ScrapeCheckpoint:
+    """
+    Remembers the last fully scraped page of each search, in a small JSON
+    file, so an interrupted run can resume where it stopped.
+    """
+
+    def __init__(self, path="scrape_checkpoint.json"):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.pages = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.pages = {}
+
+    def last_page(self, key):
+        with self.lock:
+            return self.pages.get(key, 0)
+
+    def mark(self, key, page):
+        with self.lock:
+            self.pages[key] = page
+            self._save_locked()
+
+    def reset(self, key):
+        with self.lock:
+            if self.pages.pop(key, None) is not None:
+                self._save_locked()
+
+    def clear(self):
+        with self.lock:
+            self.pages = {}
+            self._save_locked()
+
+    def _save_locked(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f, indent=2)
+        os.replace(tmp_path, self.path)
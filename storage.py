@@ -0,0 +1,60 @@
+# storage.py
+
+import datetime
+import os
+
+import pandas as pd
+
+from normalize import INTEGER_DTYPES, normalize_frame
+from parsers import CAR_COLUMNS
+
+# Root directory of the Parquet dataset, partitioned as site=<site>/scrape_date=<date>
+DEFAULT_RESULTS_DIR = "results"
+
+
+def to_typed_frame(df):
+    """
+    Converts scraped string records to the stored schema (see
+    normalize.normalize_frame): nullable integers for the numeric fields,
+    categoricals for the low-cardinality fields and nulls instead of 'N/A'.
+    """
+    return normalize_frame(df)[CAR_COLUMNS]
+
+
+def write_results(df, site, root=DEFAULT_RESULTS_DIR, scrape_date=None):
+    """Appends a site's results to the dataset under site=<site>/scrape_date=<date>."""
+    if df is None or df.empty:
+        return
+    typed = to_typed_frame(df)
+    typed["site"] = site
+    typed["scrape_date"] = (scrape_date or datetime.date.today()).isoformat()
+    typed.to_parquet(root, engine="pyarrow", partition_cols=["site", "scrape_date"], index=False)
+
+
+def has_results(root=DEFAULT_RESULTS_DIR):
+    return os.path.isdir(root) and any(name.startswith("site=") for name in os.listdir(root))
+
+
+def load_results(root=DEFAULT_RESULTS_DIR, columns=None, site=None, since=None):
+    """
+    Reads the stored results, only loading the given columns and, through
+    partition pruning, only the given site and scrape dates from `since` on.
+    """
+    filters = []
+    if site is not None:
+        filters.append(("site", "=", site))
+    if since is not None:
+        filters.append(("scrape_date", ">=", since.isoformat()))
+    df = pd.read_parquet(root, engine="pyarrow", columns=columns, filters=filters or None)
+
+    # Partition values come back as categoricals of strings; keep the types
+    # of the stored columns as written
+    for column, dtype in INTEGER_DTYPES.items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def load_results_by_site(sites, root=DEFAULT_RESULTS_DIR, columns=None):
+    """Loads each site's results as its own DataFrame, keyed by site."""
+    return {site: load_results(root, columns=columns, site=site) for site in sites}
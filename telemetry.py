@@ -0,0 +1,248 @@
+# telemetry.py
+
+import contextlib
+import json
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets, as in Prometheus
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+# Stages timed during a scrape, in pipeline order
+STAGES = ["connect", "ttfb", "download", "parse", "normalize", "write"]
+
+
+class Histogram:
+    """Counts of observations per latency bucket, plus their count and sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None if empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+class Metrics:
+    """
+    Thread-safe per-site latency histograms, counters and gauges for one
+    scrape. Fetch threads, the orchestrator and the GUI all record into the
+    shared instance from get_metrics().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+            self.started = time.time()
+
+    def observe(self, stage, site, seconds):
+        with self.lock:
+            histogram = self.histograms.get((stage, site))
+            if histogram is None:
+                histogram = self.histograms[(stage, site)] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, site, amount=1):
+        with self.lock:
+            self.counters[(name, site)] = self.counters.get((name, site), 0) + amount
+
+    def set_gauge(self, name, site, value):
+        with self.lock:
+            self.gauges[(name, site)] = value
+
+    def counter(self, name, site):
+        with self.lock:
+            return self.counters.get((name, site), 0)
+
+    @contextlib.contextmanager
+    def timer(self, stage, site):
+        """Times the with-block as one observation of stage for site."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, site, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Everything recorded so far, as a JSON-serializable dict keyed by site."""
+        with self.lock:
+            sites = {}
+            for (stage, site), histogram in self.histograms.items():
+                sites.setdefault(site, {}).setdefault("latency", {})[stage] = histogram.snapshot()
+            for (name, site), value in self.counters.items():
+                sites.setdefault(site, {}).setdefault("counters", {})[name] = value
+            for (name, site), value in self.gauges.items():
+                sites.setdefault(site, {}).setdefault("gauges", {})[name] = value
+            return {"started": self.started, "elapsed": time.time() - self.started, "sites": sites}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self.lock:
+            lines = [
+                "# HELP scrape_stage_seconds Time spent per scrape stage.",
+                "# TYPE scrape_stage_seconds histogram",
+            ]
+            for (stage, site), histogram in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",site="{site}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'scrape_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"scrape_stage_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"scrape_stage_seconds_count{{{labels}}} {histogram.count}")
+            for (name, site), value in sorted(self.counters.items()):
+                if f"# TYPE scrape_{name}_total counter" not in lines:
+                    lines.append(f"# TYPE scrape_{name}_total counter")
+                lines.append(f'scrape_{name}_total{{site="{site}"}} {value}')
+            for (name, site), value in sorted(self.gauges.items()):
+                if f"# TYPE scrape_{name} gauge" not in lines:
+                    lines.append(f"# TYPE scrape_{name} gauge")
+                lines.append(f'scrape_{name}{{site="{site}"}} {value}')
+            return "\n".join(lines) + "\n"
+
+    def format_summary(self):
+        """One line per site and stage with count, p50 and p95, for logs."""
+        lines = []
+        snapshot = self.snapshot()
+        for site, data in sorted(snapshot["sites"].items()):
+            counters = ", ".join(f"{name}={value}" for name, value in sorted(data.get("counters", {}).items()))
+            if counters:
+                lines.append(f"{site}: {counters}")
+            for stage in STAGES:
+                stats = data.get("latency", {}).get(stage)
+                if stats:
+                    lines.append(
+                        f"{site} {stage}: {stats['count']} x, p50 <= {stats['p50'] * 1000:g} ms, "
+                        f"p95 <= {stats['p95'] * 1000:g} ms"
+                    )
+        return lines
+
+    def progress(self, site):
+        """(ads done, ads expected or None, ads per second) for a site's current run."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        done = self.counter("ads", site)
+        with self.lock:
+            expected = self.gauges.get(("expected_ads", site))
+        return done, expected, done / elapsed
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """The process-wide metrics registry."""
+    return _metrics
+
+
+def serve_metrics(port, host="127.0.0.1", metrics=None):
+    """Starts a background HTTP server for the metrics; returns it (call shutdown() to stop)."""
+    # http.server is slow to import and only needed here
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serves /metrics (Prometheus text) and /metrics.json."""
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = self.server.metrics.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = self.server.metrics.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            body = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics or get_metrics()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """
+    Profiles the with-block when path is given: an .html path uses
+    pyinstrument (if installed), anything else cProfile, whose stats are
+    saved to path and the top entries printed.
+    """
+    if not path:
+        yield
+        return
+
+    if path.endswith(".html"):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed; writing a cProfile dump instead.")
+            path = path[:-len(".html")] + ".prof"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                print(f"Profile written to {path}")
+            return
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        print(f"Profile written to {path}")
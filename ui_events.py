@@ -0,0 +1,75 @@
+# ui_events.py
+
+import threading
+from collections import deque
+
+# Messages waiting for the GUI beyond this are dropped (and counted)
+MAX_PENDING_MESSAGES = 5_000
+
+# Lines kept in the output pane; older lines are deleted as new ones arrive
+MAX_LOG_LINES = 2_000
+
+
+class UiEvents:
+    """
+    A thread-safe queue of work for the Tk main loop. Worker threads post
+    log messages and function calls here instead of touching widgets; the
+    main loop drains everything posted so far in one batch via after().
+
+    Messages are bounded: while the GUI is behind, new messages beyond
+    max_pending are dropped and counted. Calls are never dropped, and run
+    in the order they were posted relative to the messages.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_MESSAGES):
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.events = deque()
+        self.pending = 0
+        self.dropped = 0
+
+    def post(self, message):
+        """Queues a line of text for the output pane."""
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self.events.append(("message", message))
+            self.pending += 1
+
+    def call(self, func, *args):
+        """Queues func(*args) to run on the main loop."""
+        with self.lock:
+            self.events.append(("call", (func, args)))
+
+    def drain(self):
+        """Returns (events, dropped): everything posted since the last drain."""
+        with self.lock:
+            events, self.events = self.events, deque()
+            dropped, self.dropped = self.dropped, 0
+            self.pending = 0
+        return events, dropped
+
+
+class LogPane:
+    """
+    Writes batches of lines to a Tk Text widget with one insert per batch,
+    keeping only the last max_lines lines. The view follows new output
+    only while it is scrolled to the bottom.
+    """
+
+    def __init__(self, text, max_lines=MAX_LOG_LINES):
+        self.text = text
+        self.max_lines = max_lines
+
+    def write(self, lines):
+        if not lines:
+            return
+        at_bottom = self.text.yview()[1] >= 0.999
+        self.text.insert("end", "".join(line + "\n" for line in lines))
+        # "end-1c" is just after the last newline, on line count + 1
+        excess = int(self.text.index("end-1c").split(".")[0]) - 1 - self.max_lines
+        if excess > 0:
+            self.text.delete("1.0", f"{excess + 1}.0")
+        if at_bottom:
+            self.text.see("end")
@@ -0,0 +1,440 @@
+# work_queue.py
+#
+# Distributed scraping: a coordinator splits the searches of a job file
+# (see cli.py) into page tasks on a shared queue, and any number of worker
+# processes on the same machine lease tasks and run them. Page tasks queue
+# one ad task per listing; ad tasks store a record. Each worker has its
+# own per-host request budget.
+#
+# The queue is a SQLite file in WAL mode, which only works for processes
+# on one host: WAL relies on shared memory, and SQLite's locking is not
+# reliable over network filesystems (NFS, SMB). Do not point workers on
+# other machines at a shared copy of the file.
+#
+#   python work_queue.py plan sweep.json
+#   python work_queue.py work --processes 4
+#   python work_queue.py status
+#   python work_queue.py export results/sweep.csv
+#
+# A leased task that is not completed within the visibility timeout (its
+# worker was killed or hung) goes back on the queue, and a failed task is
+# retried up to max_attempts times. A task may therefore run more than
+# once; records are keyed by ad URL, so writing one twice keeps one copy.
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+import cli
+import http_session
+from adapters import ADAPTERS, Search
+from fetcher import HostRateLimiter
+from parsers import CAR_COLUMNS
+from sinks import open_sink
+
+DEFAULT_QUEUE_PATH = "work_queue.sqlite"
+
+# Seconds a leased task stays invisible to other workers
+VISIBILITY_TIMEOUT = 120
+
+# Attempts per task before it is marked failed
+MAX_ATTEMPTS = 5
+
+# Seconds an idle worker waits before asking again while others hold leases
+POLL_INTERVAL = 0.2
+
+# Matches a task only while the given lease (worker and attempt) still holds
+# it; a worker whose lease expired cannot finish or requeue the task
+LEASE_HELD = "id = ? AND state = 'leased' AND worker = ? AND attempts = ?"
+
+
+class Task:
+    """
+    A leased task: its id, kind ('page' or 'ad'), site, payload, attempt
+    number and the worker holding the lease. The worker and attempt number
+    identify the lease, so a later lease of the same task is told apart.
+    """
+
+    def __init__(self, id, kind, site, payload, attempts, worker):
+        self.id = id
+        self.kind = kind
+        self.site = site
+        self.payload = payload
+        self.attempts = attempts
+        self.worker = worker
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.kind}, {self.site}, attempt {self.attempts})"
+
+
+class WorkQueue:
+    """
+    A persistent task queue with leases, in one SQLite file (WAL mode, so
+    processes on the same machine can use it at once; not over a network
+    filesystem).
+
+    Every task has a unique key, so queuing the same page or ad twice is a
+    no-op, and records are keyed by ad URL, so results are written at most
+    once however often a task runs.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, visibility_timeout=VISIBILITY_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # Transactions are explicit, so leases can take the write lock up front
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                site TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL,
+                worker TEXT,
+                error TEXT
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until)")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                url TEXT PRIMARY KEY,
+                site TEXT NOT NULL,
+                record TEXT NOT NULL,
+                task_id INTEGER NOT NULL,
+                written REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+
+    def _insert_tasks(self, tasks):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO tasks (key, kind, site, payload) VALUES (?, ?, ?, ?)",
+            [(key, kind, site, json.dumps(payload)) for key, kind, site, payload in tasks],
+        )
+
+    def enqueue(self, tasks):
+        """
+        Queues (key, kind, site, payload) tuples; keys already queued (in
+        any state) are skipped. Returns the number of tasks added.
+        """
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert_tasks(tasks)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            return self.conn.total_changes - before
+
+    def lease(self, worker, count=1):
+        """
+        Leases up to count queued tasks (or tasks whose lease has expired)
+        to worker, oldest first. Expired tasks out of attempts are marked
+        failed instead.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    """
+                    UPDATE tasks SET state = 'failed', error = 'lease expired too often'
+                    WHERE state = 'leased' AND lease_until < ? AND attempts >= ?
+                    """,
+                    (now, self.max_attempts),
+                )
+                rows = self.conn.execute(
+                    """
+                    SELECT id, kind, site, payload, attempts FROM tasks
+                    WHERE state = 'queued' OR (state = 'leased' AND lease_until < ?)
+                    ORDER BY id LIMIT ?
+                    """,
+                    (now, count),
+                ).fetchall()
+                self.conn.executemany(
+                    """
+                    UPDATE tasks SET state = 'leased', attempts = attempts + 1, lease_until = ?, worker = ?
+                    WHERE id = ?
+                    """,
+                    [(now + self.visibility_timeout, worker, row[0]) for row in rows],
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return [Task(id, kind, site, json.loads(payload), attempts + 1, worker) for id, kind, site, payload, attempts in rows]
+
+    def complete(self, task, records=(), new_tasks=()):
+        """
+        Finishes a task in one transaction: stores its records ((url, site,
+        record) tuples; URLs already stored are kept as they are), queues
+        its follow-up tasks and marks it done. Returns False, changing
+        nothing, if the task's lease has expired and moved on.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                finished = self.conn.execute(
+                    f"UPDATE tasks SET state = 'done', lease_until = NULL WHERE {LEASE_HELD}",
+                    (task.id, task.worker, task.attempts),
+                ).rowcount
+                if not finished:
+                    self.conn.execute("ROLLBACK")
+                    return False
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO records (url, site, record, task_id, written) VALUES (?, ?, ?, ?, ?)",
+                    [(url, site, json.dumps(record), task.id, now) for url, site, record in records],
+                )
+                self._insert_tasks(new_tasks)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def fail(self, task, error):
+        """
+        Puts a task back on the queue, or marks it failed once it is out of
+        attempts. Returns False, changing nothing, if the task's lease has
+        expired and moved on.
+        """
+        state = "failed" if task.attempts >= self.max_attempts else "queued"
+        with self.lock:
+            return self.conn.execute(
+                f"UPDATE tasks SET state = ?, lease_until = NULL, error = ? WHERE {LEASE_HELD}",
+                (state, str(error), task.id, task.worker, task.attempts),
+            ).rowcount == 1
+
+    def counts(self):
+        """Number of tasks in each state, per kind, e.g. {('ad', 'done'): 40}."""
+        with self.lock:
+            rows = self.conn.execute("SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state").fetchall()
+        return {(kind, state): count for kind, state, count in rows}
+
+    def unfinished(self):
+        """Number of tasks still queued or leased."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tasks WHERE state IN ('queued', 'leased')").fetchone()[0]
+
+    def failures(self):
+        """(kind, site, error) of every task that ran out of attempts."""
+        with self.lock:
+            return self.conn.execute("SELECT kind, site, error FROM tasks WHERE state = 'failed'").fetchall()
+
+    def record_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def records(self):
+        """Yields (site, record) for every stored record, in the order written."""
+        with self.lock:
+            rows = self.conn.execute("SELECT site, record FROM records ORDER BY written, url").fetchall()
+        for site, record in rows:
+            yield site, json.loads(record)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def page_task(adapter, search, page, pages):
+    """A (key, kind, site, payload) tuple for one search result page."""
+    url = adapter.build_search_url(search, page)
+    payload = {"search": search._asdict(), "page": page, "pages": pages, "url": url}
+    return (f"page:{url}", "page", adapter.site, payload)
+
+
+def plan(queue, searches, sites, pages):
+    """
+    Queues the first result page of every search on every site. The
+    workers that run them queue the rest, up to pages or the number of
+    result pages the site reports. Returns the number of tasks added.
+    """
+    return queue.enqueue([page_task(ADAPTERS[site], search, 1, pages) for search in searches for site in sites])
+
+
+class Worker:
+    """Leases tasks from a WorkQueue and runs them until the queue is drained or stopped."""
+
+    def __init__(self, queue, worker_id=None, requests_per_second=None, stop_flag=None, log=print):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.stop_flag = stop_flag
+        self.log = log
+        self.done = 0
+
+    def fetch(self, adapter, url):
+        if not self.rate_limiter.acquire(url, self.stop_flag):
+            raise InterruptedError("stopped")
+        response = http_session.get(url, headers=adapter.request_headers, stop_flag=self.stop_flag)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} for {url}")
+        return response.content
+
+    def run_page(self, task, adapter):
+        """Reads a result page: one ad task per listing, plus the next pages to read."""
+        payload = task.payload
+        search = Search(**payload["search"])
+        page, pages = payload["page"], payload["pages"]
+        content = self.fetch(adapter, payload["url"])
+        listings = [listing for listing in adapter.parse_listing_page(content) if "error" not in listing]
+
+        new_tasks = [
+            (f"ad:{listing['url']}", "ad", adapter.site, {"listing": listing})
+            for listing in listings
+        ]
+        page_count = adapter.page_count(content)
+        if page_count is not None:
+            # The first page knows how many there are; queue them all at once
+            if page == 1:
+                new_tasks += [page_task(adapter, search, next_page, pages) for next_page in range(2, min(pages, page_count) + 1)]
+        elif listings and page < pages:
+            new_tasks.append(page_task(adapter, search, page + 1, pages))
+        return self.queue.complete(task, new_tasks=new_tasks)
+
+    def run_ad(self, task, adapter):
+        listing = task.payload["listing"]
+        content = self.fetch(adapter, listing["url"])
+        record = adapter.map_fields(adapter.parse_detail_page(content), listing)
+        return self.queue.complete(task, records=[(listing["url"], adapter.site, record)])
+
+    def run(self, idle_exit=True):
+        """Runs tasks until the queue has none left (or the stop flag is set); returns tasks done."""
+        while not (self.stop_flag and self.stop_flag.is_set()):
+            tasks = self.queue.lease(self.worker_id)
+            if not tasks:
+                # Other workers' leases may still expire and come back
+                if idle_exit and not self.queue.unfinished():
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            task = tasks[0]
+            adapter = ADAPTERS[task.site]
+            try:
+                if task.kind == "page":
+                    completed = self.run_page(task, adapter)
+                else:
+                    completed = self.run_ad(task, adapter)
+            except InterruptedError:
+                self.queue.fail(task, "worker stopped")
+                break
+            except Exception as e:
+                self.log(f"{self.worker_id}: {task} failed: {e}")
+                self.queue.fail(task, e)
+                continue
+            if not completed:
+                self.log(f"{self.worker_id}: {task} took longer than its lease; another worker has it")
+                continue
+            self.done += 1
+        return self.done
+
+
+def run_worker_process(path, requests_per_second, visibility_timeout, quiet):
+    """Entry point of one worker process."""
+    queue = WorkQueue(path, visibility_timeout=visibility_timeout)
+    worker = Worker(queue, requests_per_second=requests_per_second, log=(lambda message: None) if quiet else print)
+    try:
+        done = worker.run()
+    finally:
+        queue.close()
+    if not quiet:
+        print(f"{worker.worker_id}: {done} tasks done")
+
+
+def run_workers(path, processes=1, requests_per_second=None, visibility_timeout=VISIBILITY_TIMEOUT, quiet=False):
+    """Runs worker processes against the queue at path until it is drained."""
+    workers = [
+        multiprocessing.Process(target=run_worker_process, args=(path, requests_per_second, visibility_timeout, quiet))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+
+def export(queue, output, format=None):
+    """Writes every stored record, tagged with its site, to a sink; returns the count."""
+    with open_sink(output, format=format, columns=CAR_COLUMNS + ["Site"]) as sink:
+        for site, record in queue.records():
+            sink.write(dict(record, Site=site))
+    return sink.count
+
+
+def print_status(queue):
+    counts = queue.counts()
+    for kind in ("page", "ad"):
+        states = ", ".join(f"{state} {count}" for (task_kind, state), count in sorted(counts.items()) if task_kind == kind)
+        print(f"{kind} tasks: {states or 'none'}")
+    print(f"records: {queue.record_count()}")
+    for kind, site, error in queue.failures()[:10]:
+        print(f"  failed {kind} on {site}: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run scrapes through a shared work queue.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Queue file shared by the coordinator and workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser("plan", help="Queue the searches of a job file")
+    plan_parser.add_argument("job_file", help="JSON or YAML job spec, as for cli.py")
+
+    work_parser = commands.add_parser("work", help="Run workers until the queue is drained")
+    work_parser.add_argument("--processes", type=int, default=1, help="Worker processes to start on this machine")
+    work_parser.add_argument("--rps", type=float, help="Cap on requests per second per host, per worker (default: adaptive)")
+    work_parser.add_argument("--visibility-timeout", type=float, default=VISIBILITY_TIMEOUT,
+                             help="Seconds before a leased task is handed to another worker")
+    work_parser.add_argument("--quiet", action="store_true")
+
+    commands.add_parser("status", help="Show task and record counts")
+
+    export_parser = commands.add_parser("export", help="Write the stored records to a file")
+    export_parser.add_argument("output", help="Output file (.csv, .jsonl) or Parquet directory")
+    export_parser.add_argument("--format", choices=["csv", "jsonl", "parquet"])
+    args = parser.parse_args(argv)
+
+    if args.command == "work":
+        start = time.perf_counter()
+        run_workers(args.queue, args.processes, args.rps, args.visibility_timeout, args.quiet)
+        print(f"Workers finished in {time.perf_counter() - start:.1f}s")
+        args.command = "status"
+
+    queue = WorkQueue(args.queue)
+    try:
+        if args.command == "plan":
+            job = cli.load_job_file(args.job_file)
+            searches = cli.expand_searches(job.get("searches", [{}]))
+            added = plan(queue, searches, job.get("sites", list(ADAPTERS)), int(job.get("pages", 1)))
+            print(f"Queued {added} search tasks ({len(searches)} searches)")
+        elif args.command == "status":
+            print_status(queue)
+        elif args.command == "export":
+            count = export(queue, args.output, args.format)
+            print(f"Wrote {count} records to {args.output}")
+    finally:
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())